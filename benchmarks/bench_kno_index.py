@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark full KNO indexing throughput with different numbers of workers.
+
+Builds a fresh index of a git checkout (this repository by default) once per
+worker count, into a temporary directory, and reports files and chunks per
+second and the speedup over one worker.
+
+    python benchmarks/bench_kno_index.py
+    python benchmarks/bench_kno_index.py --repo ~/src/cpython --workers 1 2 4 8 --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kno_index import KnoIndex
+
+
+def run(repo, workers):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = KnoIndex(repo, kno_dir=tmp_dir)
+        start = time.perf_counter()
+        stats = index.update(workers=workers)
+        seconds = time.perf_counter() - start
+    return {
+        'workers': workers,
+        'files': stats['changed_files'],
+        'chunks': stats['total_chunks'],
+        'seconds': round(seconds, 2),
+        'files_per_second': round(stats['changed_files'] / seconds, 1),
+        'chunks_per_second': round(stats['total_chunks'] / seconds, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='KNO indexing benchmark')
+    parser.add_argument('--repo', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='Git checkout to index (default: this repository)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = [run(args.repo, workers) for workers in dict.fromkeys(args.workers)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    base = results[0]['seconds']
+    print(f"  {'workers':>7} {'files':>7} {'chunks':>8} {'seconds':>8} {'files/s':>9} {'chunks/s':>9} {'speedup':>8}")
+    for r in results:
+        print(f"  {r['workers']:>7} {r['files']:>7} {r['chunks']:>8} {r['seconds']:>8} {r['files_per_second']:>9} "
+              f"{r['chunks_per_second']:>9} {base / r['seconds']:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark local KNO search latency at several index sizes.
+
+Fills a VectorStore with synthetic clustered unit vectors (embedding a
+million real chunks would dominate the run), then times top-k queries with
+an exhaustive scan and, above a few thousand rows, with an IVF partition,
+reporting the IVF's recall against the exhaustive result.
+
+    python benchmarks/bench_kno_search.py
+    python benchmarks/bench_kno_search.py --sizes 10000 100000 --queries 50 --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kno_vectors import VectorStore, DEFAULT_DIM, BLOCK_ROWS
+
+
+def fill(store, rows, topics, rng):
+    """Write `rows` unit vectors scattered around `topics` random directions."""
+    centers = rng.standard_normal((topics, store.dim)).astype(np.float32)
+    store._grow(rows)
+    matrix = store.matrix("r+")
+    for block in range(0, rows, BLOCK_ROWS):
+        n = min(BLOCK_ROWS, rows - block)
+        vectors = centers[rng.integers(0, topics, n)] + 1.5 * rng.standard_normal((n, store.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        matrix[block:block + n] = vectors.astype(np.float16)
+    matrix.flush()
+    return centers
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 2)
+
+
+def run_size(rows, args):
+    rng = np.random.default_rng(rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = VectorStore(tmp_dir, args.dim)
+        centers = fill(store, rows, args.topics, rng)
+        queries = centers[rng.integers(0, args.topics, args.queries)]
+        queries += rng.standard_normal(queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        exact, exhaustive = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found, _ = store.search_rows(query, args.k, exhaustive=True)
+            exhaustive.append(time.perf_counter() - start)
+            exact.append(set(found.tolist()))
+        result = {
+            'rows': rows,
+            'matrix_mb': round(store.rows * store.dim * 2 / 2 ** 20, 1),
+            'exhaustive_p50_ms': percentile_ms(exhaustive, 50),
+            'exhaustive_p95_ms': percentile_ms(exhaustive, 95)
+        }
+
+        if rows >= args.ivf_min_rows:
+            start = time.perf_counter()
+            store.build_ivf()
+            result['ivf_build_seconds'] = round(time.perf_counter() - start, 2)
+            ivf, hits = [], 0
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                found, _ = store.search_rows(query, args.k, nprobe=args.nprobe)
+                ivf.append(time.perf_counter() - start)
+                hits += len(expected & set(found.tolist()))
+            result['ivf_p50_ms'] = percentile_ms(ivf, 50)
+            result['ivf_p95_ms'] = percentile_ms(ivf, 95)
+            result['ivf_recall'] = round(hits / (args.k * len(queries)), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local KNO search benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--topics', type=int, default=500, help='Number of synthetic clusters')
+    parser.add_argument('--queries', type=int, default=30)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--ivf-min-rows', type=int, default=5_000)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = [run_size(rows, args) for rows in args.sizes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  {'rows':>9} {'MB':>7} {'scan p50':>9} {'scan p95':>9} {'ivf p50':>8} {'ivf p95':>8} {'recall':>7} "
+          f"{'build s':>8}")
+    for r in results:
+        print(f"  {r['rows']:>9} {r['matrix_mb']:>7} {r['exhaustive_p50_ms']:>9} {r['exhaustive_p95_ms']:>9} "
+              f"{r.get('ivf_p50_ms', '-'):>8} {r.get('ivf_p95_ms', '-'):>8} {r.get('ivf_recall', '-'):>7} "
+              f"{r.get('ivf_build_seconds', '-'):>8}")
+
+
+if __name__ == '__main__':
+    main()
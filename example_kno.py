@@ -3,10 +3,18 @@
 Example script for using kno-sdk with the BTC-Koii project
 """
 
+from functools import partial
+
+from kno_cache import cached_search, cached_agent_query
+
 try:
     from kno_sdk import clone_and_index, search, EmbeddingMethod, agent_query, LLMProvider
     KNO_AVAILABLE = True
+    # Route the SDK's calls through the same cache simple_kno uses, keyed by commit
+    search = partial(cached_search, search)
+    agent_query = partial(cached_agent_query, agent_query)
 except ImportError:
+    # simple_kno caches search() and agent_query() itself
     from simple_kno import clone_and_index, search, EmbeddingMethod, agent_query, LLMProvider
     KNO_AVAILABLE = False
 
@@ -34,6 +42,10 @@ def main():
     print("    query=\"bitcoin mining share collection\",")
     print("    k=5")
     print(")")
+
+    print("\n# Repeated queries are answered from cache until the index changes")
+    print("from kno_cache import cache_stats")
+    print("print(cache_stats())  # memory/disk hits, misses, embedding hits per repository")
     
     print("\nFor more information, see KNO_SDK_README.md")
 
@@ -4,11 +4,8 @@ Script to generate KNO SDK embeddings database for the BTC-Koii repository.
 This creates a .kno/ directory with semantic embeddings for code search and analysis.
 """
 
-import os
 import sys
-import time
-import json
-import shutil
+import argparse
 from pathlib import Path
 import logging
 
@@ -37,66 +34,15 @@ except ImportError:
     except ImportError:
         logger.error("Neither kno-sdk nor simple_kno.py found. Please install kno-sdk with: pip install kno-sdk")
         sys.exit(1)
-    
-def create_basic_kno_structure(repo_dir, branch):
-    """
-    Create a basic .kno/ directory structure without requiring the full kno-sdk.
-    This is a very simplified version just to make the project compatible with the KNO SDK.
-    
-    Args:
-        repo_dir: Repository root directory
-        branch: Git branch name
-    """
-    kno_dir = repo_dir / ".kno"
-    
-    # Create the .kno directory if it doesn't exist
-    if not kno_dir.exists():
-        kno_dir.mkdir()
-        logger.info(f"Created .kno directory at {kno_dir}")
-    
-    # Get timestamp and create SBERT embedding directory
-    timestamp = int(time.time() * 1000)
-    commit_id = "local"  # Default placeholder
-    
-    # Try to get actual commit ID
-    try:
-        import subprocess
-        result = subprocess.run(
-            ["git", "rev-parse", "--short", "HEAD"],
-            cwd=repo_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        commit_id = result.stdout.strip()
-    except Exception as e:
-        logger.warning(f"Could not determine commit ID: {e}")
-    
-    # Create subdirectory for embeddings
-    embed_dir = kno_dir / f"embedding_SBERTEmbedding_{timestamp}_{commit_id}"
-    embed_dir.mkdir(exist_ok=True)
-    
-    # Create a basic chroma.sqlite3 file
-    with open(embed_dir / "chroma.sqlite3", "w") as f:
-        f.write("-- KNO SDK placeholder database")
-    
-    # Create a simple metadata JSON file
-    metadata = {
-        "repo": os.path.basename(repo_dir),
-        "branch": branch,
-        "timestamp": timestamp,
-        "commit": commit_id,
-        "embedding_method": "SBERTEmbedding",
-        "description": "Basic KNO SDK placeholder database"
-    }
-    
-    with open(embed_dir / "metadata.json", "w") as f:
-        json.dump(metadata, f, indent=2)
-    
-    logger.info(f"Created basic KNO structure at {embed_dir}")
-    return embed_dir
+
+from kno_index import KnoIndex, remove_legacy_dirs
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate or update the KNO index for this repository")
+    parser.add_argument("--full", action="store_true", help="Re-index every file instead of only changed ones")
+    parser.add_argument("--workers", type=int, help="Processes that chunk and embed files (default: one per core)")
+    args = parser.parse_args()
+
     # Get the repository root directory
     repo_dir = Path(__file__).parent.absolute()
     repo_url = None  # Will be determined from git remote
@@ -136,24 +82,30 @@ def main():
 
     logger.info("Starting KNO SDK indexing process...")
     try:
+        index = KnoIndex(repo_dir)
         if USING_SIMPLE:
-            # Create a basic KNO directory structure manually
-            logger.warning("Using basic KNO structure creation (no actual embeddings)")
-            embed_dir = create_basic_kno_structure(repo_dir, branch)
-            
-            # Also run the simple_kno.py implementation as a fallback
+            # Update the versioned index in .kno/index/ with only the files that changed
             repo_index = clone_and_index(
-                repo_url=repo_url,
+                repo_url=str(repo_dir),
                 branch=branch,
                 embedding=EmbeddingMethod.SBERT,
-                cloned_repo_base_dir=str(repo_dir.parent)
+                cloned_repo_base_dir=str(repo_dir.parent),
+                should_reindex=args.full,
+                workers=args.workers
             )
+            remove_legacy_dirs(repo_dir / ".kno", keep=0)
             
-            logger.info(f"Basic KNO structure created at: {repo_dir / '.kno'}")
-            logger.info(f"Mock repository index digest:\n{repo_index.digest}")
-            logger.warning("This is a basic KNO structure with no real embeddings.")
-            logger.warning("To create a real index with embeddings, install the full kno-sdk package.")
+            logger.info(f"KNO index at: {index.path}")
+            logger.info(f"Repository index digest:\n{repo_index.digest}")
         else:
+            # The SDK always re-embeds the whole repository, so only run it when something changed
+            if not args.full:
+                changed, deleted = index.changes()
+                if not changed and not deleted:
+                    logger.info(f"No files changed since index version {index.load_manifest()['version']}; "
+                                f"skipping re-indexing")
+                    return
+
             # Using full kno-sdk package
             # Note: should_push_to_repo is set to False to avoid automatic pushing
             repo_index = clone_and_index(
@@ -164,6 +116,9 @@ def main():
                 should_reindex=True,
                 should_push_to_repo=False
             )
+            index.update(branch, full=args.full, workers=args.workers)
+            # Keep only the SDK's newest embedding directory
+            remove_legacy_dirs(repo_dir / ".kno", keep=1)
             
             logger.info(f"Repository indexed successfully at: {repo_index.path}")
             logger.info(f"KNO directory: {repo_index.path / '.kno'}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Two-level cache for KNO search and agent queries.
+
+Results are kept in an in-memory LRU and in an SQLite file next to the
+index, both bounded by size. Keys include the index version, so entries
+for an older index are never returned, and they are dropped the first time
+a newer version is seen. Query embeddings are cached separately under keys
+that do not depend on the version, since a query's features do not change
+when the index does.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import subprocess
+from collections import OrderedDict
+from pathlib import Path
+
+from kno_index import repo_path_for
+
+logger = logging.getLogger("kno-index")
+
+DEFAULT_MEMORY_BYTES = 8 << 20
+DEFAULT_DISK_BYTES = 64 << 20
+CACHE_FILE = "query_cache.sqlite3"
+
+
+def normalize_query(query):
+    """Collapse whitespace; case is kept because identifiers are split on it."""
+    return " ".join(query.split())
+
+
+def index_version(repo_path):
+    """
+    Version string of a repo's index: the incremental index's version and commit,
+    or the checkout's HEAD commit when there is no incremental index.
+    """
+    # metadata.json is the small summary of manifest.json
+    metadata_path = Path(repo_path) / ".kno" / "index" / "metadata.json"
+    if metadata_path.exists():
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        return f"{metadata['version']}:{metadata['commit']}"
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_path, capture_output=True, text=True,
+                                check=True)
+        return f"commit:{result.stdout.strip()}"
+    except Exception:
+        return "unversioned"
+
+
+class QueryCache:
+    """
+    In-memory LRU in front of an on-disk SQLite cache, each bounded in bytes.
+
+    Values must be JSON-serializable. Entries are stored with the version
+    they were computed for; `set_version` drops other versions' entries.
+    """
+
+    def __init__(self, path=None, max_memory_bytes=DEFAULT_MEMORY_BYTES, max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.path = Path(path) if path else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.version = None
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "embedding_hits": 0, "embedding_misses": 0, "evictions": 0}
+        self._ready = False
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode()).hexdigest()
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries
+                            (key TEXT PRIMARY KEY,
+                             version TEXT NOT NULL,
+                             value TEXT NOT NULL,
+                             size INTEGER NOT NULL,
+                             accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def set_version(self, version):
+        """Drop entries computed for any other index version (embeddings, stored under '', are kept)."""
+        if version == self.version:
+            return
+        self.version = version
+        for key in [key for key, (entry_version, _, _) in self.memory.items() if entry_version not in ("", version)]:
+            self.memory_bytes -= self.memory.pop(key)[2]
+        if self.path:
+            conn = self._connect()
+            try:
+                dropped = conn.execute("DELETE FROM entries WHERE version NOT IN ('', ?)", (version,)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            if dropped:
+                logger.info(f"Dropped {dropped} cached results for older index versions")
+
+    def _remember(self, key, version, value, size):
+        if key in self.memory:
+            self.memory_bytes -= self.memory.pop(key)[2]
+        self.memory[key] = (version, value, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            self.memory_bytes -= self.memory.popitem(last=False)[1][2]
+            self.counts["evictions"] += 1
+
+    def _lookup(self, key):
+        """(found, value, level), promoting disk hits into memory."""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return True, entry[1], "memory"
+        if not self.path or not self.path.exists():
+            return False, None, None
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT version, value, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None, None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        finally:
+            conn.close()
+        value = json.loads(row[1])
+        self._remember(key, row[0], value, row[2])
+        return True, value, "disk"
+
+    def _store(self, key, version, value):
+        try:
+            data = json.dumps(value, separators=(",", ":"))
+        except TypeError:
+            # Not JSON-serializable (e.g. SDK document objects): cache in memory only
+            self._remember(key, version, value, len(repr(value)))
+            return
+        self._remember(key, version, value, len(data))
+        if not self.path:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO entries (key, version, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                         (key, version, data, len(data), time.time()))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_disk_bytes:
+                # Evict least recently used entries down to 90% of the limit
+                excess = total - int(self.max_disk_bytes * 0.9)
+                victims = []
+                for victim, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    victims.append((victim,))
+                    excess -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+                self.counts["evictions"] += len(victims)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_or_compute(self, parts, compute, version=None):
+        """
+        Cached value for the key `parts` under the current version, computing and storing it on a miss.
+
+        Args:
+            parts: JSON-serializable key parts, e.g. (method, query, k)
+            compute: Called with no arguments on a miss
+            version: Index version the value depends on; '' for version-independent values
+        """
+        version = self.version if version is None else version
+        key = self.key(version, *parts)
+        found, value, level = self._lookup(key)
+        if found:
+            self.counts[f"{level}_hits"] += 1
+            return value
+        self.counts["misses"] += 1
+        value = compute()
+        self._store(key, version, value)
+        return value
+
+    def embedding(self, parts, compute):
+        """A version-independent query embedding, as a list of floats."""
+        key = self.key("", "embedding", *parts)
+        found, value, _ = self._lookup(key)
+        if found:
+            self.counts["embedding_hits"] += 1
+            return value
+        self.counts["embedding_misses"] += 1
+        value = compute()
+        self._store(key, "", value)
+        return value
+
+    def stats(self):
+        stats = dict(self.counts, version=self.version, memory_entries=len(self.memory),
+                     memory_bytes=self.memory_bytes)
+        if self.path and self.path.exists():
+            conn = self._connect()
+            try:
+                stats["disk_entries"], stats["disk_bytes"] = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            finally:
+                conn.close()
+        return stats
+
+
+_caches = {}
+
+
+def cache_for(repo_path):
+    """The process-wide QueryCache of a repo, stored in its .kno/index/ (in memory only until it is cloned)."""
+    repo_path = Path(repo_path).absolute()
+    if repo_path not in _caches or (_caches[repo_path].path is None and repo_path.exists()):
+        path = repo_path / ".kno" / "index" / CACHE_FILE if repo_path.exists() else None
+        _caches[repo_path] = QueryCache(path)
+    cache = _caches[repo_path]
+    cache.set_version(index_version(repo_path))
+    return cache
+
+
+def cached_search(search_fn, repo_url, branch="main", embedding=None, query="", k=8, cloned_repo_base_dir=".",
+                  **kwargs):
+    """Call a search() implementation (kno_sdk or simple_kno) through the repo's cache."""
+    cache = cache_for(repo_path_for(repo_url, cloned_repo_base_dir))
+    method = getattr(embedding, "value", embedding)
+    parts = ("search", branch, method, normalize_query(query), k)
+    if embedding is not None:
+        kwargs["embedding"] = embedding
+    return cache.get_or_compute(parts, lambda: search_fn(repo_url=repo_url, branch=branch, query=query, k=k,
+                                                         cloned_repo_base_dir=cloned_repo_base_dir, **kwargs))
+
+
+def cached_agent_query(agent_query_fn, repo_url, prompt="", cloned_repo_base_dir=".", **kwargs):
+    """
+    Call an agent_query() implementation through the repo's cache.
+
+    Only deterministic calls (llm_temperature 0, the default) are cached;
+    API keys are never part of the key.
+    """
+    if kwargs.get("llm_temperature", 0.0):
+        return agent_query_fn(repo_url=repo_url, prompt=prompt, cloned_repo_base_dir=cloned_repo_base_dir, **kwargs)
+    cache = cache_for(repo_path_for(repo_url, cloned_repo_base_dir))
+    options = {name: getattr(value, "value", value) for name, value in kwargs.items() if name != "MODEL_API_KEY"}
+    parts = ("agent_query", sorted(options.items()), normalize_query(prompt))
+    return cache.get_or_compute(parts, lambda: agent_query_fn(repo_url=repo_url, prompt=prompt,
+                                                              cloned_repo_base_dir=cloned_repo_base_dir, **kwargs))
+
+
+def cache_stats():
+    """Hit and miss counts of every cache used in this process, by repository."""
+    return {str(path): cache.stats() for path, cache in _caches.items()}
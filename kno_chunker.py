@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Split repository files into chunks for the KNO index, in parallel.
+
+Python is split by top-level function and class with the stdlib ast module,
+large classes by method. Markdown is split by heading, shell and config
+files into overlapping sliding windows, and anything else into windows cut
+at blank lines. chunk_files() spreads files across a process pool whose
+workers also embed each chunk, and yields each file's result as soon as
+it is ready so the index writer stores it while later files are still
+being processed.
+"""
+
+import os
+import ast
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from kno_vectors import embed_chunks
+except ImportError:
+    embed_chunks = None
+
+CHUNK_LINES = 60
+MAX_DEFINITION_LINES = 150
+WINDOW_LINES = 40
+WINDOW_OVERLAP = 8
+SERIAL_FILES = 32
+
+MARKDOWN_SUFFIXES = {".md", ".markdown", ".rst"}
+CONFIG_SUFFIXES = {".sh", ".bash", ".yml", ".yaml", ".toml", ".json", ".ini", ".cfg", ".conf", ".env", ".txt"}
+CONFIG_NAMES = {"Dockerfile", "Makefile", ".gitignore", ".dockerignore"}
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def chunk_id(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _span(lines, start, end):
+    """Chunk of 1-based inclusive lines start..end."""
+    return start, end, "".join(lines[start - 1:end])
+
+
+def window_chunks(lines, first=1, max_lines=CHUNK_LINES):
+    """
+    Split lines into chunks of at most max_lines, preferring to cut at blank lines.
+
+    Cutting at blank lines keeps chunk boundaries stable when lines are
+    inserted elsewhere, so most chunks keep their hash.
+
+    Args:
+        lines: Lines with their line endings
+        first: Line number of lines[0]
+
+    Returns:
+        List of (start_line, end_line, text) with 1-based inclusive line numbers
+    """
+    chunks = []
+    start = 0
+    for n, line in enumerate(lines):
+        size = n - start + 1
+        if size >= max_lines or (size >= max_lines // 2 and not line.strip()):
+            chunks.append((first + start, first + n, "".join(lines[start:n + 1])))
+            start = n + 1
+    if start < len(lines):
+        chunks.append((first + start, first + len(lines) - 1, "".join(lines[start:])))
+    return [chunk for chunk in chunks if chunk[2].strip()]
+
+
+def chunk_text(text, max_lines=CHUNK_LINES):
+    return window_chunks(text.splitlines(keepends=True), 1, max_lines)
+
+
+def sliding_window(lines, size=WINDOW_LINES, overlap=WINDOW_OVERLAP):
+    """Fixed windows of `size` lines, each repeating the last `overlap` lines of the previous one."""
+    chunks = []
+    step = size - overlap
+    for start in range(0, max(len(lines) - overlap, 1), step):
+        chunks.append(_span(lines, start + 1, min(start + size, len(lines))))
+    return [chunk for chunk in chunks if chunk[2].strip()]
+
+
+def _definition_start(node, lines, cursor):
+    """First line of a definition: its decorators, and the comments and blank lines since `cursor`."""
+    start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+    gap = lines[cursor - 1:start - 1]
+    if all(not line.strip() or line.lstrip().startswith("#") for line in gap):
+        return cursor
+    return start
+
+
+def _definition_chunks(node, lines, start):
+    end = node.end_lineno
+    if end - start + 1 <= MAX_DEFINITION_LINES:
+        return [_span(lines, start, end)]
+    if not isinstance(node, ast.ClassDef):
+        return window_chunks(lines[start - 1:end], start)
+    # A large class becomes its header and attributes plus one chunk per method
+    chunks = []
+    cursor = start
+    for child in node.body:
+        if not isinstance(child, DEFINITIONS):
+            continue
+        child_start = _definition_start(child, lines, cursor)
+        if child_start > cursor:
+            chunks.extend(window_chunks(lines[cursor - 1:child_start - 1], cursor))
+        chunks.extend(_definition_chunks(child, lines, child_start))
+        cursor = child.end_lineno + 1
+    if cursor <= end:
+        chunks.extend(window_chunks(lines[cursor - 1:end], cursor))
+    return chunks
+
+
+def chunk_python(text):
+    """One chunk per top-level function or class; module-level code in between is windowed."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return chunk_text(text)
+    lines = text.splitlines(keepends=True)
+    chunks = []
+    cursor = 1
+    for node in tree.body:
+        if not isinstance(node, DEFINITIONS):
+            continue
+        start = _definition_start(node, lines, cursor)
+        if start > cursor:
+            chunks.extend(window_chunks(lines[cursor - 1:start - 1], cursor))
+        chunks.extend(_definition_chunks(node, lines, start))
+        cursor = node.end_lineno + 1
+    if cursor <= len(lines):
+        chunks.extend(window_chunks(lines[cursor - 1:], cursor))
+    return [chunk for chunk in chunks if chunk[2].strip()]
+
+
+def chunk_markdown(text):
+    """One chunk per heading section (headings inside code fences ignored); long sections are windowed."""
+    lines = text.splitlines(keepends=True)
+    starts = [0]
+    fenced = False
+    for n, line in enumerate(lines):
+        if line.startswith("```"):
+            fenced = not fenced
+        elif not fenced and line.startswith("#") and n:
+            starts.append(n)
+    chunks = []
+    for start, end in zip(starts, starts[1:] + [len(lines)]):
+        chunks.extend(window_chunks(lines[start:end], start + 1))
+    return chunks
+
+
+def chunk_file(name, text):
+    """Chunks of one file, by its type."""
+    path = Path(name)
+    suffix = path.suffix.lower()
+    if suffix == ".py":
+        return chunk_python(text)
+    if suffix in MARKDOWN_SUFFIXES:
+        return chunk_markdown(text)
+    if suffix in CONFIG_SUFFIXES or path.name in CONFIG_NAMES:
+        return sliding_window(text.splitlines(keepends=True))
+    return chunk_text(text)
+
+
+def process_file(task):
+    """
+    Read, chunk and (with dim set) embed one file; runs in pool workers.
+
+    Returns:
+        (name, chunks, vectors, buckets): chunks as (start_line, end_line,
+        text, chunk_id), and the chunk vectors and document-frequency buckets
+        or None
+    """
+    repo_dir, name, dim = task
+    with open(os.path.join(repo_dir, name), encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    chunks = [(start, end, chunk, chunk_id(chunk)) for start, end, chunk in chunk_file(name, text)]
+    vectors = buckets = None
+    if dim and embed_chunks:
+        vectors, buckets = embed_chunks([chunk for _, _, chunk, _ in chunks], dim)
+    return name, chunks, vectors, buckets
+
+
+def chunk_files(repo_dir, names, dim=None, workers=None):
+    """
+    Yield process_file() results for `names`, in order.
+
+    Files are spread over `workers` processes (default: one per core);
+    a handful of files is processed in this process instead.
+    """
+    tasks = [(str(repo_dir), name, dim) for name in names]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < SERIAL_FILES:
+        for task in tasks:
+            yield process_file(task)
+        return
+    chunksize = max(1, min(64, len(tasks) // (workers * 8)))
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(process_file, tasks, chunksize=chunksize)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Incremental KNO index for a local repository.
+
+Keeps a single versioned index under .kno/index/ instead of a new
+embedding_* directory per run. A manifest records the content hash of every
+indexed file and the hashes of its chunks; on each run the files changed
+since the indexed commit (plus untracked ones, and those that were modified
+or untracked when it was indexed) are re-hashed, and only files whose
+content actually changed are re-chunked by kno_chunker across a process
+pool. Chunks are stored by content hash, so unchanged chunks of an edited
+file are not embedded again, and chunks no longer referenced by any file
+are garbage collected. Vectors for local search are kept by
+kno_vectors.VectorStore when NumPy is available.
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import subprocess
+from pathlib import Path
+
+from kno_chunker import chunk_files
+
+try:
+    import numpy as np
+    from kno_vectors import VectorStore, EMBEDDING_METHOD
+except ImportError:
+    # NumPy is missing: the index still tracks files and chunks, without vectors
+    VectorStore = None
+    EMBEDDING_METHOD = None
+
+logger = logging.getLogger("kno-index")
+
+INDEX_DIR_NAME = "index"
+MAX_FILE_BYTES = 1_000_000
+EMBED_BATCH = 4096
+
+
+def git(repo_dir, *args):
+    """Run a git command in repo_dir and return its stdout."""
+    result = subprocess.run(["git", *args], cwd=repo_dir, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def repo_path_for(repo_url, cloned_repo_base_dir="."):
+    """A local checkout is used in place; a URL maps to <cloned_repo_base_dir>/<repo name>."""
+    if os.path.isdir(repo_url):
+        return Path(repo_url).absolute()
+    repo_name = repo_url.rstrip("/").split("/")[-1].removesuffix(".git")
+    return Path(cloned_repo_base_dir) / repo_name
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def is_indexable(path):
+    """Small text files only; binaries (a NUL byte in the first 8 KB) and large files are skipped."""
+    try:
+        if os.path.getsize(path) > MAX_FILE_BYTES:
+            return False
+        with open(path, "rb") as f:
+            return b"\0" not in f.read(8192)
+    except OSError:
+        return False
+
+
+def list_files(repo_dir):
+    """Tracked and untracked, non-ignored files, relative to repo_dir, excluding .kno/."""
+    output = git(repo_dir, "ls-files", "-z", "--cached", "--others", "--exclude-standard")
+    files = set()
+    for name in output.split("\0"):
+        if name and not name.startswith(".kno/") and os.path.isfile(os.path.join(repo_dir, name)):
+            files.add(name)
+    return files
+
+
+class KnoIndex:
+    """
+    The versioned index in <repo>/.kno/index/.
+
+    manifest.json holds the index version, the commit it was built from, the
+    files that differed from that commit when indexed and, per file, its
+    content hash and chunk ids. index.sqlite3 holds the chunks
+    (keyed by content hash), where each file's chunks sit and which vector
+    row belongs to which chunk.
+    """
+
+    def __init__(self, repo_dir, kno_dir=None):
+        self.repo_dir = Path(repo_dir)
+        self.kno_dir = Path(kno_dir) if kno_dir else self.repo_dir / ".kno"
+        self.path = self.kno_dir / INDEX_DIR_NAME
+        self.manifest_path = self.path / "manifest.json"
+        self.db_path = self.path / "index.sqlite3"
+        self.vectors = VectorStore(self.path) if VectorStore else None
+
+    def load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {"version": 0, "commit": None, "files": {}}
+
+    def _write_json(self, path, data):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _connect(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""CREATE TABLE IF NOT EXISTS chunks
+                        (id TEXT PRIMARY KEY,
+                         text TEXT NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS file_chunks
+                        (path TEXT NOT NULL,
+                         seq INTEGER NOT NULL,
+                         chunk_id TEXT NOT NULL,
+                         start_line INTEGER,
+                         end_line INTEGER,
+                         PRIMARY KEY (path, seq))""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_file_chunks_chunk ON file_chunks(chunk_id)")
+        if self.vectors:
+            self.vectors.init(conn)
+        return conn
+
+    def current_commit(self):
+        try:
+            return git(self.repo_dir, "rev-parse", "HEAD").strip()
+        except Exception:
+            return None
+
+    def _candidates(self, manifest, files):
+        """Files that may have changed since the manifest's commit; every file if that commit is unknown."""
+        commit = manifest.get("commit")
+        if not commit or not manifest["files"]:
+            return set(files)
+        try:
+            git(self.repo_dir, "cat-file", "-e", f"{commit}^{{commit}}")
+            diff = git(self.repo_dir, "diff", "--name-only", "--no-renames", "-z", commit)
+            untracked = git(self.repo_dir, "ls-files", "-z", "--others", "--exclude-standard")
+        except Exception as e:
+            logger.warning(f"Could not diff against {commit[:7]}, rescanning all files: {e}")
+            return set(files)
+        candidates = {name for name in (diff + untracked).split("\0") if name}
+        # A file indexed with uncommitted changes may since have been reverted to the commit
+        candidates |= set(manifest.get("dirty", ()))
+        # Files that became indexable or stopped being ignored are new to the manifest
+        return (candidates | (files - set(manifest["files"]))) & files
+
+    def _dirty(self, files):
+        """Files among `files` whose content may not be the committed one: modified since HEAD or untracked."""
+        try:
+            diff = git(self.repo_dir, "diff", "--name-only", "--no-renames", "-z", "HEAD")
+            untracked = git(self.repo_dir, "ls-files", "-z", "--others", "--exclude-standard")
+        except Exception:
+            return set(files)
+        return {name for name in (diff + untracked).split("\0") if name} & set(files)
+
+    def changes(self, manifest=None):
+        """
+        Compare the working tree with the manifest.
+
+        Returns:
+            (changed, deleted): {path: content hash} of added or modified
+            files, and the set of indexed paths that no longer exist
+        """
+        manifest = manifest or self.load_manifest()
+        files = {name for name in list_files(self.repo_dir) if is_indexable(self.repo_dir / name)}
+        deleted = set(manifest["files"]) - files
+        changed = {}
+        for name in self._candidates(manifest, files):
+            sha = file_hash(self.repo_dir / name)
+            if manifest["files"].get(name, {}).get("sha") != sha:
+                changed[name] = sha
+        return changed, deleted
+
+    def update(self, branch="main", embedding_method=None, full=False, workers=None):
+        """
+        Bring the index up to date with the working tree.
+
+        Args:
+            branch: Branch name recorded in the metadata
+            embedding_method: Embedding method recorded in the metadata; defaults to the
+                local hashed TF-IDF vectors. Changing it rebuilds the index.
+            full: Ignore the manifest and re-chunk every file
+            workers: Processes that chunk and embed files (default: one per core)
+
+        Returns:
+            Dict with the index version and counts of changed, deleted and new chunks
+        """
+        start = time.perf_counter()
+        embedding_method = embedding_method or EMBEDDING_METHOD or "None"
+        manifest = self.load_manifest()
+        if full or manifest.get("embedding_method") not in (None, embedding_method):
+            manifest = {"version": manifest["version"], "commit": None, "files": {}}
+            if self.db_path.exists():
+                self.db_path.unlink()
+            if self.vectors:
+                self.vectors.reset()
+        changed, deleted = self.changes(manifest)
+
+        new_chunks = 0
+        pending = []
+        conn = self._connect()
+        try:
+            for name in deleted:
+                conn.execute("DELETE FROM file_chunks WHERE path = ?", (name,))
+                del manifest["files"][name]
+            # Workers chunk and embed; only chunks not already in the index are kept
+            dim = self.vectors.dim if self.vectors else None
+            for name, chunks, vectors, buckets in chunk_files(self.repo_dir, sorted(changed), dim, workers):
+                conn.execute("DELETE FROM file_chunks WHERE path = ?", (name,))
+                ids = []
+                for seq, (start_line, end_line, text, cid) in enumerate(chunks):
+                    ids.append(cid)
+                    if conn.execute("INSERT OR IGNORE INTO chunks (id, text) VALUES (?, ?)", (cid, text)).rowcount:
+                        new_chunks += 1
+                        if vectors is not None:
+                            pending.append((cid, vectors[seq], buckets[seq]))
+                    conn.execute("""INSERT INTO file_chunks (path, seq, chunk_id, start_line, end_line)
+                                    VALUES (?, ?, ?, ?, ?)""", (name, seq, cid, start_line, end_line))
+                manifest["files"][name] = {"sha": changed[name], "chunks": ids}
+                if len(pending) >= EMBED_BATCH:
+                    self._store_vectors(conn, pending)
+            self._store_vectors(conn, pending)
+            removed_items = conn.execute(
+                "SELECT id, text FROM chunks WHERE id NOT IN (SELECT chunk_id FROM file_chunks)").fetchall()
+            conn.executemany("DELETE FROM chunks WHERE id = ?", [(cid,) for cid, _ in removed_items])
+            if self.vectors:
+                # Freed rows are reused by the next update's new chunks
+                self.vectors.remove(conn, removed_items)
+            conn.commit()
+            total_chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        finally:
+            conn.close()
+        if self.vectors and self.vectors.ivf_stale():
+            self.vectors.build_ivf()
+
+        removed_chunks = len(removed_items)
+        if changed or deleted or not self.manifest_path.exists():
+            manifest["version"] += 1
+        manifest["commit"] = self.current_commit()
+        manifest["dirty"] = sorted(self._dirty(manifest["files"]))
+        manifest["embedding_method"] = embedding_method
+        self._write_json(self.manifest_path, manifest)
+        self._write_json(self.path / "metadata.json", {
+            "repo": self.repo_dir.name,
+            "branch": branch,
+            "timestamp": int(time.time() * 1000),
+            "commit": (manifest["commit"] or "local")[:7],
+            "version": manifest["version"],
+            "embedding_method": embedding_method,
+            "files": len(manifest["files"]),
+            "chunks": total_chunks
+        })
+        stats = {
+            "version": manifest["version"],
+            "changed_files": len(changed),
+            "deleted_files": len(deleted),
+            "new_chunks": new_chunks,
+            "removed_chunks": removed_chunks,
+            "total_chunks": total_chunks,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        logger.info(f"Index version {stats['version']}: {stats['changed_files']} changed and "
+                    f"{stats['deleted_files']} deleted files, {new_chunks} new and {removed_chunks} "
+                    f"removed chunks ({total_chunks} total) in {stats['seconds']}s")
+        return stats
+
+    def _store_vectors(self, conn, pending):
+        if self.vectors and pending:
+            chunk_ids, vectors, buckets = zip(*pending)
+            self.vectors.add_vectors(conn, list(chunk_ids), np.stack(vectors), buckets)
+        pending.clear()
+
+    def query_features(self, query):
+        """Raw hashed features of a query, before IDF weighting; cacheable across index versions."""
+        if not self.vectors:
+            raise RuntimeError("Local search needs NumPy (pip install numpy)")
+        return self.vectors.query_features(query)
+
+    def search(self, query, k=8, nprobe=None, exhaustive=False, features=None):
+        """
+        Top-k chunks for a free-text query.
+
+        Args:
+            query: Search text; identifiers are split into words
+            k: Number of results
+            nprobe: IVF clusters to scan, when the index has an IVF partition
+            exhaustive: Score every chunk even if an IVF partition exists
+            features: Precomputed query_features(query)
+
+        Returns:
+            List of dicts with path, start_line, end_line, score and text, best first
+        """
+        if not self.vectors:
+            raise RuntimeError("Local search needs NumPy (pip install numpy)")
+        if not self.db_path.exists():
+            return []
+        conn = self._connect()
+        try:
+            live_rows = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            vector = self.vectors.query_vector(query, live_rows, features)
+            options = {"exhaustive": exhaustive}
+            if nprobe:
+                options["nprobe"] = nprobe
+            rows, scores = self.vectors.search_rows(vector, k, **options)
+            results = []
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                if score <= 0:
+                    continue
+                found = conn.execute("""SELECT c.id, c.text, f.path, f.start_line, f.end_line
+                                        FROM vectors v
+                                        JOIN chunks c ON c.id = v.chunk_id
+                                        JOIN file_chunks f ON f.chunk_id = c.id
+                                        WHERE v.row = ? ORDER BY f.path, f.seq LIMIT 1""", (row,)).fetchone()
+                if found:
+                    results.append({"chunk_id": found[0], "text": found[1], "path": found[2],
+                                    "start_line": found[3], "end_line": found[4], "score": round(score, 4)})
+            return results
+        finally:
+            conn.close()
+
+
+def remove_legacy_dirs(kno_dir, keep=0):
+    """
+    Delete old per-run .kno/embedding_* directories, keeping the `keep` newest.
+
+    Returns:
+        List of removed directory names
+    """
+    kno_dir = Path(kno_dir)
+    if not kno_dir.exists():
+        return []
+    dirs = sorted((d for d in kno_dir.iterdir() if d.is_dir() and d.name.startswith("embedding_")),
+                  key=lambda d: d.stat().st_mtime, reverse=True)
+    removed = []
+    for d in dirs[keep:]:
+        shutil.rmtree(d)
+        removed.append(d.name)
+        logger.info(f"Removed obsolete index directory {d.name}")
+    return removed
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Dependency-light local vector search for the KNO index.
+
+Chunks are embedded with signed feature hashing of identifier tokens and
+token bigrams, so no model has to be downloaded, and stored as rows of a
+memory-mapped float16 matrix. Document vectors are plain sublinear term
+frequencies; inverse document frequency is applied to the query only, so a
+stored vector depends on nothing but its chunk's text and survives
+incremental updates unchanged. Queries are scored with NumPy dot products
+over the matrix in blocks, or, once an IVF partition has been built, over
+the rows of the closest clusters only.
+"""
+
+import re
+import zlib
+import time
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("kno-index")
+
+EMBEDDING_METHOD = "HashedTFIDFEmbedding"
+DEFAULT_DIM = 256
+BLOCK_ROWS = 1 << 16
+IVF_MIN_ROWS = 50_000
+DEFAULT_NPROBE = 16
+
+TOKEN_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def tokenize(text):
+    """Lowercased identifier parts: camelCase and snake_case names are split into words."""
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+def hashed_features(text, dim=DEFAULT_DIM):
+    """
+    Signed hashed counts of a text's tokens and token bigrams.
+
+    Returns:
+        (vector, buckets): float32 vector of sublinear term frequencies and
+        the array of distinct buckets the text touched, for document frequencies
+    """
+    tokens = tokenize(text)
+    counts = {}
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        counts[feature] = counts.get(feature, 0) + 1
+    hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in counts), dtype=np.int64, count=len(counts))
+    buckets = hashes & (dim - 1)
+    weights = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts))))
+    weights *= np.where(hashes >> 31, 1.0, -1.0)
+    vector = np.bincount(buckets, weights=weights, minlength=dim).astype(np.float32)
+    return vector, np.unique(buckets)
+
+
+def embed(text, dim=DEFAULT_DIM):
+    """Unit-length document vector of a text."""
+    vector, _ = hashed_features(text, dim)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_chunks(texts, dim=DEFAULT_DIM):
+    """
+    Embed many texts.
+
+    Returns:
+        (vectors, buckets): float16 unit vectors, one row per text, and each
+        text's document-frequency buckets
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    buckets = []
+    for n, text in enumerate(texts):
+        vector, touched = hashed_features(text, dim)
+        norm = np.linalg.norm(vector)
+        vectors[n] = vector / norm if norm else vector
+        buckets.append(touched)
+    return vectors.astype(np.float16), buckets
+
+
+def top_k(scores, rows, k):
+    """The k best (row, score) pairs, best first."""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+class VectorStore:
+    """
+    Chunk vectors in <index>/vectors.f16, one float16 row per chunk.
+
+    The rows of removed chunks are zeroed and reused by later chunks; which
+    chunk owns which row is kept in the index's SQLite database. df.npy
+    holds per-bucket document frequencies for query weighting, ivf.npz the
+    optional inverted-file partition and ivf_reused.npy the rows reused since
+    it was built.
+    """
+
+    def __init__(self, path, dim=DEFAULT_DIM):
+        if dim & (dim - 1):
+            raise ValueError("dim must be a power of two")
+        self.path = Path(path)
+        self.dim = dim
+        self.matrix_path = self.path / "vectors.f16"
+        self.df_path = self.path / "df.npy"
+        self.ivf_path = self.path / "ivf.npz"
+        self.reused_path = self.path / "ivf_reused.npy"
+        self._ivf = None
+        self._ivf_mtime = None
+
+    def init(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS vectors
+                        (chunk_id TEXT PRIMARY KEY,
+                         row INTEGER UNIQUE NOT NULL)""")
+        conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+
+    def reset(self):
+        for path in (self.matrix_path, self.df_path, self.ivf_path, self.reused_path):
+            if path.exists():
+                path.unlink()
+        self._ivf = None
+
+    @property
+    def rows(self):
+        if not self.matrix_path.exists():
+            return 0
+        return self.matrix_path.stat().st_size // (self.dim * 2)
+
+    def matrix(self, mode="r"):
+        rows = self.rows
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float16)
+        return np.memmap(self.matrix_path, dtype=np.float16, mode=mode, shape=(rows, self.dim))
+
+    def _load_df(self):
+        if self.df_path.exists():
+            return np.load(self.df_path)
+        return np.zeros(self.dim, dtype=np.int64)
+
+    def _save_df(self, df):
+        with open(self.df_path, "wb") as f:
+            np.save(f, df)
+
+    def _grow(self, rows):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(rows * self.dim * 2)
+
+    def add(self, conn, items):
+        """Embed and store (chunk_id, text) pairs."""
+        if items:
+            vectors, buckets = embed_chunks([text for _, text in items], self.dim)
+            self.add_vectors(conn, [chunk_id for chunk_id, _ in items], vectors, buckets)
+
+    def add_vectors(self, conn, chunk_ids, vectors, buckets):
+        """Store already embedded chunks, filling free rows before growing the matrix."""
+        if not chunk_ids:
+            return
+        df = self._load_df()
+        for touched in buckets:
+            df[touched] += 1
+        free = [row for (row,) in conn.execute("SELECT row FROM free_rows ORDER BY row LIMIT ?", (len(chunk_ids),))]
+        start = self.rows
+        rows = free + list(range(start, start + len(chunk_ids) - len(free)))
+        if len(rows) > len(free):
+            self._grow(rows[-1] + 1)
+        matrix = self.matrix("r+")
+        matrix[rows] = vectors
+        matrix.flush()
+        del matrix
+        conn.executemany("DELETE FROM free_rows WHERE row = ?", [(row,) for row in free])
+        conn.executemany("INSERT INTO vectors (chunk_id, row) VALUES (?, ?)", list(zip(chunk_ids, rows)))
+        self._save_df(df)
+        if free and self.ivf_path.exists():
+            # The partition still files these rows under their previous chunks' clusters
+            reused = np.union1d(self.reused_rows(), free).astype(np.int64)
+            with open(self.reused_path, "wb") as f:
+                np.save(f, reused)
+
+    def remove(self, conn, items):
+        """Free the rows of (chunk_id, text) pairs; the text is needed to undo their document frequencies."""
+        if not items:
+            return
+        df = self._load_df()
+        rows = []
+        for chunk_id, text in items:
+            found = conn.execute("SELECT row FROM vectors WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if found is None:
+                continue
+            rows.append(found[0])
+            _, buckets = hashed_features(text, self.dim)
+            df[buckets] -= 1
+        if not rows:
+            return
+        matrix = self.matrix("r+")
+        matrix[sorted(rows)] = 0
+        matrix.flush()
+        del matrix
+        conn.executemany("DELETE FROM vectors WHERE row = ?", [(row,) for row in rows])
+        conn.executemany("INSERT INTO free_rows (row) VALUES (?)", [(row,) for row in rows])
+        self._save_df(np.maximum(df, 0))
+
+    def query_features(self, query):
+        return hashed_features(query, self.dim)[0].tolist()
+
+    def query_vector(self, query, live_rows, features=None):
+        """Query features weighted by inverse document frequency, unit length."""
+        if features is None:
+            vector, _ = hashed_features(query, self.dim)
+        else:
+            vector = np.asarray(features, dtype=np.float32)
+        idf = np.log((live_rows + 1) / (self._load_df() + 1)) + 1.0
+        vector *= idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # Inverted-file partition
+
+    def build_ivf(self, nlist=None, iterations=8, sample_per_list=64, seed=0):
+        """
+        Partition the rows into nlist clusters with spherical k-means on a sample.
+
+        Rows added or reused after the build are scanned exhaustively until the next build.
+        """
+        start = time.perf_counter()
+        matrix = self.matrix()
+        rows = len(matrix)
+        nlist = nlist or int(min(4096, max(16, np.sqrt(rows))))
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(rows, min(rows, nlist * sample_per_list), replace=False))]
+        sample = sample.astype(np.float32)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        assignment = np.empty(rows, dtype=np.int32)
+        for block in range(0, rows, BLOCK_ROWS):
+            chunk = matrix[block:block + BLOCK_ROWS].astype(np.float32)
+            assignment[block:block + BLOCK_ROWS] = np.argmax(chunk @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1)).astype(np.int64)
+        tmp_path = self.ivf_path.with_name("ivf.tmp.npz")
+        np.savez(tmp_path, centroids=centroids.astype(np.float32), order=order, offsets=offsets,
+                 rows=np.int64(rows))
+        tmp_path.replace(self.ivf_path)
+        if self.reused_path.exists():
+            self.reused_path.unlink()
+        self._ivf = None
+        logger.info(f"Built IVF index with {nlist} lists over {rows} rows in {time.perf_counter() - start:.1f}s")
+
+    def ivf(self):
+        """The IVF partition, reloaded when the file changes, or None."""
+        if not self.ivf_path.exists():
+            return None
+        mtime = self.ivf_path.stat().st_mtime_ns
+        if self._ivf is None or self._ivf_mtime != mtime:
+            with np.load(self.ivf_path) as data:
+                self._ivf = {name: data[name] for name in data.files}
+            self._ivf_mtime = mtime
+        return self._ivf
+
+    def reused_rows(self):
+        """Rows below the IVF partition's size that were given to new chunks after it was built."""
+        if not self.reused_path.exists():
+            return np.zeros(0, dtype=np.int64)
+        return np.load(self.reused_path)
+
+    def ivf_stale(self, fraction=0.1):
+        """
+        True when the index is large enough for IVF and has none, or when the
+        rows added or reused since the build exceed `fraction` of it.
+        """
+        rows = self.rows
+        if rows < IVF_MIN_ROWS:
+            return False
+        ivf = self.ivf()
+        if ivf is None:
+            return True
+        built = int(ivf["rows"])
+        return rows - built + len(self.reused_rows()) > built * fraction
+
+    # Search
+
+    def search_rows(self, vector, k, nprobe=DEFAULT_NPROBE, exhaustive=False):
+        """
+        Rows with the highest dot product with `vector`.
+
+        Returns:
+            (rows, scores) arrays, best first, at most k long
+        """
+        matrix = self.matrix()
+        if not len(matrix):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ivf = None if exhaustive else self.ivf()
+        best_rows, best_scores = [], []
+        if ivf is not None:
+            lists = np.argsort(-(ivf["centroids"] @ vector))[:nprobe]
+            offsets, order = ivf["offsets"], ivf["order"]
+            rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+            # Rows reused or added after the partition was built, each scored once
+            rows = np.union1d(np.union1d(rows, self.reused_rows()), np.arange(int(ivf["rows"]), len(matrix)))
+            for block in range(0, len(rows), BLOCK_ROWS):
+                chunk = rows[block:block + BLOCK_ROWS]
+                scores = matrix[chunk].astype(np.float32) @ vector
+                found = top_k(scores, chunk, k)
+                best_rows.append(found[0])
+                best_scores.append(found[1])
+        else:
+            for block in range(0, len(matrix), BLOCK_ROWS):
+                scores = matrix[block:block + BLOCK_ROWS].astype(np.float32) @ vector
+                found = top_k(scores, np.arange(block, block + len(scores)), k)
+                best_rows.append(found[0])
+                best_scores.append(found[1])
+        return top_k(np.concatenate(best_scores), np.concatenate(best_rows), k)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Lightweight stand-in for the bitcoind JSON-RPC interface.
+
+Implements just enough of the mining RPCs (getblocktemplate, submitblock,
+getblockcount, getbestblockhash, generatetoaddress) for minerd, the mining
+task API and benchmarks to run end-to-end on one machine with no network.
+New blocks can be scripted on a fixed interval, at given offsets, or by
+submitting a block that meets the configured (low) difficulty.
+"""
+
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+DIFF1_TARGET = 0x00000000FFFF0000000000000000000000000000000000000000000000000000
+MAX_TARGET = (1 << 256) - 1
+REGTEST_GENESIS = '0f9188f13cb7b2c71f2a335e3a4fc328bf5beb436012afca590b1a11466e2206'
+
+
+def sha256d(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def target_from_difficulty(difficulty):
+    """Convert a share difficulty into a 256-bit target."""
+    return min(int(DIFF1_TARGET / difficulty), MAX_TARGET)
+
+
+def compact_from_target(target):
+    """Encode a target in the compact 'bits' form used by block headers."""
+    size = (target.bit_length() + 7) // 8
+    if size <= 3:
+        mantissa = target << (8 * (3 - size))
+    else:
+        mantissa = target >> (8 * (size - 3))
+    if mantissa & 0x00800000:
+        mantissa >>= 8
+        size += 1
+    return (size << 24) | mantissa
+
+
+def target_from_compact(bits):
+    size = bits >> 24
+    mantissa = bits & 0x007fffff
+    if size <= 3:
+        return mantissa >> (8 * (3 - size))
+    return mantissa << (8 * (size - 3))
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeChain:
+    """In-memory chain tip with block template generation and share checking."""
+
+    def __init__(self, difficulty=0.0001, coinbase_value=5000000000, advance_on_submit=True,
+                 longpoll_timeout=60):
+        self.bits = compact_from_target(target_from_difficulty(difficulty))
+        self.target = target_from_compact(self.bits)
+        self.coinbase_value = coinbase_value
+        self.advance_on_submit = advance_on_submit
+        self.longpoll_timeout = longpoll_timeout
+        self.height = 0
+        self.best_hash = REGTEST_GENESIS
+        self.blocks_submitted = 0
+        self.blocks_accepted = 0
+        self.changed = threading.Condition()
+
+    def new_block(self, block_hash=None):
+        """Advance the tip by one block and wake any long-polling clients."""
+        with self.changed:
+            self.height += 1
+            self.best_hash = block_hash or sha256d(
+                f'{self.best_hash}:{self.height}:{time.time()}'.encode())[::-1].hex()
+            self.changed.notify_all()
+            logging.info(f"New block {self.height}: {self.best_hash[:16]}...")
+            return self.best_hash
+
+    def getblocktemplate(self, request=None):
+        request = request or {}
+        longpollid = request.get('longpollid')
+        with self.changed:
+            if longpollid and longpollid == self._longpollid():
+                self.changed.wait(self.longpoll_timeout)
+            now = int(time.time())
+            return {
+                'capabilities': ['proposal'],
+                'version': 0x20000000,
+                'rules': [],
+                'vbavailable': {},
+                'vbrequired': 0,
+                'previousblockhash': self.best_hash,
+                'transactions': [],
+                'coinbaseaux': {'flags': ''},
+                'coinbasevalue': self.coinbase_value,
+                'longpollid': self._longpollid(),
+                'target': f'{self.target:064x}',
+                'mintime': now - 600,
+                'mutable': ['time', 'transactions', 'prevblock'],
+                'noncerange': '00000000ffffffff',
+                'sigoplimit': 80000,
+                'sizelimit': 4000000,
+                'weightlimit': 4000000,
+                'curtime': now,
+                'bits': f'{self.bits:08x}',
+                'height': self.height + 1
+            }
+
+    def submitblock(self, hexdata, *args):
+        try:
+            header = bytes.fromhex(hexdata[:160])
+        except ValueError:
+            raise RPCError(-22, 'Block decode failed')
+        if len(header) != 80:
+            raise RPCError(-22, 'Block decode failed')
+        with self.changed:
+            self.blocks_submitted += 1
+            if header[4:36][::-1].hex() != self.best_hash:
+                return 'inconclusive-not-best-prevblk'
+            block_hash = sha256d(header)[::-1].hex()
+            if int(block_hash, 16) > self.target:
+                return 'high-hash'
+            self.blocks_accepted += 1
+            if self.advance_on_submit:
+                self.new_block(block_hash)
+            return None
+
+    def getblockcount(self):
+        return self.height
+
+    def getbestblockhash(self):
+        return self.best_hash
+
+    def generatetoaddress(self, nblocks, address=None, *args):
+        return [self.new_block() for _ in range(int(nblocks))]
+
+    def _longpollid(self):
+        return f'{self.best_hash}{self.height}'
+
+
+RPC_METHODS = ('getblocktemplate', 'submitblock', 'getblockcount', 'getbestblockhash', 'generatetoaddress')
+
+
+class RPCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    chain = None
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            self._reply({'result': None, 'error': {'code': -32700, 'message': 'Parse error'}, 'id': None})
+            return
+        if isinstance(body, list):
+            self._reply([self._dispatch(call) for call in body])
+        else:
+            self._reply(self._dispatch(body))
+
+    def _dispatch(self, call):
+        method = call.get('method')
+        try:
+            if method not in RPC_METHODS:
+                raise RPCError(-32601, 'Method not found')
+            result = getattr(self.chain, method)(*call.get('params', []))
+            return {'result': result, 'error': None, 'id': call.get('id')}
+        except RPCError as e:
+            return {'result': None, 'error': {'code': e.code, 'message': e.message}, 'id': call.get('id')}
+        except TypeError as e:
+            return {'result': None, 'error': {'code': -1, 'message': str(e)}, 'id': call.get('id')}
+
+    def _reply(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def schedule_blocks(chain, interval=None, offsets=None):
+    """Produce new blocks every `interval` seconds and/or at each offset (seconds from now)."""
+    def run_interval():
+        while True:
+            time.sleep(interval)
+            chain.new_block()
+
+    def run_offsets():
+        start = time.time()
+        for offset in sorted(offsets):
+            time.sleep(max(0, start + offset - time.time()))
+            chain.new_block()
+
+    if interval:
+        threading.Thread(target=run_interval, daemon=True).start()
+    if offsets:
+        threading.Thread(target=run_offsets, daemon=True).start()
+
+
+def serve(host='127.0.0.1', port=8332, chain=None):
+    """Start the fake node in a background thread and return (server, chain)."""
+    chain = chain or FakeChain()
+    handler = type('BoundRPCHandler', (RPCHandler,), {'chain': chain})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, chain
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake bitcoind JSON-RPC server for offline mining benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8332)
+    parser.add_argument('--difficulty', type=float, default=0.0001, help='Block difficulty (1.0 = diff1 target)')
+    parser.add_argument('--block-interval', type=float, default=None, help='Seconds between scripted new blocks')
+    parser.add_argument('--script', default=None, help='JSON file with a list of new-block offsets in seconds')
+    parser.add_argument('--no-advance-on-submit', action='store_true',
+                        help='Keep the tip fixed when a valid block is submitted')
+    parser.add_argument('--longpoll-timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    offsets = None
+    if args.script:
+        with open(args.script, 'r') as f:
+            offsets = json.load(f)
+
+    chain = FakeChain(
+        difficulty=args.difficulty,
+        advance_on_submit=not args.no_advance_on_submit,
+        longpoll_timeout=args.longpoll_timeout
+    )
+    server, chain = serve(args.host, args.port, chain)
+    schedule_blocks(chain, args.block_interval, offsets)
+    logging.info(f"Fake bitcoind listening on {args.host}:{args.port} (bits {chain.bits:08x})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
 import time
 import json
+import queue
 import sqlite3
 import subprocess
 import threading
@@ -27,8 +29,10 @@ app = Flask(__name__)
 
 # Global state
 startup_time = time.time()
-startup_timeout = 120  # 2 minutes
-test_timeout = 300     # 5 minutes
+startup_timeout = int(os.environ.get('STARTUP_TIMEOUT', 120))  # 2 minutes, 0 disables
+test_timeout = int(os.environ.get('TEST_TIMEOUT', 300))        # 5 minutes, 0 disables
+bitcoin_rpc_url = os.environ.get('BITCOIN_RPC_URL', 'http://127.0.0.1:8332')
+use_fake_bitcoind = os.environ.get('FAKE_BITCOIND', '0') == '1'
 bitcoind_process = None
 miner_process = None
 health_status = {
@@ -47,13 +51,26 @@ shares_submitted = Counter('miner_shares_submitted', 'Total shares submitted')
 valid_shares = Counter('miner_valid_shares', 'Total valid shares')
 invalid_shares = Counter('miner_invalid_shares', 'Total invalid shares')
 
+# minerd output parsing
+MINER_WORKER_ID = 'testuser'
+MINER_LINE_MAX = 4096         # longer lines are split rather than buffered
+SHARE_QUEUE_MAX = 10000       # accepted shares waiting for the batch writer
+SHARE_BATCH_SIZE = 500
+SHARE_FLUSH_INTERVAL = 1.0    # seconds
+THREAD_RATE_RE = re.compile(r'thread (\d+): \d+ hashes, ([\d.]+) ([kM]?)hash/s')
+RESULT_RE = re.compile(r'accepted: \d+/\d+ \([\d.]+%\), [\d.]+ [kM]?hash/s \((yay!!!|booooo)\)')
+HASH_RE = re.compile(r'Hash:\s+([0-9a-f]{64})')
+DIFFICULTY_RE = re.compile(r'difficulty set to ([\d.eE+-]+)')
+RATE_UNITS = {'': 1, 'k': 1e3, 'M': 1e6}
+share_queue = queue.Queue(maxsize=SHARE_QUEUE_MAX)
+
 def check_timeout():
     while True:
         current_time = time.time()
-        if current_time - startup_time > startup_timeout:
+        if startup_timeout and current_time - startup_time > startup_timeout:
             logging.error("Startup timeout reached")
             sys.exit(1)
-        if current_time - startup_time > test_timeout:
+        if test_timeout and current_time - startup_time > test_timeout:
             logging.error("Test timeout reached")
             sys.exit(1)
         time.sleep(5)
@@ -107,13 +124,109 @@ def store_share(hash_value, difficulty, valid, block_height, worker_id):
     except Exception as e:
         logging.error(f"Error storing share: {e}")
 
+def store_shares(shares):
+    """Store a batch of (timestamp, hash, difficulty, valid, block_height, worker_id) rows in one transaction."""
+    try:
+        conn = sqlite3.connect('/app/data/shares.db')
+        with conn:
+            conn.executemany('''INSERT INTO shares
+                                (timestamp, hash, difficulty, valid, block_height, worker_id)
+                                VALUES (?, ?, ?, ?, ?, ?)''', shares)
+        conn.close()
+        health_status['share_collection'] = True
+        logging.info(f"Stored batch of {len(shares)} shares")
+    except Exception as e:
+        logging.error(f"Error storing share batch: {e}")
+
+def share_writer():
+    """Drain the share queue into SQLite in batches of up to SHARE_BATCH_SIZE."""
+    while True:
+        batch = [share_queue.get()]
+        deadline = time.time() + SHARE_FLUSH_INTERVAL
+        while len(batch) < SHARE_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(share_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        store_shares(batch)
+
+def parse_miner_line(line):
+    """Parse one line of minerd output.
+
+    Returns ('rate', thread, hashes_per_second), ('result', accepted),
+    ('hash', hex_hash), ('difficulty', value) or None for anything else.
+    """
+    if 'hash/s' in line:
+        match = RESULT_RE.search(line)
+        if match:
+            return ('result', match.group(1) == 'yay!!!')
+        match = THREAD_RATE_RE.search(line)
+        if match:
+            return ('rate', int(match.group(1)), float(match.group(2)) * RATE_UNITS[match.group(3)])
+    elif 'Hash:' in line:
+        match = HASH_RE.search(line)
+        if match:
+            return ('hash', match.group(1))
+    elif 'difficulty set to' in line:
+        match = DIFFICULTY_RE.search(line)
+        if match:
+            return ('difficulty', float(match.group(1)))
+    return None
+
+def read_miner_output(stream):
+    """Consume minerd output line by line, updating metrics and queueing accepted shares.
+
+    Runs until the pipe is closed. Only the current line is held in memory, so the
+    pipe never fills up regardless of how fast minerd writes.
+    """
+    thread_rates = {}
+    last_hash = ''
+    difficulty = 1.0
+    dropped = 0
+    for line in iter(lambda: stream.readline(MINER_LINE_MAX), ''):
+        event = parse_miner_line(line)
+        if event is None:
+            continue
+        kind = event[0]
+        if kind == 'rate':
+            thread_rates[event[1]] = event[2]
+            hash_rate.set(sum(thread_rates.values()))
+        elif kind == 'hash':
+            last_hash = event[1]
+        elif kind == 'difficulty':
+            difficulty = event[1]
+        elif kind == 'result':
+            # The hash belongs to this share only; minerd prints one 'Hash:' line per submission
+            share_hash, last_hash = last_hash, ''
+            shares_submitted.inc()
+            if not event[1]:
+                invalid_shares.inc()
+                continue
+            valid_shares.inc()
+            try:
+                share_queue.put_nowait((int(time.time()), share_hash, difficulty, 1, None, MINER_WORKER_ID))
+            except queue.Full:
+                dropped += 1
+                if dropped % 1000 == 1:
+                    logging.warning(f"Share queue full, dropped {dropped} shares so far")
+    logging.warning("Miner output stream closed")
+
 def start_bitcoind():
     global bitcoind_process
     try:
-        bitcoind_process = subprocess.Popen(['bitcoind', '-conf=/app/config/bitcoin.conf'])
-        time.sleep(5)  # Wait for bitcoind to start
+        if use_fake_bitcoind:
+            fake_bitcoind = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_bitcoind.py')
+            bitcoind_process = subprocess.Popen([sys.executable, fake_bitcoind,
+                                                 '--difficulty', os.environ.get('FAKE_DIFFICULTY', '0.0001')])
+            time.sleep(1)  # Wait for the stand-in to bind
+        else:
+            bitcoind_process = subprocess.Popen(['bitcoind', '-conf=/app/config/bitcoin.conf'])
+            time.sleep(5)  # Wait for bitcoind to start
         health_status['bitcoind'] = True
-        logging.info("Started bitcoind")
+        logging.info("Started fake bitcoind" if use_fake_bitcoind else "Started bitcoind")
     except Exception as e:
         logging.error(f"Error starting bitcoind: {e}")
         sys.exit(1)
@@ -123,11 +236,18 @@ def start_miner():
     try:
         miner_process = subprocess.Popen(['minerd', 
                                '-a', 'sha256d',
-                               '-o', 'http://127.0.0.1:8332',
+                               '-o', bitcoin_rpc_url,
                                '-u', 'testuser',
                                '-p', 'testpass',
                                '--coinbase-addr=1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',
-                               '-t', '1'])
+                               '-t', '1',
+                               '-D'],  # debug output carries the 'Hash:' line of each submitted share
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               text=True,
+                               errors='replace')
+        output_thread = threading.Thread(target=read_miner_output, args=(miner_process.stdout,), daemon=True)
+        output_thread.start()
         health_status['miner'] = True
         logging.info("Started miner")
     except Exception as e:
@@ -176,6 +296,10 @@ if __name__ == '__main__':
 
         # Initialize database
         init_db()
+
+        # Start batched share writer
+        writer_thread = threading.Thread(target=share_writer, daemon=True)
+        writer_thread.start()
         
         # Start bitcoind
         start_bitcoind()
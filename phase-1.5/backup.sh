@@ -3,24 +3,22 @@
 # Configuration
 APP_DIR="/opt/koii-mining"
 BACKUP_DIR="/opt/koii-mining/backups"
-DB_FILE="$APP_DIR/data/shares.db"
-TIMESTAMP=$(date +%Y%m%d_%H%M%S)
-BACKUP_FILE="$BACKUP_DIR/shares_$TIMESTAMP.db"
+DB_FILE="${DB_PATH:-$APP_DIR/data/shares.db}"
+RETENTION_DAYS=30
 
-# Create backup directory if it doesn't exist
-mkdir -p $BACKUP_DIR
+# Use the application's virtualenv when present
+PYTHON="$APP_DIR/venv/bin/python3"
+if [ ! -x "$PYTHON" ]; then
+    PYTHON=python3
+fi
 
-# Create backup
+# Take an online backup: a consistent snapshot of the live database, storing
+# only pages changed since the previous backup (streamed through zlib)
 echo "Creating database backup..."
-cp $DB_FILE $BACKUP_FILE
-
-# Compress backup
-echo "Compressing backup..."
-gzip $BACKUP_FILE
-
-# Remove backups older than 30 days
-echo "Cleaning up old backups..."
-find $BACKUP_DIR -name "shares_*.db.gz" -mtime +30 -delete
+$PYTHON $APP_DIR/src/backup.py backup \
+    --db "$DB_FILE" \
+    --dir "$BACKUP_DIR" \
+    --retention-days $RETENTION_DAYS || exit 1
 
 echo "Backup completed successfully!"
-echo "Backup file: $BACKUP_FILE.gz" 
\ No newline at end of file
+echo "Restore with: $PYTHON $APP_DIR/src/backup.py restore --dir $BACKUP_DIR --output restored.db [--at <time>]"
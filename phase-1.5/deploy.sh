@@ -14,12 +14,14 @@ echo "Creating application directory..."
 sudo mkdir -p $APP_DIR
 sudo chown -R $USER:$USER $APP_DIR
 
-# Copy application files
+# Copy application files: the service code is phase-1's, plus the backup tool from here
 echo "Copying application files..."
-cp -r src/* $APP_DIR/src/
+mkdir -p $APP_DIR/src
+cp -r ../phase-1/src/* $APP_DIR/src/
+cp src/backup.py $APP_DIR/src/
 cp requirements.txt $APP_DIR/
-cp start.sh $APP_DIR/
-chmod +x $APP_DIR/start.sh
+cp start.sh backup.sh gunicorn.conf.py $APP_DIR/
+chmod +x $APP_DIR/start.sh $APP_DIR/backup.sh
 
 # Install dependencies
 echo "Installing dependencies..."
@@ -0,0 +1,34 @@
+# Gunicorn settings for the mining task API; start.sh runs
+#   gunicorn --config gunicorn.conf.py 'src.mining_task:create_app()'
+#
+# The app is preloaded: Flask, Prometheus and the storage modules are imported
+# and the database schema is created once, in the master, and the workers are
+# forked from it already initialized. Threads do not survive a fork, so each
+# worker starts its own pollers and monitors in post_fork.
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+timeout = 120
+preload_app = True
+accesslog = 'logs/access.log'
+errorlog = 'logs/error.log'
+loglevel = os.environ.get('LOG_LEVEL', 'INFO').lower()
+
+
+def when_ready(server):
+    # One metrics endpoint for the node, aggregating every worker through PROMETHEUS_MULTIPROC_DIR
+    from src.mining_task import start_metrics_server
+    start_metrics_server()
+
+
+def post_fork(server, worker):
+    from src.mining_task import init_worker
+    init_worker()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Online, incremental backups of the shares database.
+
+A backup pins a consistent snapshot of the live database with a read
+transaction and hashes its pages straight from the source, with no copy. In
+WAL mode (the storage backends enable it) a snapshot is the database file
+overlaid with the WAL frames committed when the read transaction started;
+those frames are read while briefly holding the write lock, which is the only
+time writers wait. Pages are compared against the previous backup's page
+hashes and only changed pages are written, as a zlib-compressed stream of
+(page number, page) records. Every `full_every` backups a full copy starts a
+new chain, which bounds restore time.
+
+Restoring replays a chain (full copy plus increments) up to the newest backup
+taken at or before the requested time and verifies the result against that
+backup's page hashes.
+
+    python src/backup.py backup --db data/shares.db --dir backups
+    python src/backup.py restore --dir backups --output restored.db --at 2025-05-01T12:00:00
+    python src/backup.py list --dir backups
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import logging
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HASH_SIZE = 16
+RECORD_HEADER = struct.Struct('>I')
+READ_CHUNK = 1 << 16
+WAL_HEADER = struct.Struct('>IIIIII')
+WAL_FRAME_HEADER = struct.Struct('>IIII')
+WAL_FRAME_HEADER_SIZE = 24
+# The start of the wal-index header in the -shm file (native byte order):
+# isInit, page size and mxFrame, the last frame committed to the WAL
+WAL_INDEX_HEADER = struct.Struct('=12xBxHI')
+WAL_INDEX_HEADER_SIZE = 48
+
+
+def _page_hash(page: bytes) -> bytes:
+    return hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+
+
+def _page_count(path: str, page_size: int) -> int:
+    return os.path.getsize(path) // page_size
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def list_backups(backup_dir: str) -> List[Dict]:
+    """Return completed backup manifests, oldest first."""
+    manifests = []
+    if not os.path.isdir(backup_dir):
+        return manifests
+    for name in os.listdir(backup_dir):
+        if name.endswith('.json'):
+            with open(os.path.join(backup_dir, name), 'r') as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m['created_at'])
+
+
+def _load_hashes(backup_dir: str, backup_id: str) -> bytes:
+    with open(os.path.join(backup_dir, f'{backup_id}.hashes'), 'rb') as f:
+        return f.read()
+
+
+def _wal_pages(db_path: str) -> Tuple[Dict[int, bytes], int, int]:
+    """Return the committed WAL frames as {page number: newest page}, the frame count and page count.
+
+    Only valid while holding the write lock: mxFrame in the wal-index can
+    then not move, so frames past it (uncommitted or left over from an
+    earlier WAL generation) are never read.
+    """
+    with open(f'{db_path}-shm', 'rb') as f:
+        index = f.read(2 * WAL_INDEX_HEADER_SIZE)
+    if len(index) < 2 * WAL_INDEX_HEADER_SIZE or index[:WAL_INDEX_HEADER_SIZE] != index[WAL_INDEX_HEADER_SIZE:]:
+        raise ValueError(f"Unreadable wal-index header in {db_path}-shm")
+    is_init, page_size, max_frame = WAL_INDEX_HEADER.unpack_from(index)
+    if not is_init:
+        raise ValueError(f"Wal-index in {db_path}-shm is not initialized")
+    page_size = 65536 if page_size == 1 else page_size
+    pages = {}
+    page_count = 0
+    if not max_frame:
+        return pages, 0, page_count
+    with open(f'{db_path}-wal', 'rb') as f:
+        salts = WAL_HEADER.unpack(f.read(WAL_HEADER.size))[4:6]
+        f.seek(32)
+        for _ in range(max_frame):
+            header = f.read(WAL_FRAME_HEADER_SIZE)
+            page_no, commit_size, salt1, salt2 = WAL_FRAME_HEADER.unpack_from(header)
+            page = f.read(page_size)
+            if (salt1, salt2) != salts or len(page) != page_size:
+                raise ValueError(f"WAL frame for page {page_no} in {db_path}-wal does not match the wal-index")
+            pages[page_no - 1] = page
+            if commit_size:
+                page_count = commit_size
+    return pages, max_frame, page_count
+
+
+def snapshot(db_path: str) -> Tuple[sqlite3.Connection, Dict]:
+    """Pin a consistent snapshot of the live database with a read transaction.
+
+    Returns the connection holding it, to be closed once the pages have been
+    read with `snapshot_pages`, and the snapshot's stats. In WAL mode the
+    committed WAL frames are read while holding the write lock, and the read
+    transaction is opened before the lock is released, so it sees exactly
+    those frames. It then keeps checkpoints from overwriting pages in the
+    database file with later commits. Writers wait only for the WAL read. In
+    rollback-journal mode the read transaction keeps writers out of the file
+    until the pages have been read, so that whole time is writer-blocked.
+    """
+    source = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    stats = {'journal_mode': source.execute('PRAGMA journal_mode').fetchone()[0], 'wal_pages': {}, 'wal_frames': 0}
+    start = time.perf_counter()
+    try:
+        if stats['journal_mode'] == 'wal':
+            writer = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+            try:
+                writer.execute('BEGIN IMMEDIATE')
+                try:
+                    stats['wal_pages'], stats['wal_frames'], page_count = _wal_pages(db_path)
+                    source.execute('BEGIN')
+                    source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                finally:
+                    writer.execute('ROLLBACK')
+            finally:
+                writer.close()
+            stats['writer_blocked_seconds'] = time.perf_counter() - start
+        else:
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            page_count = 0
+        page_size = source.execute('PRAGMA page_size').fetchone()[0]
+        stats['page_size'] = page_size
+        stats['page_count'] = page_count or _page_count(db_path, page_size)
+    except Exception:
+        source.close()
+        raise
+    stats['snapshot_seconds'] = time.perf_counter() - start
+    return source, stats
+
+
+def snapshot_pages(db_path: str, stats: Dict, step_pages: int = 4096, pause: float = 0.0) -> Iterator[bytes]:
+    """Yield the snapshot's pages in order, from the WAL frames or else the database file.
+
+    `step_pages` and `pause` throttle the reads.
+    """
+    wal_pages = stats['wal_pages']
+    page_size = stats['page_size']
+    with open(db_path, 'rb') as f:
+        for page_no in range(stats['page_count']):
+            page = wal_pages.get(page_no)
+            if page is None:
+                f.seek(page_no * page_size)
+                page = f.read(page_size)
+                if len(page) != page_size:
+                    raise ValueError(f"Page {page_no} is missing from {db_path}")
+            yield page
+            if pause and page_no % step_pages == step_pages - 1:
+                time.sleep(pause)
+
+
+def backup(db_path: str, backup_dir: str, step_pages: int = 4096, full_every: int = 24,
+           level: int = 6, pause: float = 0.0) -> Dict:
+    """Take a backup and return its manifest, including throughput and writer-blocked time."""
+    os.makedirs(backup_dir, exist_ok=True)
+    start = time.perf_counter()
+    created_at = time.time()
+    backup_id = datetime.fromtimestamp(created_at).strftime('%Y%m%d_%H%M%S_%f')
+    pinned = time.perf_counter()
+    source, stats = snapshot(db_path)
+    try:
+        page_size = stats['page_size']
+        previous = list_backups(backup_dir)
+        parent = previous[-1] if previous else None
+        if parent and (parent['page_size'] != page_size or parent['chain_length'] >= full_every):
+            parent = None
+        previous_hashes = _load_hashes(backup_dir, parent['id']) if parent else b''
+
+        hashes = bytearray()
+        changed = 0
+        written = 0
+        compressor = zlib.compressobj(level)
+        pages_path = os.path.join(backup_dir, f'{backup_id}.pages.zz')
+        with open(pages_path, 'wb') as out:
+            for page_no, page in enumerate(snapshot_pages(db_path, stats, step_pages, pause)):
+                digest = _page_hash(page)
+                hashes += digest
+                offset = page_no * HASH_SIZE
+                if previous_hashes[offset:offset + HASH_SIZE] != digest:
+                    written += out.write(compressor.compress(RECORD_HEADER.pack(page_no) + page))
+                    changed += 1
+            written += out.write(compressor.flush())
+            out.flush()
+            os.fsync(out.fileno())
+    finally:
+        source.close()
+    if stats['journal_mode'] != 'wal':
+        stats['writer_blocked_seconds'] = time.perf_counter() - pinned
+    _write_atomic(os.path.join(backup_dir, f'{backup_id}.hashes'), bytes(hashes))
+
+    elapsed = time.perf_counter() - start
+    page_count = stats['page_count']
+    db_bytes = page_count * page_size
+    manifest = {
+        'id': backup_id,
+        'kind': 'incremental' if parent else 'full',
+        'parent': parent['id'] if parent else None,
+        'chain_length': parent['chain_length'] + 1 if parent else 1,
+        'created_at': created_at,
+        'created_at_iso': datetime.fromtimestamp(created_at).isoformat(),
+        'page_size': page_size,
+        'page_count': page_count,
+        'changed_pages': changed,
+        'db_bytes': db_bytes,
+        'bytes_written': written,
+        'digest': hashlib.blake2b(bytes(hashes), digest_size=HASH_SIZE).hexdigest(),
+        'elapsed_seconds': round(elapsed, 4),
+        'throughput_mb_s': round(db_bytes / elapsed / 2 ** 20, 2) if elapsed else None,
+        'snapshot_seconds': round(stats['snapshot_seconds'], 4),
+        'journal_mode': stats['journal_mode'],
+        'writer_blocked_seconds': round(stats['writer_blocked_seconds'], 4),
+        'wal_frames': stats['wal_frames']
+    }
+    # The manifest is written last; a backup without one is incomplete and ignored
+    _write_atomic(os.path.join(backup_dir, f'{backup_id}.json'), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def _chain(manifests: List[Dict], target: Dict) -> List[Dict]:
+    by_id = {m['id']: m for m in manifests}
+    chain = [target]
+    while chain[-1]['parent']:
+        parent = by_id.get(chain[-1]['parent'])
+        if parent is None:
+            raise ValueError(f"Backup {chain[-1]['parent']} needed by {target['id']} is missing")
+        chain.append(parent)
+    return chain[::-1]
+
+
+def _apply_pages(pages_path: str, page_size: int, out) -> None:
+    decompressor = zlib.decompressobj()
+    record_size = RECORD_HEADER.size + page_size
+    buffer = b''
+    with open(pages_path, 'rb') as f:
+        while True:
+            data = f.read(READ_CHUNK)
+            buffer += decompressor.decompress(data) if data else decompressor.flush()
+            usable = len(buffer) - len(buffer) % record_size
+            for start in range(0, usable, record_size):
+                page_no = RECORD_HEADER.unpack_from(buffer, start)[0]
+                out.seek(page_no * page_size)
+                out.write(buffer[start + RECORD_HEADER.size:start + record_size])
+            buffer = buffer[usable:]
+            if not data:
+                break
+    if buffer:
+        raise ValueError(f"Truncated page stream in {pages_path}")
+
+
+def select_backup(manifests: List[Dict], at: Optional[str] = None) -> Dict:
+    """Pick a backup by id, or the newest taken at or before `at` (ISO time or epoch)."""
+    if not manifests:
+        raise ValueError("No backups found")
+    if at is None:
+        return manifests[-1]
+    for manifest in manifests:
+        if manifest['id'] == at:
+            return manifest
+    try:
+        cutoff = float(at)
+    except ValueError:
+        cutoff = datetime.fromisoformat(at).timestamp()
+    candidates = [m for m in manifests if m['created_at'] <= cutoff]
+    if not candidates:
+        raise ValueError(f"No backup taken at or before {at}")
+    return candidates[-1]
+
+
+def restore(backup_dir: str, output: str, at: Optional[str] = None) -> Dict:
+    """Rebuild the database as of a backup and verify it page by page."""
+    manifests = list_backups(backup_dir)
+    target = select_backup(manifests, at)
+    page_size = target['page_size']
+    tmp_output = f"{output}.restoring"
+    with open(tmp_output, 'wb') as out:
+        for manifest in _chain(manifests, target):
+            _apply_pages(os.path.join(backup_dir, f"{manifest['id']}.pages.zz"), page_size, out)
+        out.truncate(target['page_count'] * page_size)
+
+    expected = _load_hashes(backup_dir, target['id'])
+    with open(tmp_output, 'rb') as f:
+        actual = b''.join(_page_hash(page) for page in iter(lambda: f.read(page_size), b''))
+    if actual != expected:
+        os.remove(tmp_output)
+        raise ValueError(f"Restored pages do not match backup {target['id']}")
+    conn = sqlite3.connect(tmp_output)
+    try:
+        check = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+    if check != 'ok':
+        os.remove(tmp_output)
+        raise ValueError(f"Integrity check failed for backup {target['id']}: {check}")
+    os.replace(tmp_output, output)
+    return target
+
+
+def prune(backup_dir: str, retention_days: float) -> List[str]:
+    """Delete backups older than the retention window unless a kept backup builds on them."""
+    manifests = list_backups(backup_dir)
+    cutoff = time.time() - retention_days * 86400
+    # The newest backup is always kept, however old
+    kept = [m for m in manifests if m['created_at'] >= cutoff] or manifests[-1:]
+    needed = {m['id'] for k in kept for m in _chain(manifests, k)}
+    removed = []
+    for manifest in manifests:
+        if manifest['id'] in needed:
+            continue
+        for suffix in ('.json', '.pages.zz', '.hashes'):
+            path = os.path.join(backup_dir, f"{manifest['id']}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(manifest['id'])
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online incremental backups of the shares database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = subparsers.add_parser('backup', help='Take a backup')
+    backup_parser.add_argument('--db', default=os.environ.get('DB_PATH', 'data/shares.db'))
+    backup_parser.add_argument('--dir', default='backups')
+    backup_parser.add_argument('--step-pages', type=int, default=4096, help='Pages read between pauses')
+    backup_parser.add_argument('--full-every', type=int, default=24, help='Start a new full chain after N backups')
+    backup_parser.add_argument('--level', type=int, default=6, help='zlib compression level')
+    backup_parser.add_argument('--retention-days', type=float, default=None)
+
+    restore_parser = subparsers.add_parser('restore', help='Restore a backup')
+    restore_parser.add_argument('--dir', default='backups')
+    restore_parser.add_argument('--output', required=True)
+    restore_parser.add_argument('--at', default=None, help='Backup id, ISO time or epoch seconds (default: latest)')
+
+    list_parser = subparsers.add_parser('list', help='List backups')
+    list_parser.add_argument('--dir', default='backups')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        if args.command == 'backup':
+            manifest = backup(args.db, args.dir, args.step_pages, args.full_every, args.level)
+            logging.info(f"Backup {manifest['id']} ({manifest['kind']}): {manifest['changed_pages']}/"
+                         f"{manifest['page_count']} pages, {manifest['bytes_written']} bytes written, "
+                         f"{manifest['throughput_mb_s']} MB/s, writer blocked "
+                         f"{manifest['writer_blocked_seconds']} s ({manifest['journal_mode']} mode)")
+            if args.retention_days is not None:
+                removed = prune(args.dir, args.retention_days)
+                if removed:
+                    logging.info(f"Pruned {len(removed)} expired backups")
+            print(json.dumps(manifest))
+        elif args.command == 'restore':
+            manifest = restore(args.dir, args.output, args.at)
+            logging.info(f"Restored backup {manifest['id']} ({manifest['created_at_iso']}) to {args.output}")
+        else:
+            for manifest in list_backups(args.dir):
+                print(f"{manifest['id']}  {manifest['kind']:<11} {manifest['created_at_iso']}  "
+                      f"{manifest['changed_pages']:>8}/{manifest['page_count']:<8} pages  "
+                      f"{manifest['bytes_written']:>12} bytes")
+    except Exception as e:
+        logging.error(f"Error running {args.command}: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,15 +9,13 @@ fi
 export PORT=${PORT:-8080}
 export LOG_LEVEL=${LOG_LEVEL:-INFO}
 export DB_PATH=${DB_PATH:-data/shares.db}
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-4}
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-data/prometheus}
 
-# Create necessary directories
+# Create necessary directories; stale metric files from a previous run are dropped
 mkdir -p data logs
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
-# Start the application
-exec gunicorn \
-    --bind 0.0.0.0:${PORT} \
-    --workers 4 \
-    --timeout 120 \
-    --access-logfile logs/access.log \
-    --error-logfile logs/error.log \
-    src.mining_task:app 
\ No newline at end of file
+# Start the application (settings and worker hooks in gunicorn.conf.py)
+exec gunicorn --config gunicorn.conf.py "src.mining_task:create_app()" 
\ No newline at end of file
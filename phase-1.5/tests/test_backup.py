@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.backup import backup, restore, prune, list_backups, select_backup
+
+
+def create_db(path, journal_mode='wal', rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.execute('CREATE TABLE shares (id INTEGER PRIMARY KEY, worker_id TEXT, hash TEXT)')
+    conn.executemany('INSERT INTO shares (worker_id, hash) VALUES (?, ?)',
+                     [(f'worker-{n % 50}', f'{n:064x}') for n in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def rows_of(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT id, worker_id, hash FROM shares ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db = os.path.join(self.tmp_dir.name, 'shares.db')
+        self.backups = os.path.join(self.tmp_dir.name, 'backups')
+        self.restored = os.path.join(self.tmp_dir.name, 'restored.db')
+
+    def test_backup_under_concurrent_writes_restores_consistently(self):
+        create_db(self.db)
+        stop = threading.Event()
+
+        def write():
+            conn = sqlite3.connect(self.db, timeout=30)
+            n = 0
+            while not stop.is_set():
+                with conn:
+                    conn.executemany('INSERT INTO shares (worker_id, hash) VALUES (?, ?)',
+                                     [(f'writer-{n}', f'{n + i:064x}') for i in range(20)])
+                n += 20
+            conn.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            manifests = [backup(self.db, self.backups) for _ in range(4)]
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(manifests[0]['journal_mode'], 'wal')
+        self.assertTrue(any(manifest['wal_frames'] for manifest in manifests))
+        for manifest in manifests:
+            # restore() also checks the page hashes and PRAGMA integrity_check
+            restore(self.backups, self.restored, at=manifest['id'])
+            ids = [row[0] for row in rows_of(self.restored)]
+            # Whole transactions only: ids are contiguous and end on a 20-row batch
+            self.assertEqual(ids, list(range(1, len(ids) + 1)))
+            self.assertEqual((len(ids) - 2000) % 20, 0)
+
+    def test_incremental_backup_writes_only_changed_pages(self):
+        create_db(self.db)
+        full = backup(self.db, self.backups)
+        conn = sqlite3.connect(self.db)
+        conn.execute("UPDATE shares SET worker_id = 'changed' WHERE id = 1000")
+        conn.commit()
+        conn.close()
+        incremental = backup(self.db, self.backups)
+
+        self.assertEqual(full['kind'], 'full')
+        self.assertEqual(full['changed_pages'], full['page_count'])
+        self.assertEqual(incremental['kind'], 'incremental')
+        self.assertEqual(incremental['parent'], full['id'])
+        self.assertLess(incremental['changed_pages'], full['page_count'] // 4)
+        self.assertLess(incremental['bytes_written'], full['bytes_written'])
+        restore(self.backups, self.restored)
+        self.assertEqual(rows_of(self.restored), rows_of(self.db))
+
+    def test_restore_at_point_in_time(self):
+        create_db(self.db)
+        first = backup(self.db, self.backups)
+        expected = rows_of(self.db)
+        conn = sqlite3.connect(self.db)
+        conn.execute('DELETE FROM shares WHERE id > 100')
+        conn.commit()
+        conn.close()
+        second = backup(self.db, self.backups)
+
+        manifests = list_backups(self.backups)
+        self.assertEqual(select_backup(manifests)['id'], second['id'])
+        self.assertEqual(select_backup(manifests, first['id'])['id'], first['id'])
+        self.assertEqual(select_backup(manifests, str(first['created_at']))['id'], first['id'])
+        with self.assertRaises(ValueError):
+            select_backup(manifests, str(first['created_at'] - 60))
+
+        restore(self.backups, self.restored, at=str(first['created_at']))
+        self.assertEqual(rows_of(self.restored), expected)
+        restore(self.backups, self.restored)
+        self.assertEqual(len(rows_of(self.restored)), 100)
+
+    def test_rollback_journal_mode(self):
+        create_db(self.db, journal_mode='delete')
+        manifest = backup(self.db, self.backups)
+        self.assertEqual(manifest['journal_mode'], 'delete')
+        self.assertEqual(manifest['wal_frames'], 0)
+        restore(self.backups, self.restored)
+        self.assertEqual(rows_of(self.restored), rows_of(self.db))
+
+    def test_prune_keeps_chains_of_kept_backups(self):
+        create_db(self.db)
+        manifests = []
+        for n in range(4):
+            conn = sqlite3.connect(self.db)
+            conn.execute('UPDATE shares SET worker_id = ? WHERE id = 1', (f'round-{n}',))
+            conn.commit()
+            conn.close()
+            manifests.append(backup(self.db, self.backups, full_every=2))
+        self.assertEqual([m['kind'] for m in manifests], ['full', 'incremental', 'full', 'incremental'])
+        # Age everything but the last backup past the retention window
+        for manifest in manifests[:3]:
+            manifest['created_at'] -= 40 * 86400
+            with open(os.path.join(self.backups, f"{manifest['id']}.json"), 'w') as f:
+                json.dump(manifest, f)
+
+        removed = prune(self.backups, retention_days=30)
+        self.assertEqual(removed, [manifests[0]['id'], manifests[1]['id']])
+        self.assertEqual([m['id'] for m in list_backups(self.backups)], [manifests[2]['id'], manifests[3]['id']])
+        self.assertFalse(any(name.startswith(manifests[0]['id']) for name in os.listdir(self.backups)))
+        restore(self.backups, self.restored)
+        self.assertEqual(rows_of(self.restored), rows_of(self.db))
+
+
+if __name__ == '__main__':
+    unittest.main()
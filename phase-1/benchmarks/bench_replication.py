@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Measure share-chain replication bandwidth and convergence as node count grows.
+
+Starts each node as its own `src/replication.py` process in a full mesh.
+Each node's replica database is preloaded with a common share set plus
+shares only it has. The benchmark then polls every node until all round
+digests agree. It reports convergence time, bytes on the wire and the
+shares exchanged. Wire bytes are compared with the naive cost of sending
+every node's whole set to every peer. Frames are authenticated with a
+random shared secret, as in production.
+
+    python benchmarks/bench_replication.py --nodes 2 4 8 --shares 20000 --unique 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import secrets
+import argparse
+import tempfile
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add the project root directory to the Python path
+sys.path.append(PROJECT_ROOT)
+
+from src.replication import ReplicaStore, PeerConnection, ReplicationStats
+
+SECRET = secrets.token_hex(16)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def node_shares(node, args):
+    unique = int(args.shares * args.unique)
+    common = [(n % args.rounds + 1, f'{n:064x}', 1.0, True, 800000, f'worker-{n % 500}', f'c-{n}')
+              for n in range(args.shares - unique)]
+    own = [(n % args.rounds + 1, f'{node + 1:04x}{n:060x}', 1.0, True, 800000, f'worker-{n % 500}', f'n{node}-{n}')
+           for n in range(unique)]
+    return common + own
+
+
+def query(port, stats):
+    peer = PeerConnection(('127.0.0.1', port), stats, timeout=10, secret=SECRET.encode())
+    try:
+        return peer.request({'type': 'stats'})
+    finally:
+        peer.close()
+
+
+def run_case(count, args, tmp_dir):
+    ports = [free_port() for _ in range(count)]
+    naive_bytes = 0
+    for node in range(count):
+        store = ReplicaStore(os.path.join(tmp_dir, f'node{node}.db'), origin=f'node{node}')
+        store.init()
+        store.store_shares(node_shares(node, args))
+        naive_bytes += os.path.getsize(store.path) * (count - 1)
+
+    processes = []
+    for node, port in enumerate(ports):
+        command = [sys.executable, os.path.join(PROJECT_ROOT, 'src', 'replication.py'),
+                   '--db', os.path.join(tmp_dir, f'node{node}.db'),
+                   '--listen', f'127.0.0.1:{port}', '--interval', str(args.interval)]
+        for other in ports:
+            if other != port:
+                command += ['--peer', f'127.0.0.1:{other}']
+        processes.append(subprocess.Popen(command, env=dict(os.environ, REPLICATION_SECRET=SECRET),
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    probe = ReplicationStats()
+    start = time.perf_counter()
+    converged = None
+    try:
+        while time.perf_counter() - start < args.timeout:
+            time.sleep(0.1)
+            try:
+                replies = [query(port, probe) for port in ports]
+            except OSError:
+                continue
+            rounds = [reply['rounds'] for reply in replies]
+            expected = args.shares + int(args.shares * args.unique) * (count - 1)
+            if all(r == rounds[0] for r in rounds) and sum(d[1] for d in rounds[0].values()) == expected:
+                converged = time.perf_counter() - start
+                break
+        stats = [query(port, probe)['stats'] for port in ports]
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    wire = sum(s['bytes_sent'] for s in stats)
+    return {
+        'nodes': count,
+        'shares_per_node': args.shares,
+        'converged_seconds': round(converged, 2) if converged is not None else None,
+        'wire_mb': round(wire / 2 ** 20, 3),
+        'naive_full_copy_mb': round(naive_bytes / 2 ** 20, 1),
+        'shares_sent': sum(s['shares_sent'] for s in stats),
+        'missing_shares': int(args.shares * args.unique) * count * (count - 1),
+        'syncs': sum(s['syncs'] for s in stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Share replication benchmark')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--shares', type=int, default=20000, help='Shares per node')
+    parser.add_argument('--unique', type=float, default=0.05, help='Fraction of each node\'s shares only it has')
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between each node\'s syncs')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for count in args.nodes:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            results.append(run_case(count, args, tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  {'nodes':>5} {'converged s':>12} {'wire MB':>9} {'naive MB':>9} {'shares sent':>12} {'missing':>8}")
+    for r in results:
+        converged = r['converged_seconds'] if r['converged_seconds'] is not None else 'timeout'
+        print(f"  {r['nodes']:>5} {converged:>12} {r['wire_mb']:>9} {r['naive_full_copy_mb']:>9} "
+              f"{r['shares_sent']:>12} {r['missing_shares']:>8}")
+
+
+if __name__ == '__main__':
+    main()
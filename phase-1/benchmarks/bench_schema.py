@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Compare the original shares schema with the compact schema on a synthetic dataset.
+
+Builds a database with the original `shares` table, migrates a copy to the
+compact schema (timing the migration), then reports file size, bytes per
+share, the time of a full-table audit, and the speed of reading every
+round back with `iter_round` as round close does. It also compares storing
+submission ids inline with interning them in a lookup table.
+
+    python benchmarks/bench_schema.py                    # 10M shares
+    python benchmarks/bench_schema.py --shares 1000000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import SQLiteStorage
+from src.compact_storage import CompactSQLiteStorage, migrate
+
+
+def build_legacy(path, args):
+    storage = SQLiteStorage(path)
+    storage.init()
+    rng = random.Random(args.seed)
+    start_ts = int(time.time()) - 30 * 86400
+    per_round = max(1, args.shares // args.rounds)
+    conn = sqlite3.connect(path)
+    batch = []
+    for n in range(args.shares):
+        round_num = n // per_round + 1
+        batch.append((round_num, start_ts + n * 30 * 86400 // args.shares, rng.getrandbits(256).to_bytes(32, 'big').hex(),
+                      float(rng.choice((1, 2, 4, 8))), 1 if rng.random() > 0.02 else 0, 800000 + round_num,
+                      f'worker-{rng.randrange(args.workers)}', f'submission_{n // args.shares_per_submission}'))
+        if len(batch) >= 100000:
+            conn.executemany('''INSERT INTO shares
+                                (round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+            conn.commit()
+            batch = []
+    if batch:
+        conn.executemany('''INSERT INTO shares
+                            (round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+        conn.commit()
+    conn.close()
+
+
+def measure(storage, path, args):
+    start = time.perf_counter()
+    storage.audit_stats()
+    audit = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned = sum(len(chunk) for round_num in range(1, args.rounds + 1) for chunk in storage.iter_round(round_num))
+    scan = time.perf_counter() - start
+    size = os.path.getsize(path)
+    return {
+        'disk_mb': round(size / 2 ** 20, 1),
+        'bytes_per_share': round(size / args.shares, 1),
+        'audit_seconds': round(audit, 3),
+        'scanned_shares': scanned,
+        'scan_per_second': round(scanned / scan, 1)
+    }
+
+
+def submission_storage(legacy_path, tmp_dir, args):
+    """Bytes per share of submission ids stored inline versus interned in a lookup table."""
+    sizes = {}
+    for name, schema, load in (
+            ('inline', ['CREATE TABLE refs (id INTEGER PRIMARY KEY, submission_id TEXT)'],
+             ['INSERT INTO refs SELECT id, submission_id FROM legacy.shares']),
+            ('interned', ['CREATE TABLE submissions (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)',
+                          'CREATE TABLE refs (id INTEGER PRIMARY KEY, submission INTEGER)'],
+             ['INSERT INTO submissions (name) SELECT DISTINCT submission_id FROM legacy.shares',
+              '''INSERT INTO refs SELECT s.id, sub.id FROM legacy.shares s
+                 JOIN submissions sub ON sub.name = s.submission_id'''])):
+        path = os.path.join(tmp_dir, f'submissions_{name}.db')
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.execute('ATTACH DATABASE ? AS legacy', (legacy_path,))
+        for statement in schema + load:
+            conn.execute(statement)
+        conn.commit()
+        conn.execute('DETACH DATABASE legacy')
+        conn.execute('VACUUM')
+        conn.close()
+        sizes[name] = round(os.path.getsize(path) / args.shares, 1)
+        os.remove(path)
+    return sizes
+
+
+def drop_page_cache(path):
+    """Ask the kernel to forget the file's cached pages so reads come from disk."""
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Share schema size and scan benchmark')
+    parser.add_argument('--shares', type=int, default=10000000)
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=5000)
+    parser.add_argument('--shares-per-submission', type=int, default=3,
+                        help='Shares sharing one submission id (3 in data/shares.db)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', help='Directory for the databases (default: a temporary directory)')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    tmp_dir = args.dir or tempfile.mkdtemp()
+    try:
+        legacy_path = os.path.join(tmp_dir, 'legacy.db')
+        compact_path = os.path.join(tmp_dir, 'compact.db')
+        for path in (legacy_path, compact_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        start = time.perf_counter()
+        build_legacy(legacy_path, args)
+        build = time.perf_counter() - start
+        shutil.copyfile(legacy_path, compact_path)
+
+        start = time.perf_counter()
+        migrated = migrate(compact_path)
+        migration = time.perf_counter() - start
+
+        compact = CompactSQLiteStorage(compact_path)
+        compact.init()
+        report = {
+            'shares': args.shares,
+            'build_seconds': round(build, 1),
+            'migration_seconds': round(migration, 1),
+            'migrated': migrated,
+            'submission_bytes_per_share': submission_storage(legacy_path, tmp_dir, args),
+        }
+        for name, storage, path in (('original', SQLiteStorage(legacy_path), legacy_path),
+                                    ('compact', compact, compact_path)):
+            drop_page_cache(path)
+            report[name] = measure(storage, path, args)
+    finally:
+        if not args.dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.shares} shares, built in {report['build_seconds']} s, migrated in {report['migration_seconds']} s")
+    print(f"  {'schema':>9} {'disk MB':>9} {'B/share':>8} {'audit s':>8} {'scan/s':>13}")
+    for name in ('original', 'compact'):
+        result = report[name]
+        print(f"  {name:>9} {result['disk_mb']:>9} {result['bytes_per_share']:>8} "
+              f"{result['audit_seconds']:>8} {result['scan_per_second']:>13.0f}")
+    print(f"  size reduction: {report['original']['disk_mb'] / report['compact']['disk_mb']:.2f}x")
+    submissions = report['submission_bytes_per_share']
+    print(f"  submission ids ({args.shares_per_submission} shares each): {submissions['inline']} B/share inline, "
+          f"{submissions['interned']} B/share interned")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Measure mining task startup: import time and gunicorn worker-ready latency.
+
+Import time is the median wall time of `import src.mining_task` in fresh
+interpreters, with the slowest imports from `python -X importtime`. Then
+gunicorn is started with and without --preload, and for each mode the
+benchmark reports the time until /healthz first answers, the time until
+it answers again after every worker has been killed (the master forks
+replacements; preloaded workers skip the imports), and the workers'
+unique memory, which is lower when pages are shared with the master.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --workers 8 --runs 10 --json
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# post_fork is all the per-worker setup there is; the app itself comes from create_app()
+CONFIG = '''
+preload_app = {preload}
+workers = {workers}
+bind = '127.0.0.1:{port}'
+# Killed workers are logged as errors
+loglevel = 'critical'
+
+def post_fork(server, worker):
+    from src.mining_task import init_worker
+    init_worker()
+'''
+
+
+def import_times(runs):
+    code = 'import time; start = time.perf_counter(); import src.mining_task; print(time.perf_counter() - start)'
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def slowest_imports(limit):
+    """Top-level packages with the largest cumulative import time, in ms."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import src.mining_task'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if ('.' not in name or name.startswith('src.')) and name not in ('site', 'src.mining_task'):
+            totals[name] = int(cumulative) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_healthy(port, timeout=60):
+    """Seconds until /healthz answers 200."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f'no /healthz answer on port {port} within {timeout} s')
+
+
+def run_gunicorn(preload, args, tmp_dir):
+    port = free_port()
+    config_path = os.path.join(tmp_dir, f'gunicorn_{int(preload)}.conf.py')
+    with open(config_path, 'w') as f:
+        f.write(CONFIG.format(preload=preload, workers=args.workers, port=port))
+    env = dict(os.environ,
+               DB_PATH=os.path.join(tmp_dir, 'shares.db'),
+               ROUNDS_DB=os.path.join(tmp_dir, 'rounds.db'),
+               SKETCHES_DB=os.path.join(tmp_dir, 'sketches.db'),
+               LOG_FILE=os.path.join(tmp_dir, 'mining_task.log'),
+               LOG_LEVEL='WARNING')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', config_path,
+                               'src.mining_task:create_app()'], cwd=ROOT, env=env)
+    try:
+        wait_healthy(port)
+        first = time.perf_counter() - start
+        master = psutil.Process(server.pid)
+        # Let every worker finish booting before measuring memory and respawns
+        deadline = time.time() + 30
+        while len(master.children()) < args.workers and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(args.settle)
+        workers = master.children()
+        uss = [worker.memory_full_info().uss / 2 ** 20 for worker in workers]
+
+        respawns = []
+        for _ in range(args.respawns):
+            victims = master.children()
+            for worker in victims:
+                worker.kill()
+            psutil.wait_procs(victims, timeout=10)
+            respawns.append(wait_healthy(port))
+            time.sleep(args.settle)
+        return {
+            'first_response_ms': round(first * 1000, 1),
+            'respawn_ms': round(statistics.median(respawns) * 1000, 1) if respawns else None,
+            'worker_uss_mb': round(statistics.mean(uss), 1) if uss else None
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mining task import time and worker startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time the import in')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--respawns', type=int, default=3, help='Times every worker is killed and replaced')
+    parser.add_argument('--settle', type=float, default=1.0, help='Seconds to wait for workers to finish booting')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    times = import_times(args.runs)
+    report = {
+        'import_ms': round(statistics.median(times) * 1000, 1),
+        'slowest_imports_ms': slowest_imports(8),
+        'workers': args.workers
+    }
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        report['gunicorn'] = 'not installed'
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for name, preload in (('no_preload', False), ('preload', True)):
+                report[name] = run_gunicorn(preload, args, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import src.mining_task: {report['import_ms']} ms (median of {args.runs})")
+    for name, ms in report['slowest_imports_ms']:
+        print(f"  {name:<24} {ms:>8.1f} ms")
+    if 'preload' not in report:
+        print('gunicorn is not installed; skipping worker startup')
+        return
+    print(f"gunicorn, {args.workers} workers:")
+    print(f"  {'mode':>10} {'first ms':>9} {'respawn ms':>11} {'USS MB':>7}")
+    for name in ('no_preload', 'preload'):
+        result = report[name]
+        print(f"  {name:>10} {result['first_response_ms']:>9} {result['respawn_ms']:>11} {result['worker_uss_mb']:>7}")
+
+
+if __name__ == '__main__':
+    main()
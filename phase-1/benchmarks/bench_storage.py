@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark sustained share ingest and round scans for each storage backend.
+
+Stores shares one at a time through `store_share`, as /submission does, then
+streams the round back with `iter_round` as round close does. Reports shares
+per second for both and the on-disk size.
+
+    python benchmarks/bench_storage.py --shares 20000
+    python benchmarks/bench_storage.py --shares 200000 --backends sharelog --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import create_storage
+
+
+def disk_usage(path):
+    if os.path.isfile(path):
+        return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def run_backend(backend, args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'shares.db' if backend == 'sqlite' else 'share_log')
+        storage = create_storage(backend, path)
+        storage.init()
+        shares = [(1, f'{n:064x}', 1.0 + n % 7, n % 50 != 0, 800000, f'worker-{n % args.workers}', f'sub-{n}')
+                  for n in range(args.shares)]
+
+        start = time.perf_counter()
+        for share in shares:
+            storage.store_share(*share)
+        ingest = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scanned = sum(len(chunk) for chunk in storage.iter_round(1))
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stats = storage.audit_stats()
+        audit = time.perf_counter() - start
+        storage.close()
+        size = disk_usage(path)
+
+    return {
+        'backend': backend,
+        'shares': args.shares,
+        'ingest_per_second': round(args.shares / ingest, 1),
+        'scan_per_second': round(scanned / scan, 1),
+        'audit_seconds': round(audit, 4),
+        'valid_shares': stats['valid_shares'],
+        'disk_mb': round(size / 2 ** 20, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Share storage benchmark')
+    parser.add_argument('--shares', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=500)
+    parser.add_argument('--backends', nargs='+', default=['sqlite', 'sharelog'],
+                        choices=['sqlite', 'compact', 'sharelog'])
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = [run_backend(backend, args) for backend in args.backends]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  {'backend':>9} {'ingest/s':>11} {'scan/s':>11} {'audit s':>8} {'disk MB':>8}")
+    for result in results:
+        print(f"  {result['backend']:>9} {result['ingest_per_second']:>11.0f} {result['scan_per_second']:>11.0f} "
+              f"{result['audit_seconds']:>8.3f} {result['disk_mb']:>8}")
+    if len(results) == 2 and results[0]['ingest_per_second']:
+        print(f"  ingest speedup: {results[1]['ingest_per_second'] / results[0]['ingest_per_second']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
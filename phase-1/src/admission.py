@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+
+class TokenBucketTable:
+    """Token buckets for many keys in a bounded LRU table.
+
+    Each entry is just (tokens, last refill time). Refill is computed lazily
+    when a key is checked, so idle keys cost nothing; when the table is full
+    the least recently seen key is dropped, which only ever resets a bucket
+    to full.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def peek(self, key: str, rate: float, capacity: float, now: float) -> float:
+        """Tokens available to `key` now."""
+        entry = self.buckets.get(key)
+        if entry is None:
+            return capacity
+        tokens, stamp = entry
+        return min(capacity, tokens + (now - stamp) * rate)
+
+    def take(self, key: str, tokens: float, now: float) -> None:
+        """Store `key`'s balance after spending a token from `tokens` available."""
+        self.buckets[key] = (tokens - 1.0, now)
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+
+class AdmissionController:
+    """Decides whether a share submission may proceed.
+
+    A request needs a token from its worker's bucket and from its source IP's
+    bucket, and a free slot under the global concurrency limit. `admit` runs
+    on headers alone; a request without an X-Worker-Id header is charged to
+    the worker named in its body with `admit_worker` once that is parsed.
+    Worker buckets refill at `worker_rate / difficulty` per second: a worker
+    on a higher share difficulty is expected to submit proportionally less
+    often. Buckets hold `burst_seconds` worth of refill. Rejections carry the
+    seconds until a token will be available, for the Retry-After header.
+    """
+
+    def __init__(self, worker_rate: float = 20.0, ip_rate: float = 100.0, burst_seconds: float = 5.0,
+                 max_concurrent: int = 64, max_keys: int = 100000,
+                 difficulty_for: Optional[Callable[[str], float]] = None):
+        self.worker_rate = worker_rate
+        self.ip_rate = ip_rate
+        self.burst_seconds = burst_seconds
+        self.max_concurrent = max_concurrent
+        self.difficulty_for = difficulty_for or (lambda worker_id: 1.0)
+        self.workers = TokenBucketTable(max_keys)
+        self.ips = TokenBucketTable(max_keys)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _worker_limits(self, worker_id: str) -> Tuple[float, float]:
+        rate = self.worker_rate / max(self.difficulty_for(worker_id) or 1.0, 1e-9)
+        return rate, max(1.0, rate * self.burst_seconds)
+
+    def _take_worker(self, worker_id: str, now: float) -> Tuple[Optional[str], float]:
+        rate, capacity = self._worker_limits(worker_id)
+        worker_tokens = self.workers.peek(worker_id, rate, capacity, now)
+        if worker_tokens < 1.0:
+            return 'worker', (1.0 - worker_tokens) / rate
+        self.workers.take(worker_id, worker_tokens, now)
+        return None, 0.0
+
+    def admit(self, worker_id: Optional[str], ip: str) -> Tuple[Optional[str], float]:
+        """Return (None, 0) and hold a concurrency slot, or (reason, retry_after_seconds).
+
+        Every admitted request must be paired with `release`.
+        """
+        now = time.monotonic()
+        ip_capacity = max(1.0, self.ip_rate * self.burst_seconds)
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                return 'concurrency', 1.0
+            ip_tokens = self.ips.peek(ip, self.ip_rate, ip_capacity, now)
+            if ip_tokens < 1.0:
+                return 'ip', (1.0 - ip_tokens) / self.ip_rate
+            if worker_id:
+                reason, retry_after = self._take_worker(worker_id, now)
+                if reason:
+                    return reason, retry_after
+            self.ips.take(ip, ip_tokens, now)
+            self.in_flight += 1
+        return None, 0.0
+
+    def admit_worker(self, worker_id: str) -> Tuple[Optional[str], float]:
+        """Spend a token from `worker_id`'s bucket alone: (None, 0) or ('worker', retry_after_seconds)."""
+        with self._lock:
+            return self._take_worker(worker_id, time.monotonic())
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def retry_after_header(seconds: float) -> str:
+        return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import logging
+import sqlite3
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    from src.storage import SQLiteStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE, sql_round_numbers
+except ImportError:
+    from storage import SQLiteStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE, sql_round_numbers
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS workers (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)''',
+    # ts: seconds since meta.timestamp_epoch, so current timestamps fit in 3-4 byte varints.
+    # difficulty keeps REAL affinity: SQLite writes whole-number values as integers.
+    # Submission ids stay inline. data/shares.db has 3 shares per submission id;
+    # at that rate a lookup table and its unique index take more space than the
+    # text (bench_schema.py, 300k shares: 25.1 B/share inline, 28.3 interned).
+    # Interning only pays off from about 4 shares per submission id.
+    '''CREATE TABLE IF NOT EXISTS share_records
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        round_number INTEGER,
+        ts INTEGER,
+        hash BLOB,
+        difficulty REAL,
+        valid INTEGER,
+        block_height INTEGER,
+        worker INTEGER REFERENCES workers (id),
+        submission_id TEXT)''',
+    'CREATE INDEX IF NOT EXISTS idx_share_records_round ON share_records (round_number)',
+]
+
+# Read-only view with the columns of the original `shares` table, for ad-hoc queries and old tooling
+SHARES_VIEW = '''CREATE VIEW IF NOT EXISTS shares AS
+                 SELECT s.id AS id, s.round_number AS round_number,
+                        s.ts + (SELECT value FROM meta WHERE key = 'timestamp_epoch') AS timestamp,
+                        CASE WHEN s.hash IS NULL THEN NULL ELSE lower(hex(s.hash)) END AS hash,
+                        s.difficulty AS difficulty, s.valid AS valid, s.block_height AS block_height,
+                        w.name AS worker_id, s.submission_id AS submission_id
+                 FROM share_records s
+                 LEFT JOIN workers w ON w.id = s.worker'''
+
+
+def hash_blob(value: Optional[str]) -> Optional[bytes]:
+    """Decode a hex share hash; anything that is not hex is stored as NULL."""
+    if value is None:
+        return None
+    try:
+        return bytes.fromhex(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def has_legacy_table(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'shares'").fetchone()
+    return row is not None and row[0] == 'table'
+
+
+def create_schema(conn: sqlite3.Connection, epoch: Optional[int] = None) -> None:
+    for statement in SCHEMA:
+        conn.execute(statement)
+    # Anchor timestamps at the day the database was created
+    epoch = epoch if epoch is not None else int(time.time()) // 86400 * 86400
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('timestamp_epoch', ?)", (epoch,))
+
+
+class CompactSQLiteStorage(SQLiteStorage):
+    """SQLite storage with 32-byte BLOB hashes and interned worker ids.
+
+    Worker ids live in a lookup table and shares reference them by integer
+    key; the mapping is cached in process memory. A `shares` view reproduces
+    the original columns.
+    """
+
+    def __init__(self, path: str = 'data/shares.db'):
+        super().__init__(path)
+        self.epoch = None
+        self.worker_ids: Dict[str, int] = {}
+        self.worker_names: Dict[int, str] = {}
+
+    def init(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            if has_legacy_table(conn):
+                raise RuntimeError(f"{self.path} uses the original shares schema; "
+                                   f"run `python src/compact_storage.py --db {self.path}` to migrate it")
+            create_schema(conn)
+            conn.execute(SHARES_VIEW)
+            conn.commit()
+            self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'timestamp_epoch'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _epoch(self, conn: sqlite3.Connection) -> int:
+        if self.epoch is None:
+            self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'timestamp_epoch'").fetchone()[0]
+        return self.epoch
+
+    def _worker_id(self, conn: sqlite3.Connection, name: str) -> int:
+        worker = self.worker_ids.get(name)
+        if worker is None:
+            conn.execute('INSERT OR IGNORE INTO workers (name) VALUES (?)', (name,))
+            worker = conn.execute('SELECT id FROM workers WHERE name = ?', (name,)).fetchone()[0]
+            self.worker_ids[name] = worker
+            self.worker_names[worker] = name
+        return worker
+
+    def _worker_name(self, conn: sqlite3.Connection, worker: int) -> str:
+        name = self.worker_names.get(worker)
+        if name is None:
+            # Interned by another process; refresh everything added since
+            for worker_id, worker_name in conn.execute('SELECT id, name FROM workers WHERE id >= ?', (worker,)):
+                self.worker_ids[worker_name] = worker_id
+                self.worker_names[worker_id] = worker_name
+            name = self.worker_names.get(worker)
+        return name
+
+    def store_shares(self, shares: Iterable[ShareInput]) -> bool:
+        conn = sqlite3.connect(self.path)
+        try:
+            ts = int(time.time()) - self._epoch(conn)
+            rows = []
+            for round_num, hash_value, difficulty, valid, block_height, worker_id, submission_id in shares:
+                raw_hash = bytes.fromhex(hash_value)
+                if len(raw_hash) != 32:
+                    raise ValueError(f"hash must be 32 bytes, got {len(raw_hash)}")
+                rows.append((round_num, ts, raw_hash, difficulty, 1 if valid else 0, block_height,
+                             self._worker_id(conn, worker_id), submission_id))
+            conn.executemany('''INSERT INTO share_records
+                                (round_number, ts, hash, difficulty, valid, block_height, worker, submission_id)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            # Ids interned in the rolled back transaction no longer exist
+            self.worker_ids.clear()
+            self.worker_names.clear()
+            logging.error(f"Error storing shares: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def audit_stats(self) -> Dict[str, int]:
+        conn = sqlite3.connect(self.path)
+        try:
+            stats = conn.execute('''SELECT
+                                    COUNT(*),
+                                    SUM(CASE WHEN valid = 1 THEN 1 ELSE 0 END),
+                                    SUM(CASE WHEN valid = 0 THEN 1 ELSE 0 END),
+                                    COUNT(DISTINCT worker)
+                                    FROM share_records''').fetchone()
+        finally:
+            conn.close()
+        return {
+            'total_shares': stats[0],
+            'valid_shares': stats[1],
+            'invalid_shares': stats[2],
+            'unique_workers': stats[3]
+        }
+
+    def round_stats(self, round_num: int) -> Dict:
+        conn = sqlite3.connect(self.path)
+        try:
+            total, valid = conn.execute('''SELECT COUNT(*), COALESCE(SUM(valid = 1), 0)
+                                           FROM share_records WHERE round_number = ?''', (round_num,)).fetchone()
+            workers = conn.execute('''SELECT DISTINCT worker FROM share_records
+                                      WHERE round_number = ? AND worker IS NOT NULL''', (round_num,)).fetchall()
+            names = sorted(self.worker_names.get(worker) or self._worker_name(conn, worker) for (worker,) in workers)
+        finally:
+            conn.close()
+        return {'total_shares': total, 'valid_shares': valid, 'invalid_shares': total - valid, 'workers': names}
+
+    def round_numbers(self) -> List[int]:
+        conn = sqlite3.connect(self.path)
+        try:
+            return sql_round_numbers(conn, 'share_records')
+        finally:
+            conn.close()
+
+    def recent_shares(self, limit: int = 10) -> List[ShareRow]:
+        conn = sqlite3.connect(self.path)
+        try:
+            # Ids increase with time, and unlike timestamp they are indexed
+            return conn.execute('SELECT * FROM shares ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        finally:
+            conn.close()
+
+    def iter_round(self, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   with_hash: bool = False) -> Iterator[List[tuple]]:
+        columns = 'id, worker, difficulty, lower(hex(hash))' if with_hash else 'id, worker, difficulty'
+        conn = sqlite3.connect(self.path)
+        try:
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM share_records').fetchone()[0]
+            last_id = 0
+            while True:
+                rows = conn.execute(f'''SELECT {columns} FROM share_records
+                                        WHERE round_number = ? AND valid = 1 AND id > ? AND id <= ?
+                                        ORDER BY id LIMIT ?''',
+                                    (round_num, last_id, max_id, chunk_size)).fetchall()
+                if not rows:
+                    return
+                names = self.worker_names
+                yield [(row[0], names.get(row[1]) or self._worker_name(conn, row[1])) + row[2:] for row in rows]
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def iter_time_range(self, start: int, end: int,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[ShareRow]]:
+        conn = sqlite3.connect(self.path)
+        try:
+            epoch = self._epoch(conn)
+            cursor = conn.execute('''SELECT * FROM shares WHERE id IN
+                                     (SELECT id FROM share_records WHERE ts BETWEEN ? AND ?) ORDER BY id''',
+                                  (start - epoch, end - epoch))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+
+def migrate(path: str, vacuum: bool = True) -> Dict[str, int]:
+    """Convert a database with the original `shares` table to the compact schema in place.
+
+    Runs as one transaction, so an interrupted migration leaves the original
+    table untouched. Share ids are preserved. Hashes that are not valid hex
+    become NULL and are counted in `unconverted_hashes`.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if not has_legacy_table(conn):
+            raise ValueError(f"{path} has no original shares table to migrate")
+        conn.create_function('hash_blob', 1, hash_blob, deterministic=True)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            first_ts = conn.execute('SELECT MIN(timestamp) FROM shares').fetchone()[0]
+            create_schema(conn, (first_ts or int(time.time())) // 86400 * 86400)
+            epoch = conn.execute("SELECT value FROM meta WHERE key = 'timestamp_epoch'").fetchone()[0]
+            conn.execute('''INSERT OR IGNORE INTO workers (name)
+                            SELECT DISTINCT worker_id FROM shares WHERE worker_id IS NOT NULL''')
+            conn.execute('''INSERT INTO share_records
+                            (id, round_number, ts, hash, difficulty, valid, block_height, worker, submission_id)
+                            SELECT s.id, s.round_number, s.timestamp - ?, hash_blob(s.hash), s.difficulty, s.valid,
+                                   s.block_height, w.id, s.submission_id
+                            FROM shares s
+                            LEFT JOIN workers w ON w.name = s.worker_id''', (epoch,))
+            counts = conn.execute('''SELECT COUNT(*), SUM(hash IS NULL) FROM share_records''').fetchone()
+            legacy_nulls = conn.execute('SELECT COUNT(*) FROM shares WHERE hash IS NULL').fetchone()[0]
+            conn.execute('DROP TABLE shares')
+            conn.execute(SHARES_VIEW)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if vacuum:
+            # Return the pages freed by the dropped table to the filesystem
+            conn.execute('VACUUM')
+        result = {
+            'shares': counts[0],
+            'workers': conn.execute('SELECT COUNT(*) FROM workers').fetchone()[0],
+            'unconverted_hashes': (counts[1] or 0) - legacy_nulls
+        }
+    finally:
+        conn.close()
+    logging.info(f"Migrated {result['shares']} shares to the compact schema "
+                 f"({result['workers']} workers)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate a shares database to the compact schema')
+    parser.add_argument('--db', default='data/shares.db')
+    parser.add_argument('--no-vacuum', action='store_true', help='Skip reclaiming the space of the old table')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        migrate(args.db, vacuum=not args.no_vacuum)
+    except Exception as e:
+        logging.error(f"Error migrating {args.db}: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
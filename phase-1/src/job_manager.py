@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+
+
+class JobManager:
+    """Tracks block templates from the node and validates shares against them.
+
+    Each distinct template gets a job ID. The current job and a bounded number
+    of recent ones are kept in memory so that a submission can be checked with
+    a single dict lookup before anything touches the database.
+    """
+
+    def __init__(self, rpc_url=None, rpc_user=None, rpc_password=None,
+                 poll_interval=5, longpoll_timeout=60, max_jobs=16):
+        self.rpc_url = rpc_url
+        self.auth = (rpc_user, rpc_password) if rpc_user else None
+        self.poll_interval = poll_interval
+        self.longpoll_timeout = longpoll_timeout
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.current_job_id = None
+        self.current_height = None
+        self._next_id = 0
+        self._longpollid = None
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+    def _rpc(self, method, params=None, timeout=10):
+        response = self._session.post(
+            self.rpc_url,
+            json={'jsonrpc': '1.0', 'id': 'job_manager', 'method': method, 'params': params or []},
+            auth=self.auth,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('error'):
+            raise Exception(payload['error'])
+        return payload['result']
+
+    def add_template(self, template):
+        """Register a block template and return its job, reusing the current job if the tip is unchanged."""
+        with self._lock:
+            self._longpollid = template.get('longpollid')
+            current = self.jobs.get(self.current_job_id)
+            if current and current['previousblockhash'] == template['previousblockhash']:
+                return current
+
+            job_id = f"{self._next_id:x}"
+            self._next_id += 1
+            job = {
+                'job_id': job_id,
+                'height': template['height'],
+                'previousblockhash': template['previousblockhash'],
+                'bits': template.get('bits'),
+                'target': template.get('target'),
+                'curtime': template.get('curtime'),
+                'created': time.time()
+            }
+            self.jobs[job_id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+            if self.current_height is None or job['height'] > self.current_height:
+                logging.info(f"New chain tip, mining height {job['height']} with job {job_id}")
+            self.current_job_id = job_id
+            self.current_height = job['height']
+            return job
+
+    def current_job(self):
+        return self.jobs.get(self.current_job_id)
+
+    def check_share(self, job_id=None, block_height=None):
+        """Return None if the share may be stored, otherwise a rejection reason.
+
+        Until the first template has been received every share is accepted.
+        """
+        current_height = self.current_height
+        if current_height is None:
+            return None
+        if job_id is not None:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return 'unknown-job'
+            if job['height'] < current_height:
+                return 'stale'
+            return None
+        if block_height is None:
+            return None
+        if block_height < current_height:
+            return 'stale'
+        if block_height > current_height:
+            return 'unknown-job'
+        return None
+
+    def refresh(self):
+        """Fetch a template, long-polling on the last one if the node supports it."""
+        request = {'rules': ['segwit']}
+        timeout = 10
+        if self._longpollid:
+            request['longpollid'] = self._longpollid
+            timeout = self.longpoll_timeout + 10
+        return self.add_template(self._rpc('getblocktemplate', [request], timeout=timeout))
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+                if not self._longpollid:
+                    time.sleep(self.poll_interval)
+            except Exception as e:
+                logging.error(f"Error fetching block template: {e}")
+                self._longpollid = None
+                time.sleep(self.poll_interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        logging.info(f"Started job manager polling {self.rpc_url}")
+        return thread
@@ -5,23 +5,31 @@ import sys
 import time
 import json
 import logging
-import sqlite3
-import requests
-from flask import Flask, jsonify, request
-from prometheus_client import start_http_server, Counter, Gauge
+import threading
+from flask import Flask, Response, g, jsonify, request
+from prometheus_client import start_http_server, multiprocess, CollectorRegistry, Counter, Gauge
 import psutil
 
+try:
+    from src.job_manager import JobManager
+except ImportError:
+    from job_manager import JobManager
+
+try:
+    from src.storage import create_storage
+    from src.round_lifecycle import RoundManager, CLOSING, FINALIZED
+    from src.admission import AdmissionController
+    from src.sketches import SketchRegistry
+except ImportError:
+    from storage import create_storage
+    from round_lifecycle import RoundManager, CLOSING, FINALIZED
+    from admission import AdmissionController
+    from sketches import SketchRegistry
+
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/mining_task.log'),
-        logging.StreamHandler()
-    ]
-)
+LOG_FILE = os.environ.get('LOG_FILE', 'logs/mining_task.log')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 8082))
 
 # Global state
 startup_time = time.time()
@@ -41,26 +49,78 @@ shares_submitted = Counter('miner_shares_submitted', 'Total shares submitted')
 valid_shares = Counter('miner_valid_shares', 'Total valid shares')
 invalid_shares = Counter('miner_invalid_shares', 'Total invalid shares')
 round_number = Gauge('mining_round', 'Current mining round number')
+worker_shares = Counter('miner_worker_shares', 'Shares submitted per worker', ['worker_id'])
+stale_shares = Counter('miner_stale_shares', 'Shares rejected for stale or unknown jobs per worker',
+                       ['worker_id', 'reason'])
+late_shares = Counter('miner_late_shares', 'Shares rejected because their round was closed')
+admission_rejections = Counter('miner_admission_rejections', 'Submissions rejected with 429 by admission control',
+                               ['reason'])
+
+# Worker ids come from clients, so only the first METRICS_MAX_WORKERS get their own label; later ones count as 'other'
+METRICS_MAX_WORKERS = int(os.environ.get('METRICS_MAX_WORKERS', 1000))
+labelled_workers = set()
+
+def worker_label(worker_id):
+    worker_id = str(worker_id)
+    if worker_id not in labelled_workers:
+        if len(labelled_workers) >= METRICS_MAX_WORKERS:
+            return 'other'
+        labelled_workers.add(worker_id)
+    return worker_id
+
+# Share difficulty handed out by /task
+TARGET_DIFFICULTY = float(os.environ.get('TARGET_DIFFICULTY', 1.0))
+
+# Block template jobs; polling only starts when a node is configured
+job_manager = JobManager(
+    rpc_url=os.environ.get('BITCOIN_RPC_URL'),
+    rpc_user=os.environ.get('BITCOIN_RPC_USER'),
+    rpc_password=os.environ.get('BITCOIN_RPC_PASSWORD')
+)
+
+# Share storage; STORAGE_BACKEND selects 'sqlite' (default), 'compact', 'sharelog' or 'replica'
+storage = create_storage()
+
+# Per-worker and per-IP token buckets plus a global concurrency limit for submissions
+admission = AdmissionController(
+    worker_rate=float(os.environ.get('ADMISSION_WORKER_RATE', 20)),
+    ip_rate=float(os.environ.get('ADMISSION_IP_RATE', 100)),
+    burst_seconds=float(os.environ.get('ADMISSION_BURST_SECONDS', 5)),
+    max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 64)),
+    max_keys=int(os.environ.get('ADMISSION_MAX_KEYS', 100000)),
+    # Every worker mines at TARGET_DIFFICULTY; there is no per-worker difficulty assignment to look up yet
+    difficulty_for=lambda worker_id: TARGET_DIFFICULTY
+)
+
+# Unique workers, top contributors and difficulty quantiles of accepted shares, per round and per window
+sketches = SketchRegistry(
+    os.environ.get('SKETCHES_DB', 'data/sketches.db'),
+    window_seconds=int(os.environ.get('SKETCH_WINDOW_SECONDS', 60))
+)
+
+# Round lifecycle; ROUND_DURATION (seconds) closes rounds on schedule, 0 leaves closing to operators
+round_manager = RoundManager(
+    storage,
+    os.environ.get('ROUNDS_DB', 'data/rounds.db'),
+    round_duration=float(os.environ.get('ROUND_DURATION', 0))
+)
+
+def configure_logging():
+    # basicConfig is a no-op once the root logger has handlers, so this is safe to call per worker
+    os.makedirs(os.path.dirname(LOG_FILE) or '.', exist_ok=True)
+    logging.basicConfig(
+        level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
 
 def init_db():
     try:
-        # Create data directory if it doesn't exist
-        os.makedirs('data', exist_ok=True)
-        
-        conn = sqlite3.connect('data/shares.db')
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS shares
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      round_number INTEGER,
-                      timestamp INTEGER,
-                      hash TEXT,
-                      difficulty REAL,
-                      valid INTEGER,
-                      block_height INTEGER,
-                      worker_id TEXT,
-                      submission_id TEXT)''')
-        conn.commit()
-        conn.close()
+        storage.init()
+        round_manager.init()
         logging.info("Database initialized successfully")
         health_status['share_collection'] = True
     except Exception as e:
@@ -69,31 +129,57 @@ def init_db():
 
 def store_share(round_num, hash_value, difficulty, valid, block_height, worker_id, submission_id):
     try:
-        conn = sqlite3.connect('data/shares.db')
-        c = conn.cursor()
-        c.execute('''INSERT INTO shares 
-                     (round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (round_num, int(time.time()), hash_value, difficulty, valid, block_height, worker_id, submission_id))
-        conn.commit()
-        conn.close()
-        logging.info(f"Share stored for round {round_num}: {hash_value[:8]}...")
+        if not storage.store_share(round_num, hash_value, difficulty, valid, block_height, worker_id, submission_id):
+            return False
+        logging.debug(f"Share stored for round {round_num}: {hash_value[:8]}...")
         return True
     except Exception as e:
         logging.error(f"Error storing share: {e}")
         return False
 
+def too_many_requests(reason, retry_after):
+    admission_rejections.labels(reason=reason).inc()
+    response = jsonify({'error': 'Too many requests', 'reason': reason})
+    response.status_code = 429
+    response.headers['Retry-After'] = admission.retry_after_header(retry_after)
+    return response
+
+@app.before_request
+def admit_submission():
+    # Runs after routing but before the body is read, so rejected floods cost no parsing or DB work
+    if request.endpoint != 'submit_share':
+        return None
+    worker_id = request.headers.get('X-Worker-Id')
+    reason, retry_after = admission.admit(worker_id, request.remote_addr or '')
+    if reason:
+        return too_many_requests(reason, retry_after)
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_submission(exc):
+    if g.pop('admitted', False):
+        admission.release()
+
 @app.route('/task/<int:round_number>', methods=['GET'])
 def get_task(round_number):
     try:
         # Return task parameters with default values
-        return jsonify({
+        task = {
             'round_number': round_number,
-            'target_difficulty': 1.0,
+            'target_difficulty': TARGET_DIFFICULTY,
             'hash_rate': hash_rate._value.get() if hasattr(hash_rate, '_value') else 0,
             'valid_shares': valid_shares._value.get() if hasattr(valid_shares, '_value') else 0,
             'invalid_shares': invalid_shares._value.get() if hasattr(invalid_shares, '_value') else 0
-        })
+        }
+        task['round_state'] = round_manager.state(round_number)
+        job = job_manager.current_job()
+        if job:
+            task['job_id'] = job['job_id']
+            task['block_height'] = job['height']
+            task['previousblockhash'] = job['previousblockhash']
+            task['bits'] = job['bits']
+        return jsonify(task)
     except Exception as e:
         logging.error(f"Error getting task: {e}")
         return jsonify({'error': str(e)}), 500
@@ -109,6 +195,41 @@ def submit_share(round_number):
         required_fields = ['hash', 'difficulty', 'block_height', 'worker_id', 'submission_id']
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Missing required fields'}), 400
+        # check_share compares it with the chain height; bool is an int subclass but not a height
+        if not isinstance(data['block_height'], int) or isinstance(data['block_height'], bool):
+            return jsonify({'error': 'block_height must be an integer'}), 400
+        # The header chose the rate limit bucket; it must be the worker the share is credited to
+        header_worker = request.headers.get('X-Worker-Id')
+        if header_worker is not None and header_worker != data['worker_id']:
+            return jsonify({'error': 'worker_id does not match X-Worker-Id'}), 400
+        if header_worker is None:
+            # Admitted on the IP alone; charge the body's worker before any lookup or write
+            reason, retry_after = admission.admit_worker(str(data['worker_id']))
+            if reason:
+                return too_many_requests(reason, retry_after)
+
+        # Late submissions to a closed round would change its finalized results
+        state = round_manager.state(round_number)
+        if state in (CLOSING, FINALIZED):
+            shares_submitted.inc()
+            late_shares.inc()
+            return jsonify({'error': 'Round closed', 'state': state}), 409
+
+        # Reject shares for stale or unknown jobs before touching the database
+        worker_shares.labels(worker_id=worker_label(data['worker_id'])).inc()
+        reason = job_manager.check_share(data.get('job_id'), data['block_height'])
+        if reason:
+            shares_submitted.inc()
+            stale_shares.labels(worker_id=worker_label(data['worker_id']), reason=reason).inc()
+            return jsonify({'error': 'Stale share', 'reason': reason}), 400
+
+        if state is None:
+            # Rounds are opened by the scheduler or an operator; a share may at most start the next one
+            if round_number != round_manager.next_round():
+                shares_submitted.inc()
+                return jsonify({'error': 'Unknown round', 'state': None}), 409
+            # Track the round, so /audit counts its shares and it can be closed
+            round_manager.open_round(round_number)
         
         # Store share
         success = store_share(
@@ -128,6 +249,7 @@ def submit_share(round_number):
         shares_submitted.inc()
         if data.get('valid', True):
             valid_shares.inc()
+            sketches.record(round_number, data['worker_id'], float(data['difficulty'] or 0))
         else:
             invalid_shares.inc()
         
@@ -139,39 +261,55 @@ def submit_share(round_number):
 @app.route('/audit', methods=['GET'])
 def audit():
     try:
-        conn = sqlite3.connect('data/shares.db')
-        c = conn.cursor()
-        
-        # Get audit statistics
-        c.execute('''SELECT 
-                     COUNT(*) as total_shares,
-                     SUM(CASE WHEN valid = 1 THEN 1 ELSE 0 END) as valid_shares,
-                     SUM(CASE WHEN valid = 0 THEN 1 ELSE 0 END) as invalid_shares,
-                     COUNT(DISTINCT worker_id) as unique_workers
-                     FROM shares''')
-        stats = c.fetchone()
-        
-        # Get recent shares
-        c.execute('''SELECT * FROM shares 
-                     ORDER BY timestamp DESC 
-                     LIMIT 10''')
-        recent_shares = c.fetchall()
-        
-        conn.close()
-        
+        # Finalized rounds are read from their stored artifacts; only live rounds touch the shares
         return jsonify({
-            'statistics': {
-                'total_shares': stats[0],
-                'valid_shares': stats[1],
-                'invalid_shares': stats[2],
-                'unique_workers': stats[3]
-            },
-            'recent_shares': recent_shares
+            'statistics': round_manager.audit_stats(),
+            'recent_shares': storage.recent_shares(10)
         })
     except Exception as e:
         logging.error(f"Error performing audit: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/audit/sketches', methods=['GET'])
+def audit_sketches():
+    try:
+        round_num = request.args.get('round', type=int)
+        if round_num is None:
+            round_num = round_manager.current_round()
+        seconds = request.args.get('window', 300, type=int)
+        raw = request.args.get('raw', 0, type=int)
+        result = {'round': None}
+        if round_num is not None:
+            merged = sketches.round_sketches(round_num)
+            result['round'] = {'round_number': round_num, **merged.summary()}
+            if raw:
+                result['round']['sketch'] = merged.to_dict()
+        merged = sketches.window_sketches(seconds)
+        result['window'] = {'seconds': seconds, **merged.summary()}
+        if raw:
+            result['window']['sketch'] = merged.to_dict()
+        return jsonify(result)
+    except Exception as e:
+        logging.error(f"Error reading sketches: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/audit/<int:round_number>', methods=['GET'])
+def audit_round(round_number):
+    try:
+        artifacts = round_manager.artifacts(round_number)
+        if artifacts:
+            # Computed once when the round closed
+            return Response(artifacts['audit_payload'], mimetype='application/json')
+        state = round_manager.state(round_number)
+        if state == CLOSING:
+            return jsonify({'round_number': round_number, 'state': state}), 202
+        if state == FINALIZED:
+            return jsonify({'error': 'Round artifacts missing', 'state': state}), 500
+        return jsonify({'error': 'Round not closed', 'state': state}), 409
+    except Exception as e:
+        logging.error(f"Error performing audit for round {round_number}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/healthz', methods=['GET'])
 def health():
     # Update health status based on current state
@@ -195,24 +333,53 @@ def monitor_resources():
             logging.error(f"Error monitoring resources: {e}")
             time.sleep(1)
 
+def create_app():
+    """Application factory for gunicorn, e.g. `gunicorn --preload 'src.mining_task:create_app()'`.
+
+    Does the once-per-node work: logging and schema setup. With --preload it
+    runs in the master before the workers are forked, so they share the
+    imported modules; threads are started per worker by init_worker().
+    """
+    configure_logging()
+    init_db()
+    return app
+
+def init_worker():
+    """Start the per-process background work; called in each worker after the fork."""
+    configure_logging()
+    # Preloaded state belongs to the master: give this worker its own sketch rows
+    sketches.after_fork()
+
+    # Start block template polling
+    if job_manager.rpc_url:
+        job_manager.start()
+
+    # Start closing rounds on schedule
+    round_manager.start()
+
+    # Start resource monitoring in background
+    threading.Thread(target=monitor_resources, daemon=True).start()
+    logging.info(f"Started resource monitoring in worker {os.getpid()}")
+    health_status['api'] = True
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve Prometheus metrics; with PROMETHEUS_MULTIPROC_DIR set, those of every gunicorn worker."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    health_status['metrics'] = True
+    logging.info("Started metrics server")
+
 if __name__ == '__main__':
     try:
-        # Initialize database
-        init_db()
-        
-        # Start Prometheus metrics server
-        start_http_server(8082)
-        health_status['metrics'] = True
-        logging.info("Started metrics server")
-        
-        # Start resource monitoring in background
-        import threading
-        monitor_thread = threading.Thread(target=monitor_resources, daemon=True)
-        monitor_thread.start()
-        logging.info("Started resource monitoring")
-        
+        create_app()
+        init_worker()
+        start_metrics_server()
+
         # Start Flask app
-        health_status['api'] = True
         port = int(os.environ.get('PORT', 8080))
         app.run(host='0.0.0.0', port=port)
     except Exception as e:
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import zlib
+import hmac
+import bisect
+import socket
+import struct
+import hashlib
+import logging
+import ipaddress
+import sqlite3
+import argparse
+import threading
+import socketserver
+from functools import reduce
+from operator import xor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from src.storage import ShareStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE, sql_round_stats, sql_round_numbers
+except ImportError:
+    from storage import ShareStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE, sql_round_stats, sql_round_numbers
+
+DEFAULT_PORT = 7400
+KEY_NIBBLES = 32          # share keys are 128 bits, so prefixes are up to 32 hex digits
+LEAF_SIZE = 32            # below this many keys a prefix is settled by listing its keys
+BATCH_SIZE = 1000         # shares per compressed frame
+MAX_FRAME = 64 * 2 ** 20
+MAX_MESSAGE = 256 * 2 ** 20  # decompressed; bounds what a small frame can inflate to
+FRAME_HEADER = struct.Struct('>I')
+TAG_SIZE = hashlib.sha256().digest_size
+
+# (round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id, origin)
+WireShare = list
+
+
+def share_key(round_num: int, hash_value: str, difficulty: float, valid, block_height: int,
+              worker_id: str, submission_id: str) -> int:
+    """Identify a share by its content, so every node derives the same key for it."""
+    canonical = json.dumps([round_num, hash_value, difficulty, 1 if valid else 0, block_height,
+                            worker_id, submission_id], separators=(',', ':'))
+    return int.from_bytes(hashlib.sha256(canonical.encode()).digest()[:16], 'big')
+
+
+def key_range(prefix: str) -> Tuple[int, int]:
+    """Half-open range of keys whose hex form starts with `prefix`."""
+    shift = 4 * (KEY_NIBBLES - len(prefix))
+    value = int(prefix, 16) if prefix else 0
+    return value << shift, (value + 1) << shift
+
+
+def digest(keys: List[int], prefix: str) -> Tuple[int, int]:
+    """XOR and count of the sorted `keys` under `prefix`: a node of the reconciliation tree."""
+    lo, hi = key_range(prefix)
+    i, j = bisect.bisect_left(keys, lo), bisect.bisect_left(keys, hi)
+    return reduce(xor, keys[i:j], 0), j - i
+
+
+def keys_under(keys: List[int], prefix: str) -> List[int]:
+    lo, hi = key_range(prefix)
+    return keys[bisect.bisect_left(keys, lo):bisect.bisect_left(keys, hi)]
+
+
+class ReplicaStore(ShareStorage):
+    """Set of shares from this node and its peers, keyed by `share_key`.
+
+    It is a regular storage backend (STORAGE_BACKEND=replica), so the mining
+    task writes local shares into it and round close and /audit see the
+    replicated share chain. The replication node keeps each round's sorted
+    keys in memory and picks up rows written by other processes by id.
+    """
+
+    def __init__(self, path: str = 'data/replica.db', origin: str = 'local'):
+        self.path = path
+        self.origin = origin
+        self._lock = threading.Lock()
+        self._keys: Dict[int, List[int]] = {}
+        self._digests: Dict[int, Tuple[int, int]] = {}
+        self._last_id = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''CREATE TABLE IF NOT EXISTS replica_shares
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             key BLOB UNIQUE NOT NULL,
+                             round_number INTEGER,
+                             timestamp INTEGER,
+                             hash TEXT,
+                             difficulty REAL,
+                             valid INTEGER,
+                             block_height INTEGER,
+                             worker_id TEXT,
+                             submission_id TEXT,
+                             origin TEXT)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_replica_round ON replica_shares (round_number)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def add(self, shares: Iterable[WireShare], origin: Optional[str] = None) -> int:
+        """Insert shares in wire form, skipping ones already present. Returns how many were new."""
+        rows = []
+        for share in shares:
+            round_num, timestamp, hash_value, difficulty, valid, block_height, worker_id, submission_id, source = share
+            key = share_key(round_num, hash_value, difficulty, valid, block_height, worker_id, submission_id)
+            rows.append((key.to_bytes(16, 'big'), round_num, timestamp, hash_value, difficulty,
+                         1 if valid else 0, block_height, worker_id, submission_id, origin or source))
+        conn = self._connect()
+        try:
+            before = conn.total_changes
+            conn.executemany('''INSERT OR IGNORE INTO replica_shares
+                                (key, round_number, timestamp, hash, difficulty, valid, block_height,
+                                 worker_id, submission_id, origin)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            conn.commit()
+            return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def store_shares(self, shares: Iterable[ShareInput]) -> bool:
+        try:
+            now = int(time.time())
+            self.add([(r, now, h, d, v, b, w, s, self.origin) for r, h, d, v, b, w, s in shares])
+            return True
+        except Exception as e:
+            logging.error(f"Error storing shares: {e}")
+            return False
+
+    def refresh(self) -> None:
+        """Load keys of rows added since the last call, by this or any other process."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute('SELECT id, round_number, key FROM replica_shares WHERE id > ? ORDER BY id',
+                                    (self._last_id,)).fetchall()
+            finally:
+                conn.close()
+            added: Dict[int, List[int]] = {}
+            for share_id, round_num, key in rows:
+                added.setdefault(round_num, []).append(int.from_bytes(key, 'big'))
+                self._last_id = share_id
+            # Replace rather than mutate: syncs may be reading the old lists
+            for round_num, keys in added.items():
+                self._keys[round_num] = sorted(self._keys.get(round_num, []) + keys)
+                xor_value, count = self._digests.get(round_num, (0, 0))
+                self._digests[round_num] = (reduce(xor, keys, xor_value), count + len(keys))
+
+    def round_keys(self, round_num: int) -> List[int]:
+        with self._lock:
+            return self._keys.get(round_num, [])
+
+    def round_digests(self) -> Dict[int, Tuple[int, int]]:
+        self.refresh()
+        with self._lock:
+            return dict(self._digests)
+
+    def wire_shares(self, round_num: int, keys: Iterable[int]) -> Iterator[WireShare]:
+        conn = self._connect()
+        try:
+            for key in keys:
+                row = conn.execute('''SELECT round_number, timestamp, hash, difficulty, valid, block_height,
+                                      worker_id, submission_id, origin FROM replica_shares WHERE key = ?''',
+                                   (key.to_bytes(16, 'big'),)).fetchone()
+                if row is not None and row[0] == round_num:
+                    yield list(row)
+        finally:
+            conn.close()
+
+    def audit_stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            stats = conn.execute('''SELECT COUNT(*),
+                                    SUM(CASE WHEN valid = 1 THEN 1 ELSE 0 END),
+                                    SUM(CASE WHEN valid = 0 THEN 1 ELSE 0 END),
+                                    COUNT(DISTINCT worker_id)
+                                    FROM replica_shares''').fetchone()
+        finally:
+            conn.close()
+        return {
+            'total_shares': stats[0],
+            'valid_shares': stats[1],
+            'invalid_shares': stats[2],
+            'unique_workers': stats[3]
+        }
+
+    def recent_shares(self, limit: int = 10) -> List[ShareRow]:
+        conn = self._connect()
+        try:
+            return conn.execute('''SELECT id, round_number, timestamp, hash, difficulty, valid, block_height,
+                                   worker_id, submission_id FROM replica_shares ORDER BY id DESC LIMIT ?''',
+                                (limit,)).fetchall()
+        finally:
+            conn.close()
+
+    def round_stats(self, round_num: int) -> Dict:
+        conn = self._connect()
+        try:
+            return sql_round_stats(conn, 'replica_shares', round_num)
+        finally:
+            conn.close()
+
+    def round_numbers(self) -> List[int]:
+        conn = self._connect()
+        try:
+            return sql_round_numbers(conn, 'replica_shares')
+        finally:
+            conn.close()
+
+    def iter_round(self, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   with_hash: bool = False) -> Iterator[List[tuple]]:
+        columns = 'id, worker_id, difficulty, lower(hash)' if with_hash else 'id, worker_id, difficulty'
+        conn = self._connect()
+        try:
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM replica_shares').fetchone()[0]
+            last_id = 0
+            while True:
+                rows = conn.execute(f'''SELECT {columns} FROM replica_shares
+                                        WHERE round_number = ? AND valid = 1 AND id > ? AND id <= ?
+                                        ORDER BY id LIMIT ?''',
+                                    (round_num, last_id, max_id, chunk_size)).fetchall()
+                if not rows:
+                    return
+                yield rows
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def iter_time_range(self, start: int, end: int,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[ShareRow]]:
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''SELECT id, round_number, timestamp, hash, difficulty, valid, block_height,
+                                     worker_id, submission_id FROM replica_shares
+                                     WHERE timestamp BETWEEN ? AND ? ORDER BY id''', (start, end))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+
+class ReplicationStats:
+    """Byte and share counters for one node, across its server and client connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {'bytes_sent': 0, 'bytes_received': 0, 'frames_sent': 0, 'frames_received': 0,
+                         'shares_sent': 0, 'shares_received': 0, 'syncs': 0, 'sync_errors': 0}
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+class AuthenticationError(ValueError):
+    """A frame's HMAC did not match the shared secret."""
+
+
+def frame_tag(secret: bytes, header: bytes, payload: bytes) -> bytes:
+    return hmac.new(secret, header + payload, hashlib.sha256).digest()
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+
+def send_frame(sock: socket.socket, message: Dict, stats: ReplicationStats, secret: Optional[bytes] = None) -> None:
+    """Send a length-prefixed zlib frame, followed by its HMAC-SHA256 tag when there is a secret."""
+    payload = zlib.compress(json.dumps(message, separators=(',', ':')).encode(), 6)
+    header = FRAME_HEADER.pack(len(payload))
+    tag = frame_tag(secret, header, payload) if secret else b''
+    sock.sendall(header + tag + payload)
+    stats.add(bytes_sent=len(header) + len(tag) + len(payload), frames_sent=1)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket, stats: ReplicationStats, secret: Optional[bytes] = None) -> Dict:
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ValueError(f"frame of {size} bytes exceeds the {MAX_FRAME} byte limit")
+    tag = recv_exactly(sock, TAG_SIZE) if secret else b''
+    payload = recv_exactly(sock, size)
+    stats.add(bytes_received=len(header) + len(tag) + size, frames_received=1)
+    # Check the tag before decompressing or parsing anything the peer sent
+    if secret and not hmac.compare_digest(tag, frame_tag(secret, header, payload)):
+        raise AuthenticationError('frame HMAC does not match the replication secret')
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(payload, MAX_MESSAGE)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"frame decompresses to more than {MAX_MESSAGE} bytes")
+    if not decompressor.eof:
+        raise ValueError('truncated frame')
+    return json.loads(data)
+
+
+def encode_digest(value: Tuple[int, int]) -> List:
+    return [f'{value[0]:032x}', value[1]]
+
+
+def decode_digest(value: List) -> Tuple[int, int]:
+    return int(value[0], 16), value[1]
+
+
+class ReplicationHandler(socketserver.BaseRequestHandler):
+    """Serves one peer connection; peers keep it open across syncs."""
+
+    def handle(self):
+        node = self.server.node
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                message = recv_frame(sock, node.stats, node.secret)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                logging.error(f"Error reading from replication peer {self.client_address}: {e}")
+                return
+            try:
+                for reply in node.respond(message):
+                    send_frame(sock, reply, node.stats, node.secret)
+            except Exception as e:
+                logging.error(f"Error serving replication peer {self.client_address}: {e}")
+                return
+
+
+class ReplicationServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, node):
+        super().__init__(address, ReplicationHandler)
+        self.node = node
+
+
+class PeerConnection:
+    """Persistent connection to one peer, reopened on the next sync if it drops."""
+
+    def __init__(self, address: Tuple[str, int], stats: ReplicationStats, timeout: float = 30.0,
+                 secret: Optional[bytes] = None):
+        self.address = address
+        self.stats = stats
+        self.timeout = timeout
+        self.secret = secret
+        self.sock = None
+
+    def request(self, message: Dict) -> Dict:
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            send_frame(self.sock, message, self.stats, self.secret)
+            return recv_frame(self.sock, self.stats, self.secret)
+        except Exception:
+            self.close()
+            raise
+
+    def receive(self) -> Dict:
+        return recv_frame(self.sock, self.stats, self.secret)
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+class ReplicationNode:
+    """Exchanges per-round share sets with peers so every node converges on their union.
+
+    A sync compares XOR/count digests of each round, then descends a 16-way
+    prefix tree over the share keys of rounds that differ, so only subtrees
+    that differ are expanded. Small subtrees are settled by listing their
+    keys; the shares one side lacks are then sent in compressed batches.
+    The digests are not tamper-proof: a peer can still send bogus shares,
+    which is why every received share is re-keyed from its content.
+
+    With a `secret`, every frame carries an HMAC-SHA256 tag and frames from
+    peers without the secret are dropped. Without one the node only serves
+    on a loopback address.
+    """
+
+    def __init__(self, store: ReplicaStore, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 peers: Iterable[Tuple[str, int]] = (), interval: float = 5.0, batch_size: int = BATCH_SIZE,
+                 node_id: Optional[str] = None, secret: Optional[bytes] = None):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.batch_size = batch_size
+        self.node_id = node_id or f'{socket.gethostname()}:{port}'
+        self.secret = secret
+        self.stats = ReplicationStats()
+        self.peers = [PeerConnection(tuple(peer), self.stats, secret=secret) for peer in peers]
+        self.server = None
+        self._stop = threading.Event()
+
+    # Serving
+
+    def respond(self, message: Dict) -> Iterator[Dict]:
+        kind = message['type']
+        if kind == 'rounds':
+            yield {'type': 'rounds',
+                   'rounds': {str(r): encode_digest(d) for r, d in self.store.round_digests().items()}}
+        elif kind == 'nodes':
+            yield self._compare_nodes(int(message['round']), message['nodes'])
+        elif kind == 'push':
+            added = self.store.add(message['shares'])
+            self.stats.add(shares_received=len(message['shares']))
+            yield {'type': 'ack', 'added': added}
+        elif kind == 'want':
+            round_num = int(message['round'])
+            keys = [int(key, 16) for key in message['keys']]
+            for start in range(0, len(keys), self.batch_size):
+                shares = list(self.store.wire_shares(round_num, keys[start:start + self.batch_size]))
+                self.stats.add(shares_sent=len(shares))
+                yield {'type': 'shares', 'shares': shares}
+            yield {'type': 'done'}
+        elif kind == 'stats':
+            yield {'type': 'stats', 'node': self.node_id, 'stats': self.stats.snapshot(),
+                   'rounds': {str(r): encode_digest(d) for r, d in self.store.round_digests().items()}}
+        else:
+            yield {'type': 'error', 'error': f'unknown message type {kind}'}
+
+    def _compare_nodes(self, round_num: int, nodes: Dict[str, List]) -> Dict:
+        """Classify the peer's tree nodes: equal (omitted), expand further, or leaf (with our keys)."""
+        keys = self.store.round_keys(round_num)
+        expand = []
+        leaves = {}
+        for prefix, theirs in nodes.items():
+            their_digest = decode_digest(theirs)
+            mine = digest(keys, prefix)
+            if mine == their_digest:
+                continue
+            if min(mine[1], their_digest[1]) <= LEAF_SIZE or len(prefix) >= KEY_NIBBLES:
+                leaves[prefix] = [f'{key:032x}' for key in keys_under(keys, prefix)]
+            else:
+                expand.append(prefix)
+        return {'type': 'nodes', 'expand': expand, 'leaves': leaves}
+
+    # Syncing
+
+    def sync_with(self, peer: PeerConnection) -> Dict[str, int]:
+        """Reconcile every round with one peer, in both directions."""
+        self.store.refresh()
+        local = self.store.round_digests()
+        remote = {int(r): decode_digest(d) for r, d in peer.request({'type': 'rounds'})['rounds'].items()}
+        result = {'rounds': 0, 'pushed': 0, 'pulled': 0}
+        for round_num in sorted(set(local) | set(remote)):
+            if local.get(round_num, (0, 0)) == remote.get(round_num, (0, 0)):
+                continue
+            pushed, pulled = self._sync_round(peer, round_num)
+            result['rounds'] += 1
+            result['pushed'] += pushed
+            result['pulled'] += pulled
+        self.stats.add(syncs=1)
+        return result
+
+    def _sync_round(self, peer: PeerConnection, round_num: int) -> Tuple[int, int]:
+        keys = self.store.round_keys(round_num)
+        want: List[int] = []
+        give: List[int] = []
+        prefixes = ['']
+        while prefixes:
+            nodes = {prefix: encode_digest(digest(keys, prefix)) for prefix in prefixes}
+            reply = peer.request({'type': 'nodes', 'round': round_num, 'nodes': nodes})
+            for prefix, their_keys in reply['leaves'].items():
+                theirs = {int(key, 16) for key in their_keys}
+                mine = set(keys_under(keys, prefix))
+                want.extend(theirs - mine)
+                give.extend(mine - theirs)
+            prefixes = [prefix + child for prefix in reply['expand'] for child in '0123456789abcdef']
+
+        for start in range(0, len(give), self.batch_size):
+            shares = list(self.store.wire_shares(round_num, give[start:start + self.batch_size]))
+            peer.request({'type': 'push', 'shares': shares})
+            self.stats.add(shares_sent=len(shares))
+
+        pulled = 0
+        if want:
+            try:
+                reply = peer.request({'type': 'want', 'round': round_num, 'keys': [f'{key:032x}' for key in want]})
+                while reply['type'] != 'done':
+                    pulled += self.store.add(reply['shares'])
+                    self.stats.add(shares_received=len(reply['shares']))
+                    reply = peer.receive()
+            except Exception:
+                peer.close()
+                raise
+        self.store.refresh()
+        return len(give), pulled
+
+    def sync_once(self) -> None:
+        for peer in self.peers:
+            try:
+                result = self.sync_with(peer)
+                if result['rounds']:
+                    logging.info(f"Synced {result['rounds']} rounds with {peer.address[0]}:{peer.address[1]}: "
+                                 f"pushed {result['pushed']}, pulled {result['pulled']} shares")
+            except Exception as e:
+                self.stats.add(sync_errors=1)
+                logging.error(f"Error syncing with {peer.address[0]}:{peer.address[1]}: {e}")
+
+    def run(self):
+        # Stagger nodes started together so peers do not push the same shares to each other at once
+        self._stop.wait(random.uniform(0, self.interval))
+        while not self._stop.is_set():
+            self.sync_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if not self.secret and not is_loopback(self.host):
+            raise ValueError(f"set a replication secret to serve peers on {self.host}")
+        self.store.refresh()
+        self.server = ReplicationServer((self.host, self.port), self)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        logging.info(f"Started share replication on {self.host}:{self.port} with {len(self.peers)} peers")
+        return thread
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for peer in self.peers:
+            peer.close()
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replicate the share chain with peer nodes')
+    parser.add_argument('--db', default=os.environ.get('REPLICA_DB', 'data/replica.db'))
+    parser.add_argument('--listen', default=f'127.0.0.1:{DEFAULT_PORT}', help='host:port to serve peers on')
+    parser.add_argument('--peer', action='append', default=[], help='host:port of a peer (repeatable)')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between syncs')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        store = ReplicaStore(args.db)
+        store.init()
+        host, port = parse_address(args.listen)
+        # Shared by every node; read from the environment to keep it out of the process list
+        secret = os.environ.get('REPLICATION_SECRET', '').encode() or None
+        node = ReplicationNode(store, host, port, [parse_address(peer) for peer in args.peer],
+                               args.interval, args.batch_size, secret=secret)
+        node.start()
+    except Exception as e:
+        logging.error(f"Error starting replication: {e}")
+        sys.exit(1)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
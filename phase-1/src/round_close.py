@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import json
+import logging
+import argparse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    from src.storage import DEFAULT_CHUNK_SIZE, ShareStorage, SQLiteStorage, create_storage
+except ImportError:
+    from storage import DEFAULT_CHUNK_SIZE, ShareStorage, SQLiteStorage, create_storage
+
+SATOSHIS_PER_BTC = 10 ** 8
+K2_ADDRESS_RE = re.compile(r'^0x[0-9a-fA-F]{40}$')
+
+AddressMap = Union[Dict[str, str], Callable[[str], Optional[str]]]
+
+
+def aggregate_difficulty(chunks: Iterator[List[Tuple[int, str, float]]]) -> Tuple[Dict[str, float], int, int]:
+    """Sum difficulty per worker. Memory grows with workers, not shares.
+
+    Returns the per-worker totals, the share count and the highest share id seen.
+    """
+    totals = {}
+    shares = 0
+    max_id = 0
+    for chunk in chunks:
+        shares += len(chunk)
+        for share_id, worker_id, difficulty in chunk:
+            totals[worker_id] = totals.get(worker_id, 0.0) + (difficulty or 0.0)
+            if share_id > max_id:
+                max_id = share_id
+    return totals, shares, max_id
+
+
+def default_address(worker_id: str) -> Optional[str]:
+    """Workers that identify with their K2 address are paid to it directly."""
+    return worker_id if worker_id and K2_ADDRESS_RE.match(worker_id) else None
+
+
+def load_address_map(path: str) -> Callable[[str], Optional[str]]:
+    """Load a JSON {worker_id: address} file, falling back to `default_address`."""
+    with open(path, 'r') as f:
+        mapping = json.load(f)
+    return lambda worker_id: mapping.get(worker_id) or default_address(worker_id)
+
+
+def build_rewards(totals: Dict[str, float], total_reward: float,
+                  address_for: AddressMap = default_address) -> Tuple[List[Dict[str, float]], List[str]]:
+    """Split `total_reward` BTC pro rata by difficulty across mapped workers.
+
+    Amounts are rounded down to whole satoshis so the payout never exceeds
+    the reward. Workers sharing an address are merged. Returns the rewards,
+    sorted by recipient, and the workers that have no address.
+    """
+    lookup = address_for.get if isinstance(address_for, dict) else address_for
+    total_difficulty = sum(totals.values())
+    reward_sats = int(round(total_reward * SATOSHIS_PER_BTC))
+    by_address = {}
+    unmapped = []
+    if total_difficulty <= 0:
+        return [], sorted(totals)
+    for worker_id, difficulty in totals.items():
+        address = lookup(worker_id)
+        if not address:
+            unmapped.append(worker_id)
+            continue
+        sats = int(reward_sats * difficulty // total_difficulty)
+        by_address[address] = by_address.get(address, 0) + sats
+    rewards = [{'recipient': address, 'amount': sats / SATOSHIS_PER_BTC}
+               for address, sats in sorted(by_address.items()) if sats > 0]
+    return rewards, sorted(unmapped)
+
+
+def close_round(storage: Union[ShareStorage, str], round_num: int, total_reward: float,
+                address_for: AddressMap = default_address, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Stream a round's shares and turn them into a `distribute_rewards` payout list.
+
+    `storage` is a share storage backend, or the path of a SQLite shares database.
+    """
+    if isinstance(storage, str):
+        storage = SQLiteStorage(storage)
+        storage.init()
+    totals, shares, max_id = aggregate_difficulty(storage.iter_round(round_num, chunk_size))
+    rewards, unmapped = build_rewards(totals, total_reward, address_for)
+    if unmapped:
+        logging.warning(f"Round {round_num}: {len(unmapped)} workers have no payout address")
+    logging.info(f"Closed round {round_num}: {shares} shares from {len(totals)} workers, {len(rewards)} rewards")
+    return {
+        'round_number': round_num,
+        'shares': shares,
+        'max_share_id': max_id,
+        'workers': len(totals),
+        'total_difficulty': sum(totals.values()),
+        'total_reward': total_reward,
+        'rewards': rewards,
+        'unmapped_workers': unmapped
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Close a mining round and write its payout list')
+    parser.add_argument('--backend', choices=['sqlite', 'compact', 'sharelog', 'replica'],
+                        help='Storage backend (default: STORAGE_BACKEND or sqlite)')
+    parser.add_argument('--db', help='Database file or share log directory '
+                                     '(default: DB_PATH / SHARE_LOG_DIR / REPLICA_DB)')
+    parser.add_argument('--round', type=int, required=True)
+    parser.add_argument('--reward', type=float, required=True, help='Total BTC to distribute for the round')
+    parser.add_argument('--addresses', help='JSON file mapping worker_id to payout address')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--rounds-db', help='Use the precomputed worker totals of a finalized round from this '
+                                            'round lifecycle database instead of scanning shares')
+    parser.add_argument('--output', help='Write the result JSON here instead of stdout')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        address_for = load_address_map(args.addresses) if args.addresses else default_address
+        storage = create_storage(args.backend, args.db)
+        result = None
+        if args.rounds_db:
+            try:
+                from src.round_lifecycle import RoundManager
+            except ImportError:
+                from round_lifecycle import RoundManager
+            result = RoundManager(storage, args.rounds_db).rewards(args.round, args.reward, address_for)
+            if result is None:
+                logging.warning(f"Round {args.round} is not finalized; scanning its shares")
+        if result is None:
+            result = close_round(storage, args.round, args.reward, address_for, args.chunk_size)
+    except Exception as e:
+        logging.error(f"Error closing round {args.round}: {e}")
+        sys.exit(1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import argparse
+import threading
+from typing import Dict, List, Optional, Set
+
+try:
+    from src.storage import ShareStorage, DEFAULT_CHUNK_SIZE, create_storage
+    from src.round_close import build_rewards, default_address, AddressMap
+except ImportError:
+    from storage import ShareStorage, DEFAULT_CHUNK_SIZE, create_storage
+    from round_close import build_rewards, default_address, AddressMap
+
+OPEN = 'open'
+CLOSING = 'closing'
+FINALIZED = 'finalized'
+
+
+class MerkleAccumulator:
+    """Streaming binary Merkle root over leaves added in order, in O(log n) memory."""
+
+    def __init__(self):
+        self.levels: List[Optional[bytes]] = []
+        self.count = 0
+
+    def add(self, leaf: bytes) -> None:
+        node = hashlib.sha256(b'\x00' + leaf).digest()
+        self.count += 1
+        for level, pending in enumerate(self.levels):
+            if pending is None:
+                self.levels[level] = node
+                return
+            node = hashlib.sha256(b'\x01' + pending + node).digest()
+            self.levels[level] = None
+        self.levels.append(node)
+
+    def root(self) -> str:
+        node = None
+        for pending in self.levels:
+            if pending is None:
+                continue
+            # Unpaired subtrees are folded in from the smallest up
+            node = pending if node is None else hashlib.sha256(b'\x01' + pending + node).digest()
+        return (node or hashlib.sha256(b'').digest()).hex()
+
+
+def merkle_leaf(share_id: int, hash_value: str, worker_id: str, difficulty: float) -> bytes:
+    """A share's leaf in the round commitment; the id and hash pin it to one specific share."""
+    return json.dumps([share_id, hash_value, worker_id, difficulty], separators=(',', ':')).encode()
+
+
+def compute_artifacts(storage: ShareStorage, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Stream a round's valid shares once into its summary, worker totals, commitment and audit payload.
+
+    Also records the round's share statistics, which /audit adds up instead
+    of scanning finalized rounds again.
+    """
+    statistics = storage.round_stats(round_num)
+    totals = {}
+    shares = {}
+    merkle = MerkleAccumulator()
+    first_id = last_id = None
+    for chunk in storage.iter_round(round_num, chunk_size, with_hash=True):
+        for share_id, worker_id, difficulty, hash_value in chunk:
+            difficulty = difficulty or 0.0
+            totals[worker_id] = totals.get(worker_id, 0.0) + difficulty
+            shares[worker_id] = shares.get(worker_id, 0) + 1
+            merkle.add(merkle_leaf(share_id, hash_value, worker_id, difficulty))
+            first_id = share_id if first_id is None else first_id
+            last_id = share_id
+    workers = [{'worker_id': worker_id, 'shares': shares[worker_id], 'difficulty': totals[worker_id]}
+               for worker_id in sorted(totals)]
+    summary = {
+        'round_number': round_num,
+        'valid_shares': merkle.count,
+        'workers': len(totals),
+        'total_difficulty': sum(totals.values()),
+        'first_share_id': first_id,
+        'last_share_id': last_id
+    }
+    commitment = merkle.root()
+    audit = {'round_number': round_num, 'state': FINALIZED, 'summary': summary,
+             'workers': workers, 'commitment': commitment}
+    return {'summary': summary, 'worker_totals': totals, 'commitment': commitment,
+            'audit_payload': json.dumps(audit, separators=(',', ':')), 'statistics': statistics}
+
+
+class RoundManager:
+    """Tracks each round through open -> closing -> finalized.
+
+    State lives in SQLite so every gunicorn worker sees the same rounds, and
+    transitions are conditional UPDATEs so exactly one process closes a round
+    and computes its artifacts. Finalized rounds never change, so their state
+    and artifacts are answered from memory once loaded.
+    With `round_duration` set, the open round is closed on schedule and the
+    next one opened; rounds can also be closed explicitly with `close_round`.
+    After a round closes, a background thread waits `close_grace` seconds for
+    in-flight submissions to commit, then computes the round's artifacts once.
+    Other processes may keep accepting shares for up to `poll_interval` after
+    the close, so `close_grace` should be at least that long.
+    """
+
+    def __init__(self, storage: ShareStorage, path: str = 'data/rounds.db', round_duration: float = 0,
+                 close_grace: float = 2.0, stale_after: float = 300.0, poll_interval: float = 1.0):
+        self.storage = storage
+        self.path = path
+        self.round_duration = round_duration
+        self.close_grace = close_grace
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self._states: Dict[int, str] = {}
+        self._artifacts: Dict[int, Dict] = {}
+        self._checked_at: Dict[int, float] = {}
+        # Statistics of the finalized rounds folded into the totals so far; they never change
+        self._folded: Set[int] = set()
+        self._finalized_totals = {'total_shares': 0, 'valid_shares': 0, 'invalid_shares': 0}
+        self._finalized_workers: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.init()
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init(self) -> None:
+        """Create the rounds tables; also done on first use."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS rounds
+                            (round_number INTEGER PRIMARY KEY,
+                             state TEXT NOT NULL,
+                             opened_at REAL,
+                             closed_at REAL,
+                             finalized_at REAL)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS round_artifacts
+                            (round_number INTEGER PRIMARY KEY,
+                             summary TEXT,
+                             worker_totals TEXT,
+                             commitment TEXT,
+                             audit_payload TEXT,
+                             statistics TEXT)''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(round_artifacts)')}
+            if 'statistics' not in columns:
+                conn.execute('ALTER TABLE round_artifacts ADD COLUMN statistics TEXT')
+            if not conn.execute('SELECT 1 FROM rounds LIMIT 1').fetchone():
+                self._backfill(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        self._ready = True
+
+    def _backfill(self, conn: sqlite3.Connection) -> None:
+        """Track the rounds of shares stored before rounds were, so /audit still counts them.
+
+        The newest round stays open. Older ones are marked closing, and the
+        scheduler finalizes them like any round left closing.
+        """
+        try:
+            stored = self.storage.round_numbers()
+        except Exception as e:
+            logging.error(f"Error listing stored rounds: {e}")
+            return
+        if not stored:
+            return
+        now = time.time()
+        conn.executemany('INSERT OR IGNORE INTO rounds (round_number, state, opened_at, closed_at) VALUES (?, ?, ?, ?)',
+                         [(round_num, CLOSING, now, now) for round_num in stored[:-1]] +
+                         [(stored[-1], OPEN, now, None)])
+        logging.info(f"Tracking {len(stored)} rounds found in share storage")
+
+    # Transitions
+
+    def open_round(self, round_num: int) -> bool:
+        """Open a round that has not been seen before. Returns False if it already exists."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute('INSERT OR IGNORE INTO rounds (round_number, state, opened_at) VALUES (?, ?, ?)',
+                                  (round_num, OPEN, time.time()))
+            conn.commit()
+            opened = cursor.rowcount == 1
+        finally:
+            conn.close()
+        if opened:
+            logging.info(f"Opened round {round_num}")
+        self._forget(round_num)
+        return opened
+
+    def close_round(self, round_num: int, wait: bool = False) -> bool:
+        """Move an open (or never opened) round to closing and compute its artifacts in the background.
+
+        Returns False if the round was already closing or finalized.
+        """
+        conn = self._connect()
+        try:
+            now = time.time()
+            conn.execute('INSERT OR IGNORE INTO rounds (round_number, state, opened_at) VALUES (?, ?, ?)',
+                         (round_num, OPEN, now))
+            cursor = conn.execute("UPDATE rounds SET state = ?, closed_at = ? WHERE round_number = ? AND state = ?",
+                                  (CLOSING, now, round_num, OPEN))
+            conn.commit()
+            claimed = cursor.rowcount == 1
+        finally:
+            conn.close()
+        self._forget(round_num)
+        if not claimed:
+            return False
+        logging.info(f"Closing round {round_num}")
+        thread = threading.Thread(target=self._finalize, args=(round_num, self.close_grace), daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def _finalize(self, round_num: int, delay: float) -> None:
+        if delay:
+            time.sleep(delay)
+        try:
+            start = time.perf_counter()
+            artifacts = compute_artifacts(self.storage, round_num)
+            conn = self._connect()
+            try:
+                conn.execute('''INSERT OR REPLACE INTO round_artifacts
+                                (round_number, summary, worker_totals, commitment, audit_payload, statistics)
+                                VALUES (?, ?, ?, ?, ?, ?)''',
+                             (round_num, json.dumps(artifacts['summary']), json.dumps(artifacts['worker_totals']),
+                              artifacts['commitment'], artifacts['audit_payload'],
+                              json.dumps(artifacts['statistics'])))
+                conn.execute('UPDATE rounds SET state = ?, finalized_at = ? WHERE round_number = ?',
+                             (FINALIZED, time.time(), round_num))
+                conn.commit()
+            finally:
+                conn.close()
+            self._forget(round_num)
+            logging.info(f"Finalized round {round_num}: {artifacts['summary']['valid_shares']} shares, "
+                         f"commitment {artifacts['commitment'][:16]}... in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logging.error(f"Error finalizing round {round_num}: {e}")
+
+    # Reads
+
+    def _forget(self, round_num: int) -> None:
+        with self._lock:
+            self._states.pop(round_num, None)
+            self._checked_at.pop(round_num, None)
+
+    def state(self, round_num: int) -> Optional[str]:
+        """The round's state, or None if it was never opened.
+
+        Finalized is cached for good; anything else is re-read at most every `poll_interval`.
+        """
+        now = time.time()
+        with self._lock:
+            if round_num in self._checked_at:
+                state = self._states.get(round_num)
+                if state == FINALIZED or now - self._checked_at[round_num] < self.poll_interval:
+                    return state
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT state FROM rounds WHERE round_number = ?', (round_num,)).fetchone()
+        finally:
+            conn.close()
+        state = row[0] if row else None
+        with self._lock:
+            self._states[round_num] = state
+            self._checked_at[round_num] = now
+        return state
+
+    def accepts_shares(self, round_num: int) -> bool:
+        """Shares are accepted for open rounds and rounds not seen yet, never for closed ones."""
+        return self.state(round_num) not in (CLOSING, FINALIZED)
+
+    def current_round(self) -> Optional[int]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT MAX(round_number) FROM rounds WHERE state = ?', (OPEN,)).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def next_round(self) -> int:
+        """The round after the highest one ever opened; the only round a submission may open."""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COALESCE(MAX(round_number), 0) + 1 FROM rounds').fetchone()[0]
+        finally:
+            conn.close()
+
+    def artifacts(self, round_num: int) -> Optional[Dict]:
+        """Precomputed artifacts of a finalized round, or None."""
+        cached = self._artifacts.get(round_num)
+        if cached is not None:
+            return cached
+        conn = self._connect()
+        try:
+            row = conn.execute('''SELECT summary, worker_totals, commitment, audit_payload
+                                  FROM round_artifacts WHERE round_number = ?''', (round_num,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        artifacts = {'summary': json.loads(row[0]), 'worker_totals': json.loads(row[1]),
+                     'commitment': row[2], 'audit_payload': row[3]}
+        self._artifacts[round_num] = artifacts
+        return artifacts
+
+    def audit_stats(self) -> Dict[str, int]:
+        """total_shares, valid_shares, invalid_shares and unique_workers over every tracked round.
+
+        Finalized rounds contribute the statistics stored with their
+        artifacts, read once per process; only rounds still open or closing
+        are counted from share storage.
+        """
+        conn = self._connect()
+        try:
+            # One read transaction: a round finalizes in a single commit, so it is either live or folded
+            conn.execute('BEGIN')
+            finalized = [round_num for (round_num,) in conn.execute('SELECT round_number FROM round_artifacts')]
+            with self._lock:
+                new = [round_num for round_num in finalized if round_num not in self._folded]
+            stored = {}
+            for start in range(0, len(new), 500):
+                batch = new[start:start + 500]
+                stored.update(conn.execute(f'''SELECT round_number, statistics FROM round_artifacts
+                                               WHERE round_number IN ({','.join('?' * len(batch))})''', batch))
+            live = [round_num for (round_num,) in conn.execute('SELECT round_number FROM rounds WHERE state != ?',
+                                                                (FINALIZED,))]
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        for round_num, statistics in stored.items():
+            # Rounds finalized before statistics were stored are counted from storage once
+            statistics = json.loads(statistics) if statistics else self.storage.round_stats(round_num)
+            with self._lock:
+                if round_num in self._folded:
+                    continue
+                self._folded.add(round_num)
+                for name in self._finalized_totals:
+                    self._finalized_totals[name] += statistics[name]
+                self._finalized_workers.update(statistics['workers'])
+        live_totals = {name: 0 for name in self._finalized_totals}
+        live_workers = set()
+        for round_num in live:
+            statistics = self.storage.round_stats(round_num)
+            for name in live_totals:
+                live_totals[name] += statistics[name]
+            live_workers.update(statistics['workers'])
+        with self._lock:
+            totals = {name: value + live_totals[name] for name, value in self._finalized_totals.items()}
+            totals['unique_workers'] = len(self._finalized_workers) + len(live_workers - self._finalized_workers)
+        return totals
+
+    def rewards(self, round_num: int, total_reward: float,
+                address_for: AddressMap = default_address) -> Optional[Dict]:
+        """Payout list of a finalized round, from its stored worker totals instead of its shares."""
+        artifacts = self.artifacts(round_num)
+        if artifacts is None:
+            return None
+        rewards, unmapped = build_rewards(artifacts['worker_totals'], total_reward, address_for)
+        return {
+            'round_number': round_num,
+            'shares': artifacts['summary']['valid_shares'],
+            'max_share_id': artifacts['summary']['last_share_id'] or 0,
+            'workers': artifacts['summary']['workers'],
+            'total_difficulty': artifacts['summary']['total_difficulty'],
+            'total_reward': total_reward,
+            'commitment': artifacts['commitment'],
+            'rewards': rewards,
+            'unmapped_workers': unmapped
+        }
+
+    # Scheduling
+
+    def tick(self) -> None:
+        """Close the open round once it has run for `round_duration`, open the next, and retry stuck closes."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            open_rounds = conn.execute('SELECT round_number, opened_at FROM rounds WHERE state = ?',
+                                       (OPEN,)).fetchall()
+            stale = conn.execute('SELECT round_number FROM rounds WHERE state = ? AND closed_at < ?',
+                                 (CLOSING, now - self.stale_after)).fetchall()
+            last = conn.execute('SELECT COALESCE(MAX(round_number), 0) FROM rounds').fetchone()[0]
+        finally:
+            conn.close()
+        if self.round_duration:
+            for round_num, opened_at in open_rounds:
+                if now - opened_at >= self.round_duration:
+                    self.close_round(round_num)
+            if not open_rounds or all(now - opened_at >= self.round_duration for _, opened_at in open_rounds):
+                self.open_round(last + 1)
+        for (round_num,) in stale:
+            # The process that closed it died before finalizing; artifacts are idempotent
+            conn = self._connect()
+            try:
+                cursor = conn.execute('UPDATE rounds SET closed_at = ? WHERE round_number = ? AND state = ? '
+                                      'AND closed_at < ?', (now, round_num, CLOSING, now - self.stale_after))
+                conn.commit()
+                claimed = cursor.rowcount == 1
+            finally:
+                conn.close()
+            if claimed:
+                logging.warning(f"Round {round_num} was left closing; finalizing it again")
+                threading.Thread(target=self._finalize, args=(round_num, 0), daemon=True).start()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Error in round scheduler: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        logging.info(f"Started round scheduler ({self.round_duration or 'manual'} s rounds)")
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or close mining rounds')
+    parser.add_argument('command', choices=['status', 'close'])
+    parser.add_argument('--round', type=int, required=True)
+    parser.add_argument('--rounds-db', default=os.environ.get('ROUNDS_DB', 'data/rounds.db'))
+    parser.add_argument('--backend', help='Storage backend (default: STORAGE_BACKEND or sqlite)')
+    parser.add_argument('--db', help='Share database or directory for the backend')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        manager = RoundManager(create_storage(args.backend, args.db), args.rounds_db)
+        manager.init()
+        if args.command == 'close' and not manager.close_round(args.round, wait=True):
+            logging.warning(f"Round {args.round} was already {manager.state(args.round)}")
+        artifacts = manager.artifacts(args.round)
+        print(json.dumps({'round_number': args.round, 'state': manager.state(args.round),
+                          'summary': artifacts['summary'] if artifacts else None,
+                          'commitment': artifacts['commitment'] if artifacts else None}, indent=2))
+    except Exception as e:
+        logging.error(f"Error handling round {args.round}: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+
+import os
+import mmap
+import time
+import fcntl
+import heapq
+import bisect
+import shutil
+import struct
+import logging
+import threading
+import contextlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from src.storage import ShareStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE
+except ImportError:
+    from storage import ShareStorage, ShareInput, ShareRow, DEFAULT_CHUNK_SIZE
+
+# Fixed-size share record:
+# timestamp_ns, round, block_height, worker, submission offset, difficulty,
+# submission length, valid, pad, hash (32 raw bytes)
+RECORD = struct.Struct('<QIIIIdHBx32s')
+RECORD_SIZE = RECORD.size
+
+# Sparse index written when a segment is sealed: a header followed by one
+# (record number, running max timestamp_ns) entry every INDEX_INTERVAL records
+INDEX_HEADER = struct.Struct('<IQQII')
+INDEX_ENTRY = struct.Struct('<IQ')
+INDEX_INTERVAL = 4096
+
+DEFAULT_SEGMENT_BYTES = 64 * 2 ** 20
+
+
+class WorkerTable:
+    """Worker ids interned to integers, shared by all processes through an append-only file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _reload(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only consume complete lines; a concurrent append may be mid-write
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            name = line.decode()
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        self._offset += end
+
+    def intern(self, name: str) -> int:
+        worker = self.ids.get(name)
+        if worker is not None:
+            return worker
+        if '\n' in name:
+            raise ValueError("worker_id may not contain newlines")
+        with self._lock, open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._reload()
+                if name not in self.ids:
+                    f.write(name.encode() + b'\n')
+                    f.flush()
+                    self.ids[name] = len(self.names)
+                    self.names.append(name)
+                    self._offset += len(name.encode()) + 1
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return self.ids[name]
+
+    def name(self, worker: int) -> str:
+        if worker >= len(self.names):
+            with self._lock:
+                self._reload()
+        return self.names[worker]
+
+
+class Segment:
+    """Read-only view of one segment: its records (via mmap), submission ids and sparse index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.strings_path = path[:-4] + '.strs'
+        self.index_path = path[:-4] + '.idx'
+
+    def count(self) -> int:
+        try:
+            return os.path.getsize(self.path) // RECORD_SIZE
+        except FileNotFoundError:
+            return 0
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple]:
+        """Unpack records [start, stop) straight from the mapped file."""
+        stop = self.count() if stop is None else stop
+        if stop <= start:
+            return
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), stop * RECORD_SIZE, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield from RECORD.iter_unpack(view[start * RECORD_SIZE:stop * RECORD_SIZE])
+                finally:
+                    view.release()
+
+    def strings(self):
+        """Open the submission id heap for random reads."""
+        return open(self.strings_path, 'rb')
+
+    def index(self) -> Optional[Tuple[tuple, List[int], List[int]]]:
+        """Return (header, record numbers, running max timestamps), or None for unsealed segments."""
+        if not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        header = INDEX_HEADER.unpack_from(data)
+        entries = list(INDEX_ENTRY.iter_unpack(data[INDEX_HEADER.size:]))
+        return header, [e[0] for e in entries], [e[1] for e in entries]
+
+
+def write_index(segment: Segment, interval: int = INDEX_INTERVAL) -> None:
+    """Seal a segment by writing its sparse timestamp index."""
+    entries = []
+    count = valid = 0
+    min_ts = max_ts = None
+    for count, record in enumerate(segment.records(), 1):
+        ts = record[0]
+        min_ts = ts if min_ts is None else min(min_ts, ts)
+        max_ts = ts if max_ts is None else max(max_ts, ts)
+        valid += record[7]
+        if (count - 1) % interval == 0:
+            entries.append((count - 1, max_ts))
+    data = INDEX_HEADER.pack(count, min_ts or 0, max_ts or 0, valid, interval)
+    data += b''.join(INDEX_ENTRY.pack(*entry) for entry in entries)
+    tmp_path = segment.index_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, segment.index_path)
+
+
+class ShareLogStorage(ShareStorage):
+    """Append-only, segmented log of fixed-size binary share records.
+
+    Layout: `<dir>/workers.txt` interns worker ids, and each round has a
+    `round-<n>/` directory of segments. A segment is a `.log` of RECORD_SIZE
+    records, a `.strs` heap holding submission ids, and (once sealed) an
+    `.idx` sparse timestamp index. Every process appends to its own segment,
+    so gunicorn workers never contend on a file; a segment rolls when the
+    round changes or it reaches `segment_bytes`. Writes are buffered by the
+    OS and fsynced at most every `sync_interval` seconds (group commit), so a
+    crash can lose that window of shares.
+
+    Readers map segments with mmap and unpack records in place. Audit
+    counters are kept per segment and only the bytes appended since the last
+    call are scanned. `compact_round` merges a closed round into one sorted,
+    indexed segment.
+    """
+
+    def __init__(self, path: str = 'data/share_log', segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 sync_interval: float = 1.0):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        self.workers = WorkerTable(os.path.join(path, 'workers.txt'))
+        self._lock = threading.Lock()
+        self._writer = None
+        self._stats: Dict[str, Dict] = {}
+
+    def init(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+    def _round_dir(self, round_num: int) -> str:
+        return os.path.join(self.path, f'round-{round_num:010d}')
+
+    def _rounds(self) -> List[int]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(name[6:]) for name in os.listdir(self.path)
+                      if name.startswith('round-') and name[6:].isdigit())
+
+    def _segments(self, round_num: int) -> List[Segment]:
+        round_dir = self._round_dir(round_num)
+        if not os.path.isdir(round_dir):
+            return []
+        return [Segment(os.path.join(round_dir, name)) for name in sorted(os.listdir(round_dir))
+                if name.endswith('.log')]
+
+    # Writing
+
+    def _open_segment(self, round_num: int) -> Dict:
+        round_dir = self._round_dir(round_num)
+        os.makedirs(round_dir, exist_ok=True)
+        base = os.path.join(round_dir, f'{time.time_ns():020d}-{os.getpid()}')
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        return {
+            'pid': os.getpid(),
+            'round': round_num,
+            'segment': Segment(base + '.log'),
+            'log': os.open(base + '.log', flags, 0o644),
+            'strs': os.open(base + '.strs', flags, 0o644),
+            'bytes': 0,
+            'strs_bytes': 0,
+            'synced_at': time.monotonic()
+        }
+
+    def _close_writer(self, seal: bool = True) -> None:
+        writer = self._writer
+        if writer is None:
+            return
+        self._writer = None
+        os.fsync(writer['strs'])
+        os.fsync(writer['log'])
+        os.close(writer['strs'])
+        os.close(writer['log'])
+        if seal:
+            write_index(writer['segment'])
+
+    def _writer_for(self, round_num: int) -> Dict:
+        writer = self._writer
+        if writer is not None and writer['pid'] != os.getpid():
+            # Forked child: the parent owns that segment
+            self._writer = writer = None
+        if writer is None or writer['round'] != round_num or writer['bytes'] >= self.segment_bytes:
+            self._close_writer()
+            self._writer = writer = self._open_segment(round_num)
+        return writer
+
+    def store_shares(self, shares: Iterable[ShareInput]) -> bool:
+        try:
+            with self._lock:
+                now = time.time_ns()
+                by_round: Dict[int, List] = {}
+                for share in shares:
+                    by_round.setdefault(share[0], []).append(share)
+                for round_num, batch in by_round.items():
+                    writer = self._writer_for(round_num)
+                    records = []
+                    strings = []
+                    offset = writer['strs_bytes']
+                    for _, hash_value, difficulty, valid, block_height, worker_id, submission_id in batch:
+                        raw_hash = bytes.fromhex(hash_value)
+                        if len(raw_hash) != 32:
+                            raise ValueError(f"hash must be 32 bytes, got {len(raw_hash)}")
+                        sub = submission_id.encode()
+                        records.append(RECORD.pack(now, round_num, block_height or 0,
+                                                   self.workers.intern(worker_id), offset,
+                                                   difficulty or 0.0, len(sub), 1 if valid else 0, raw_hash))
+                        strings.append(sub)
+                        offset += len(sub)
+                    # Submission ids land before the records that point at them
+                    data = b''.join(strings)
+                    os.write(writer['strs'], data)
+                    writer['strs_bytes'] += len(data)
+                    data = b''.join(records)
+                    os.write(writer['log'], data)
+                    writer['bytes'] += len(data)
+                    if time.monotonic() - writer['synced_at'] >= self.sync_interval:
+                        os.fsync(writer['strs'])
+                        os.fsync(writer['log'])
+                        writer['synced_at'] = time.monotonic()
+            return True
+        except Exception as e:
+            logging.error(f"Error storing shares: {e}")
+            return False
+
+    def flush(self) -> None:
+        """fsync the current segment now."""
+        with self._lock:
+            if self._writer is not None:
+                os.fsync(self._writer['strs'])
+                os.fsync(self._writer['log'])
+                self._writer['synced_at'] = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_writer()
+
+    # Reading
+
+    def _row(self, record: tuple, strings) -> ShareRow:
+        ts, round_num, block_height, worker, offset, difficulty, length, valid, raw_hash = record
+        strings.seek(offset)
+        return (ts, round_num, ts // 10 ** 9, raw_hash.hex(), difficulty, valid, block_height,
+                self.workers.name(worker), strings.read(length).decode())
+
+    def audit_stats(self) -> Dict[str, int]:
+        total = valid = 0
+        workers = set()
+        with self._lock:
+            for round_num in self._rounds():
+                for segment in self._segments(round_num):
+                    stats = self._stats.setdefault(segment.path, {'records': 0, 'valid': 0, 'workers': set()})
+                    count = segment.count()
+                    for record in segment.records(stats['records'], count):
+                        stats['valid'] += record[7]
+                        stats['workers'].add(record[3])
+                    stats['records'] = max(stats['records'], count)
+                    total += stats['records']
+                    valid += stats['valid']
+                    workers |= stats['workers']
+        return {
+            'total_shares': total,
+            'valid_shares': valid,
+            'invalid_shares': total - valid,
+            'unique_workers': len(workers)
+        }
+
+    def recent_shares(self, limit: int = 10) -> List[ShareRow]:
+        candidates = []
+        for round_num in reversed(self._rounds()):
+            for segment in self._segments(round_num):
+                count = segment.count()
+                with segment.strings() as strings:
+                    candidates.extend(self._row(record, strings)
+                                      for record in segment.records(max(0, count - limit), count))
+            if len(candidates) >= limit:
+                break
+        return sorted(candidates, key=lambda row: row[0], reverse=True)[:limit]
+
+    def round_stats(self, round_num: int) -> Dict:
+        total = valid = 0
+        workers = set()
+        for segment in self._segments(round_num):
+            for record in segment.records():
+                total += 1
+                valid += record[7]
+                workers.add(record[3])
+        return {'total_shares': total, 'valid_shares': valid, 'invalid_shares': total - valid,
+                'workers': sorted(self.workers.name(worker) for worker in workers)}
+
+    def round_numbers(self) -> List[int]:
+        return [round_num for round_num in self._rounds() if self._segments(round_num)]
+
+    def iter_round(self, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   with_hash: bool = False) -> Iterator[List[tuple]]:
+        # Snapshot segment lengths so shares appended meanwhile are excluded
+        segments = [(segment, segment.count()) for segment in self._segments(round_num)]
+        chunk = []
+        for segment, count in segments:
+            for record in segment.records(0, count):
+                if record[7]:
+                    share = (record[0], self.workers.name(record[3]), record[5])
+                    chunk.append(share + (record[8].hex(),) if with_hash else share)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_time_range(self, start: int, end: int,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[ShareRow]]:
+        start_ns, end_ns = start * 10 ** 9, (end + 1) * 10 ** 9 - 1
+        chunk = []
+        for round_num in self._rounds():
+            for segment in self._segments(round_num):
+                first = 0
+                index = segment.index()
+                if index is not None:
+                    (count, min_ts, max_ts, _, _), positions, running_max = index
+                    if max_ts < start_ns or min_ts > end_ns:
+                        continue
+                    # Every record before the last sample whose running max is below start is too old
+                    sample = bisect.bisect_left(running_max, start_ns) - 1
+                    first = positions[sample] if sample >= 0 else 0
+                with segment.strings() as strings:
+                    for record in segment.records(first):
+                        if start_ns <= record[0] <= end_ns:
+                            chunk.append(self._row(record, strings))
+                            if len(chunk) >= chunk_size:
+                                yield chunk
+                                chunk = []
+        if chunk:
+            yield chunk
+
+    # Maintenance
+
+    def compact_round(self, round_num: int) -> int:
+        """Merge a closed round's segments into one sorted, indexed segment.
+
+        Only run this once no process is still writing to the round. Returns
+        the number of records in the compacted segment.
+        """
+        round_dir = self._round_dir(round_num)
+        segments = self._segments(round_num)
+        if len(segments) <= 1 and all(segment.index() is not None for segment in segments):
+            return sum(segment.count() for segment in segments)
+        compact_dir = round_dir + '.compact'
+        shutil.rmtree(compact_dir, ignore_errors=True)
+        os.makedirs(compact_dir)
+        base = os.path.join(compact_dir, f'{time.time_ns():020d}-compact')
+        offset = 0
+        count = 0
+        # Each segment is already in time order, so a k-way merge streams the
+        # round through without holding it in memory
+        with contextlib.ExitStack() as stack:
+            streams = [self._with_strings(segment, stack.enter_context(segment.strings())) for segment in segments]
+            log = stack.enter_context(open(base + '.log', 'wb'))
+            strs = stack.enter_context(open(base + '.strs', 'wb'))
+            for record, sub in heapq.merge(*streams, key=lambda item: item[0][0]):
+                log.write(RECORD.pack(record[0], record[1], record[2], record[3], offset,
+                                      record[5], len(sub), record[7], record[8]))
+                strs.write(sub)
+                offset += len(sub)
+                count += 1
+            for f in (log, strs):
+                f.flush()
+                os.fsync(f.fileno())
+        write_index(Segment(base + '.log'))
+        old_dir = round_dir + '.old'
+        os.rename(round_dir, old_dir)
+        os.rename(compact_dir, round_dir)
+        shutil.rmtree(old_dir)
+        with self._lock:
+            self._stats = {path: stats for path, stats in self._stats.items()
+                           if not path.startswith(round_dir + os.sep)}
+        logging.info(f"Compacted round {round_num}: {len(segments)} segments, {count} shares")
+        return count
+
+    @staticmethod
+    def _with_strings(segment: Segment, strings) -> Iterator[Tuple[tuple, bytes]]:
+        for record in segment.records():
+            strings.seek(record[4])
+            yield record, strings.read(record[6])
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import math
+import time
+import base64
+import hashlib
+import logging
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**p one-byte registers (2 KB at p=11, about 2% error)."""
+
+    def __init__(self, p: int = 11):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate while most registers are empty
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge HyperLogLog with p={other.p} into p={self.p}")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self) -> Dict:
+        return {'p': self.p, 'registers': base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'HyperLogLog':
+        sketch = cls(data['p'])
+        sketch.registers = bytearray(base64.b64decode(data['registers']))
+        return sketch
+
+
+class SpaceSaving:
+    """Heaviest keys by weight, tracking at most `k` counters.
+
+    Every monitored count overestimates the true weight by at most its
+    recorded error, and any key heavier than total / k is monitored.
+    """
+
+    def __init__(self, k: int = 32):
+        self.k = k
+        self.counters: Dict[str, List[float]] = {}
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return
+        if len(self.counters) < self.k:
+            self.counters[key] = [weight, 0.0]
+            return
+        evicted = min(self.counters, key=lambda name: self.counters[name][0])
+        floor = self.counters.pop(evicted)[0]
+        self.counters[key] = [floor + weight, floor]
+
+    def _floor(self) -> float:
+        # Weight any unmonitored key may have had
+        if len(self.counters) < self.k:
+            return 0.0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        own_floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for key in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(key, (own_floor, own_floor))
+            other_count, other_error = other.counters.get(key, (other_floor, other_floor))
+            merged[key] = [count + other_count, error + other_error]
+        top = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:self.k]
+        self.counters = dict(top)
+
+    def top(self, n: Optional[int] = None) -> List[Dict]:
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [{'worker_id': key, 'difficulty': count, 'error': error} for key, (count, error) in ranked[:n]]
+
+    def to_dict(self) -> Dict:
+        return {'k': self.k, 'counters': [[key, count, error] for key, (count, error) in self.counters.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SpaceSaving':
+        sketch = cls(data['k'])
+        sketch.counters = {key: [count, error] for key, count, error in data['counters']}
+        return sketch
+
+
+class DDSketch:
+    """Quantiles within `relative_accuracy` of the true value, in log-spaced buckets.
+
+    Past `max_bins` buckets the lowest ones are collapsed together, which only
+    costs accuracy at the bottom of the distribution.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 256):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def merge(self, other: 'DDSketch') -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge DDSketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def to_dict(self) -> Dict:
+        return {'relative_accuracy': self.relative_accuracy, 'max_bins': self.max_bins,
+                'zero_count': self.zero_count, 'count': self.count,
+                'bins': {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DDSketch':
+        sketch = cls(data['relative_accuracy'], data['max_bins'])
+        sketch.bins = {int(index): count for index, count in data['bins'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        return sketch
+
+
+class ShareSketches:
+    """The three sketches for one round or time window."""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, workers: Optional[HyperLogLog] = None, top: Optional[SpaceSaving] = None,
+                 difficulty: Optional[DDSketch] = None):
+        self.workers = workers or HyperLogLog()
+        self.top = top or SpaceSaving()
+        self.difficulty = difficulty or DDSketch()
+
+    def add(self, worker_id: str, difficulty: float) -> None:
+        self.workers.add(worker_id)
+        self.top.add(worker_id, difficulty)
+        self.difficulty.add(difficulty)
+
+    def merge(self, other: 'ShareSketches') -> 'ShareSketches':
+        self.workers.merge(other.workers)
+        self.top.merge(other.top)
+        self.difficulty.merge(other.difficulty)
+        return self
+
+    def summary(self, top_n: int = 10) -> Dict:
+        return {
+            'shares': self.difficulty.count,
+            'unique_workers': self.workers.count(),
+            'top_workers': self.top.top(top_n),
+            'difficulty_quantiles': {f'p{int(q * 100)}': self.difficulty.quantile(q) for q in self.QUANTILES}
+        }
+
+    def to_dict(self) -> Dict:
+        return {'workers': self.workers.to_dict(), 'top': self.top.to_dict(),
+                'difficulty': self.difficulty.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ShareSketches':
+        return cls(HyperLogLog.from_dict(data['workers']), SpaceSaving.from_dict(data['top']),
+                   DDSketch.from_dict(data['difficulty']))
+
+
+def merge_all(sketches: Iterable[ShareSketches]) -> ShareSketches:
+    merged = ShareSketches()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+class SketchRegistry:
+    """Sketches of accepted shares per round and per time window.
+
+    Each process updates its own sketches in memory and writes them to a
+    shared SQLite file at most every `flush_interval` seconds, one row per
+    (scope, key, owner). Reads merge every owner's rows, so all gunicorn
+    workers on a node answer the same; `to_dict` output from other nodes
+    merges the same way. Only the `max_rounds` most recent rounds and
+    `windows` most recent windows are kept in memory; a sketch recorded to
+    again after eviction is reloaded from this process's row first. Rows of
+    processes on this node that have exited are folded into one row per
+    (scope, key) when a process first opens the file.
+    """
+
+    def __init__(self, path: Optional[str] = 'data/sketches.db', window_seconds: int = 60, windows: int = 60,
+                 max_rounds: int = 16, flush_interval: float = 5.0, owner: Optional[str] = None):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.max_rounds = max_rounds
+        self.flush_interval = flush_interval
+        self._pid_owner = owner is None
+        self.owner = owner or self._process_owner()
+        self._rounds: Dict[int, ShareSketches] = {}
+        self._windows: Dict[int, ShareSketches] = {}
+        # Sketches changed since the last flush, kept here even if evicted from memory meanwhile
+        self._dirty: Dict[Tuple[str, int], ShareSketches] = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @staticmethod
+    def _process_owner() -> str:
+        return f"{os.environ.get('NODE_ID', 'local')}:{os.getpid()}"
+
+    def after_fork(self) -> None:
+        """Start empty in a forked child, e.g. a preloaded gunicorn worker, under the child's own owner."""
+        if self._pid_owner:
+            self.owner = self._process_owner()
+        self._rounds.clear()
+        self._windows.clear()
+        self._dirty.clear()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        # Fold the rows of workers that died before this one was forked
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS sketches
+                            (scope TEXT NOT NULL,
+                             key INTEGER NOT NULL,
+                             owner TEXT NOT NULL,
+                             payload TEXT NOT NULL,
+                             PRIMARY KEY (scope, key, owner))''')
+            conn.commit()
+            self._ready = True
+            try:
+                self._fold_dead_owners(conn)
+            except Exception as e:
+                logging.error(f"Error folding sketches of exited processes: {e}")
+        return conn
+
+    @staticmethod
+    def _exited(owner: str) -> bool:
+        """True for a `_process_owner` name of this node whose process no longer exists."""
+        node, _, pid = owner.rpartition(':')
+        if node != os.environ.get('NODE_ID', 'local') or not pid.isdigit() or int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _fold_dead_owners(self, conn: sqlite3.Connection) -> None:
+        """Merge the rows of exited processes into one `<node>:exited` row per (scope, key)."""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            dead = [owner for (owner,) in conn.execute('SELECT DISTINCT owner FROM sketches') if self._exited(owner)]
+            if not dead:
+                conn.rollback()
+                return
+            folded_owner = f"{os.environ.get('NODE_ID', 'local')}:exited"
+            marks = ','.join('?' * len(dead))
+            folded: Dict[Tuple[str, int], ShareSketches] = {}
+            for scope, key, payload in conn.execute(f'''SELECT scope, key, payload FROM sketches
+                                                       WHERE owner IN ({marks}, ?)''', dead + [folded_owner]):
+                sketch = ShareSketches.from_dict(json.loads(payload))
+                if (scope, key) in folded:
+                    folded[(scope, key)].merge(sketch)
+                else:
+                    folded[(scope, key)] = sketch
+            conn.execute(f'DELETE FROM sketches WHERE owner IN ({marks})', dead)
+            conn.executemany('INSERT OR REPLACE INTO sketches (scope, key, owner, payload) VALUES (?, ?, ?, ?)',
+                             [(scope, key, folded_owner, json.dumps(sketch.to_dict(), separators=(',', ':')))
+                              for (scope, key), sketch in folded.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logging.info(f"Folded the sketches of {len(dead)} exited processes")
+
+    def _window(self, now: float) -> int:
+        return int(now // self.window_seconds) * self.window_seconds
+
+    def _stored(self, scope: str, key: int) -> Optional[ShareSketches]:
+        """This process's flushed sketch for (scope, key), if there is one."""
+        if not self.path:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT payload FROM sketches WHERE scope = ? AND key = ? AND owner = ?',
+                                   (scope, key, self.owner)).fetchone()
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f"Error loading sketch: {e}")
+            return None
+        return ShareSketches.from_dict(json.loads(row[0])) if row else None
+
+    def record(self, round_num: int, worker_id: str, difficulty: float, now: Optional[float] = None) -> None:
+        window = self._window(time.time() if now is None else now)
+        scopes = (('round', self._rounds, round_num, self.max_rounds), ('window', self._windows, window, self.windows))
+        with self._lock:
+            missing = [(scope, key) for scope, table, key, _ in scopes
+                       if key not in table and (scope, key) not in self._dirty]
+        # Read outside the lock; sketches are only missing from memory when new or evicted
+        stored = {(scope, key): self._stored(scope, key) for scope, key in missing}
+        with self._lock:
+            for scope, table, key, limit in scopes:
+                sketch = table.get(key)
+                if sketch is None:
+                    # Continue from a copy evicted earlier, so the next flush does not overwrite its row
+                    sketch = self._dirty.get((scope, key)) or stored.get((scope, key)) or ShareSketches()
+                    table[key] = sketch
+                    if len(table) > limit:
+                        del table[min(table)]
+                sketch.add(worker_id, difficulty)
+                self._dirty[(scope, key)] = sketch
+            due = self.path and time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write this process's changed sketches to the shared file."""
+        if not self.path:
+            return
+        with self._lock:
+            rows = [(scope, key, self.owner, json.dumps(sketch.to_dict(), separators=(',', ':')))
+                    for (scope, key), sketch in self._dirty.items()]
+            self._dirty.clear()
+            self._flushed_at = time.monotonic()
+        if not rows:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany('INSERT OR REPLACE INTO sketches (scope, key, owner, payload) VALUES (?, ?, ?, ?)',
+                                 rows)
+                cutoff = self._window(time.time()) - self.windows * self.window_seconds
+                conn.execute("DELETE FROM sketches WHERE scope = 'window' AND key < ?", (cutoff,))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f"Error flushing sketches: {e}")
+
+    def _load(self, scope: str, low: int, high: int) -> List[ShareSketches]:
+        """Every owner's sketches with low <= key <= high."""
+        if not self.path:
+            table = self._rounds if scope == 'round' else self._windows
+            with self._lock:
+                return [ShareSketches.from_dict(sketch.to_dict())
+                        for key, sketch in table.items() if low <= key <= high]
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT payload FROM sketches WHERE scope = ? AND key BETWEEN ? AND ?',
+                                (scope, low, high)).fetchall()
+        finally:
+            conn.close()
+        return [ShareSketches.from_dict(json.loads(payload)) for (payload,) in rows]
+
+    def round_sketches(self, round_num: int) -> ShareSketches:
+        return merge_all(self._load('round', round_num, round_num))
+
+    def window_sketches(self, seconds: float, now: Optional[float] = None) -> ShareSketches:
+        """Merged sketches of the windows overlapping the last `seconds`."""
+        now = time.time() if now is None else now
+        return merge_all(self._load('window', self._window(now - seconds), self._window(now)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge share sketches from several mining nodes')
+    parser.add_argument('nodes', nargs='+', help='Node base URLs, e.g. http://node-a:8080')
+    parser.add_argument('--round', type=int, help='Round number (default: each node\'s current round)')
+    parser.add_argument('--window', type=int, default=300, help='Window length in seconds')
+    args = parser.parse_args()
+
+    import requests
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        params = {'window': args.window, 'raw': 1}
+        if args.round is not None:
+            params['round'] = args.round
+        rounds, windows = [], []
+        for node in args.nodes:
+            response = requests.get(f"{node.rstrip('/')}/audit/sketches", params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            if data.get('round'):
+                rounds.append(ShareSketches.from_dict(data['round']['sketch']))
+            windows.append(ShareSketches.from_dict(data['window']['sketch']))
+        print(json.dumps({'round': merge_all(rounds).summary(), 'window': merge_all(windows).summary()}, indent=2))
+    except Exception as e:
+        logging.error(f"Error merging sketches: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
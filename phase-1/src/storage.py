@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import logging
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Rows returned to callers match the columns of the `shares` table:
+# (id, round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id)
+ShareRow = Tuple[int, int, int, str, float, int, int, str, str]
+
+# One share as passed to store_shares:
+# (round_number, hash, difficulty, valid, block_height, worker_id, submission_id)
+ShareInput = Tuple[int, str, float, bool, int, str, str]
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def stream_shares(conn: sqlite3.Connection, round_num: int, max_id: int,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, with_hash: bool = False) -> Iterator[List[tuple]]:
+    """Yield a round's valid shares as chunks of (id, worker_id, difficulty[, hash]).
+
+    SQLite has no server-side cursors, and keeping one read statement open
+    for a whole large round would block share writers in rollback-journal
+    mode. Each chunk is therefore its own short query, resuming after the
+    last id seen (keyset pagination over the round_number index), so memory
+    is bounded by `chunk_size` and writers can commit between chunks. Shares
+    with an id above `max_id` (written after the close started) are excluded.
+    """
+    columns = 'id, worker_id, difficulty, lower(hash)' if with_hash else 'id, worker_id, difficulty'
+    last_id = 0
+    while True:
+        rows = conn.execute(f'''SELECT {columns} FROM shares
+                                WHERE round_number = ? AND valid = 1 AND id > ? AND id <= ?
+                                ORDER BY id LIMIT ?''',
+                            (round_num, last_id, max_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def sql_round_stats(conn: sqlite3.Connection, table: str, round_num: int) -> Dict:
+    """round_stats for a table with the `shares` columns, through its round_number index."""
+    total, valid = conn.execute(f'''SELECT COUNT(*), COALESCE(SUM(valid = 1), 0)
+                                    FROM {table} WHERE round_number = ?''', (round_num,)).fetchone()
+    workers = conn.execute(f'''SELECT DISTINCT worker_id FROM {table}
+                               WHERE round_number = ? AND worker_id IS NOT NULL''', (round_num,)).fetchall()
+    return {'total_shares': total, 'valid_shares': valid, 'invalid_shares': total - valid,
+            'workers': sorted(worker for (worker,) in workers)}
+
+
+def sql_round_numbers(conn: sqlite3.Connection, table: str) -> List[int]:
+    """round_numbers for a table with the `shares` columns, through its round_number index."""
+    rows = conn.execute(f'''SELECT DISTINCT round_number FROM {table}
+                            WHERE round_number IS NOT NULL ORDER BY round_number''').fetchall()
+    return [round_num for (round_num,) in rows]
+
+
+class ShareStorage:
+    """Interface implemented by every share storage backend."""
+
+    def init(self) -> None:
+        """Create whatever files or tables the backend needs."""
+        raise NotImplementedError
+
+    def store_share(self, round_num: int, hash_value: str, difficulty: float, valid: bool,
+                    block_height: int, worker_id: str, submission_id: str) -> bool:
+        return self.store_shares([(round_num, hash_value, difficulty, valid, block_height, worker_id, submission_id)])
+
+    def store_shares(self, shares: Iterable[ShareInput]) -> bool:
+        raise NotImplementedError
+
+    def audit_stats(self) -> Dict[str, int]:
+        """Return total_shares, valid_shares, invalid_shares and unique_workers."""
+        raise NotImplementedError
+
+    def round_stats(self, round_num: int) -> Dict:
+        """Return one round's total_shares, valid_shares, invalid_shares and sorted worker ids."""
+        raise NotImplementedError
+
+    def round_numbers(self) -> List[int]:
+        """Return the numbers of the rounds that have shares, in ascending order."""
+        raise NotImplementedError
+
+    def recent_shares(self, limit: int = 10) -> List[ShareRow]:
+        """Return the most recent shares, newest first."""
+        raise NotImplementedError
+
+    def iter_round(self, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   with_hash: bool = False) -> Iterator[List[tuple]]:
+        """Yield a round's valid shares as chunks of (id, worker_id, difficulty).
+
+        With `with_hash` each share also carries its hash as lowercase hex.
+        Shares stored after iteration starts are not included.
+        """
+        raise NotImplementedError
+
+    def iter_time_range(self, start: int, end: int,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[ShareRow]]:
+        """Yield shares with start <= timestamp <= end (seconds) in chunks."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStorage(ShareStorage):
+    """The original `shares` table, one connection and commit per stored share."""
+
+    def __init__(self, path: str = 'data/shares.db'):
+        self.path = path
+
+    def init(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        # WAL lets readers, backups included, run alongside the writers
+        conn.execute('PRAGMA journal_mode=WAL')
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS shares
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      round_number INTEGER,
+                      timestamp INTEGER,
+                      hash TEXT,
+                      difficulty REAL,
+                      valid INTEGER,
+                      block_height INTEGER,
+                      worker_id TEXT,
+                      submission_id TEXT)''')
+        # Round close streams a round's shares by id; keep that lookup indexed
+        c.execute('CREATE INDEX IF NOT EXISTS idx_shares_round ON shares (round_number)')
+        conn.commit()
+        conn.close()
+
+    def store_shares(self, shares: Iterable[ShareInput]) -> bool:
+        conn = sqlite3.connect(self.path)
+        try:
+            now = int(time.time())
+            conn.executemany('''INSERT INTO shares
+                                (round_number, timestamp, hash, difficulty, valid, block_height, worker_id, submission_id)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                             [(r, now, h, d, v, b, w, s) for r, h, d, v, b, w, s in shares])
+            conn.commit()
+            return True
+        except Exception as e:
+            logging.error(f"Error storing shares: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def audit_stats(self) -> Dict[str, int]:
+        conn = sqlite3.connect(self.path)
+        try:
+            stats = conn.execute('''SELECT
+                                    COUNT(*) as total_shares,
+                                    SUM(CASE WHEN valid = 1 THEN 1 ELSE 0 END) as valid_shares,
+                                    SUM(CASE WHEN valid = 0 THEN 1 ELSE 0 END) as invalid_shares,
+                                    COUNT(DISTINCT worker_id) as unique_workers
+                                    FROM shares''').fetchone()
+        finally:
+            conn.close()
+        return {
+            'total_shares': stats[0],
+            'valid_shares': stats[1],
+            'invalid_shares': stats[2],
+            'unique_workers': stats[3]
+        }
+
+    def round_stats(self, round_num: int) -> Dict:
+        conn = sqlite3.connect(self.path)
+        try:
+            return sql_round_stats(conn, 'shares', round_num)
+        finally:
+            conn.close()
+
+    def round_numbers(self) -> List[int]:
+        conn = sqlite3.connect(self.path)
+        try:
+            return sql_round_numbers(conn, 'shares')
+        finally:
+            conn.close()
+
+    def recent_shares(self, limit: int = 10) -> List[ShareRow]:
+        conn = sqlite3.connect(self.path)
+        try:
+            # Ids increase with time, and unlike timestamp they are indexed
+            return conn.execute('SELECT * FROM shares ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        finally:
+            conn.close()
+
+    def iter_round(self, round_num: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   with_hash: bool = False) -> Iterator[List[tuple]]:
+        conn = sqlite3.connect(self.path)
+        try:
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM shares').fetchone()[0]
+            yield from stream_shares(conn, round_num, max_id, chunk_size, with_hash)
+        finally:
+            conn.close()
+
+    def iter_time_range(self, start: int, end: int,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[ShareRow]]:
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute('SELECT * FROM shares WHERE timestamp BETWEEN ? AND ? ORDER BY id', (start, end))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+
+def create_storage(backend: Optional[str] = None, path: Optional[str] = None) -> ShareStorage:
+    """Build the configured backend: STORAGE_BACKEND is 'sqlite' (default), 'compact', 'sharelog' or 'replica'."""
+    backend = backend or os.environ.get('STORAGE_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteStorage(path or os.environ.get('DB_PATH', 'data/shares.db'))
+    if backend == 'compact':
+        try:
+            from src.compact_storage import CompactSQLiteStorage
+        except ImportError:
+            from compact_storage import CompactSQLiteStorage
+        return CompactSQLiteStorage(path or os.environ.get('DB_PATH', 'data/shares.db'))
+    if backend == 'sharelog':
+        try:
+            from src.share_log import ShareLogStorage
+        except ImportError:
+            from share_log import ShareLogStorage
+        return ShareLogStorage(path or os.environ.get('SHARE_LOG_DIR', 'data/share_log'))
+    if backend == 'replica':
+        try:
+            from src.replication import ReplicaStore
+        except ImportError:
+            from replication import ReplicaStore
+        return ReplicaStore(path or os.environ.get('REPLICA_DB', 'data/replica.db'),
+                            os.environ.get('NODE_ID', 'local'))
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import mining_task
+from src.round_lifecycle import RoundManager
+from src.admission import AdmissionController, TokenBucketTable
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_worker_bucket_scaled_by_difficulty(self):
+        difficulties = {'easy': 1.0, 'hard': 4.0}
+        controller = AdmissionController(worker_rate=2.0, ip_rate=1000, burst_seconds=2.0,
+                                         difficulty_for=difficulties.get)
+        with patch('src.admission.time.monotonic', return_value=100.0):
+            admitted = {worker: 0 for worker in difficulties}
+            for worker in difficulties:
+                for _ in range(10):
+                    reason, _ = controller.admit(worker, '10.0.0.1')
+                    if reason is None:
+                        admitted[worker] += 1
+                        controller.release()
+            self.assertEqual(admitted, {'easy': 4, 'hard': 1})
+            reason, retry_after = controller.admit('hard', '10.0.0.1')
+            self.assertEqual(reason, 'worker')
+            self.assertAlmostEqual(retry_after, 2.0)
+        with patch('src.admission.time.monotonic', return_value=102.0):
+            self.assertEqual(controller.admit('hard', '10.0.0.1'), (None, 0.0))
+
+    def test_ip_and_concurrency_limits(self):
+        controller = AdmissionController(ip_rate=1.0, burst_seconds=2.0, max_concurrent=1)
+        self.assertEqual(controller.admit(None, '10.0.0.1')[0], None)
+        self.assertEqual(controller.admit(None, '10.0.0.2')[0], 'concurrency')
+        controller.release()
+        self.assertEqual(controller.admit(None, '10.0.0.1')[0], None)
+        controller.release()
+        self.assertEqual(controller.admit(None, '10.0.0.1')[0], 'ip')
+        # A rejected worker request does not spend the IP's token
+        self.assertEqual(controller.admit('w', '10.0.0.2')[0], None)
+
+    def test_table_is_bounded(self):
+        table = TokenBucketTable(max_keys=3)
+        for n in range(10):
+            table.take(f'k{n}', 5.0, 0.0)
+        self.assertEqual(list(table.buckets), ['k7', 'k8', 'k9'])
+        self.assertEqual(table.peek('k0', 1.0, 5.0, 0.0), 5.0)
+
+
+class TestSubmissionBackpressure(unittest.TestCase):
+    def setUp(self):
+        mining_task.app.config['TESTING'] = True
+        self.client = mining_task.app.test_client()
+        self.original = mining_task.admission
+        mining_task.admission = AdmissionController(worker_rate=1.0, ip_rate=1000, burst_seconds=1.0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_rounds = mining_task.round_manager
+        mining_task.round_manager = RoundManager(mining_task.storage, os.path.join(self.tmp_dir.name, 'rounds.db'))
+
+    def tearDown(self):
+        mining_task.admission = self.original
+        mining_task.round_manager = self.original_rounds
+        self.tmp_dir.cleanup()
+
+    def test_flood_gets_429_before_parsing(self):
+        rejected = mining_task.admission_rejections.labels(reason='worker')
+        before = rejected._value.get()
+        with patch.object(mining_task, 'store_share', return_value=True) as store:
+            headers = {'X-Worker-Id': 'flooder'}
+            body = json.dumps({'hash': '00' * 32, 'difficulty': 1.0, 'block_height': 1,
+                               'worker_id': 'flooder', 'submission_id': 's'})
+            first = self.client.post('/submission/1', data=body, content_type='application/json', headers=headers)
+            # Not even valid JSON: rejected before the body is looked at
+            second = self.client.post('/submission/1', data='{', content_type='application/json', headers=headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(second.headers['Retry-After'], '1')
+        self.assertEqual(store.call_count, 1)
+        self.assertEqual(mining_task.admission.in_flight, 0)
+        self.assertEqual(rejected._value.get(), before + 1)
+
+    def test_worker_labels_are_bounded(self):
+        with patch.object(mining_task, 'METRICS_MAX_WORKERS', 2), patch.object(mining_task, 'labelled_workers', set()):
+            self.assertEqual([mining_task.worker_label(f'w{n}') for n in range(4)], ['w0', 'w1', 'other', 'other'])
+            self.assertEqual(mining_task.worker_label('w1'), 'w1')
+
+    def test_worker_without_header_is_still_limited(self):
+        with patch.object(mining_task, 'store_share', return_value=True) as store:
+            body = json.dumps({'hash': '00' * 32, 'difficulty': 1.0, 'block_height': 1,
+                               'worker_id': 'headless', 'submission_id': 's'})
+            first = self.client.post('/submission/1', data=body, content_type='application/json')
+            second = self.client.post('/submission/1', data=body, content_type='application/json')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(json.loads(second.data)['reason'], 'worker')
+        self.assertEqual(store.call_count, 1)
+        self.assertEqual(mining_task.admission.in_flight, 0)
+
+    def test_header_must_match_body(self):
+        response = self.client.post('/submission/1', data=json.dumps({
+            'hash': '00' * 32, 'difficulty': 1.0, 'block_height': 1,
+            'worker_id': 'someone_else', 'submission_id': 's'
+        }), content_type='application/json', headers={'X-Worker-Id': 'me'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
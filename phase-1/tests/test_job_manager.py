@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.job_manager import JobManager
+from src import mining_task
+from src.round_lifecycle import RoundManager
+
+
+def make_template(height, prev_hash):
+    return {
+        'height': height,
+        'previousblockhash': prev_hash,
+        'bits': '207fffff',
+        'target': '7fffff' + '0' * 58,
+        'curtime': 1745687089,
+        'longpollid': f'{prev_hash}{height}'
+    }
+
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = JobManager(max_jobs=3)
+
+    def test_accepts_everything_before_first_template(self):
+        self.assertIsNone(self.manager.check_share('missing', 1))
+        self.assertIsNone(self.manager.check_share(None, 42))
+
+    def test_same_tip_reuses_job(self):
+        first = self.manager.add_template(make_template(10, 'aa'))
+        second = self.manager.add_template(make_template(10, 'aa'))
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(len(self.manager.jobs), 1)
+
+    def test_stale_and_unknown_jobs_rejected(self):
+        old = self.manager.add_template(make_template(10, 'aa'))
+        new = self.manager.add_template(make_template(11, 'bb'))
+        self.assertIsNone(self.manager.check_share(new['job_id'], 11))
+        self.assertEqual(self.manager.check_share(old['job_id'], 10), 'stale')
+        self.assertEqual(self.manager.check_share('ffff', 11), 'unknown-job')
+
+    def test_height_checked_without_job_id(self):
+        self.manager.add_template(make_template(11, 'bb'))
+        self.assertIsNone(self.manager.check_share(None, 11))
+        self.assertEqual(self.manager.check_share(None, 10), 'stale')
+        self.assertEqual(self.manager.check_share(None, 12), 'unknown-job')
+
+    def test_recent_jobs_bounded(self):
+        jobs = [self.manager.add_template(make_template(h, f'{h:02x}')) for h in range(5)]
+        self.assertEqual(len(self.manager.jobs), 3)
+        self.assertNotIn(jobs[0]['job_id'], self.manager.jobs)
+        self.assertEqual(self.manager.current_job()['job_id'], jobs[-1]['job_id'])
+
+
+class TestStaleSubmission(unittest.TestCase):
+    def setUp(self):
+        mining_task.app.config['TESTING'] = True
+        self.client = mining_task.app.test_client()
+        self.original_manager = mining_task.job_manager
+        mining_task.job_manager = JobManager()
+        mining_task.job_manager.add_template(make_template(5, 'aa'))
+        self.job = mining_task.job_manager.add_template(make_template(6, 'bb'))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_rounds = mining_task.round_manager
+        mining_task.round_manager = RoundManager(mining_task.storage, os.path.join(self.tmp_dir.name, 'rounds.db'))
+
+    def tearDown(self):
+        mining_task.job_manager = self.original_manager
+        mining_task.round_manager = self.original_rounds
+        self.tmp_dir.cleanup()
+
+    def test_task_includes_current_job(self):
+        response = self.client.get('/task/1')
+        data = json.loads(response.data)
+        self.assertEqual(data['job_id'], self.job['job_id'])
+        self.assertEqual(data['block_height'], 6)
+
+    def test_stale_share_rejected(self):
+        response = self.client.post('/submission/1', data=json.dumps({
+            'hash': '000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f',
+            'difficulty': 1.0,
+            'block_height': 5,
+            'worker_id': 'stale_worker',
+            'submission_id': 'stale_submission'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['reason'], 'stale')
+        rejected = mining_task.stale_shares.labels(worker_id='stale_worker', reason='stale')
+        self.assertEqual(rejected._value.get(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,16 +5,27 @@ import sys
 import json
 import unittest
 import sqlite3
+import tempfile
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.mining_task import app, init_db
+from src import mining_task
+from src.mining_task import app, create_app, init_db
+from src.storage import SQLiteStorage
+from src.round_lifecycle import RoundManager
 
 class TestMiningTask(unittest.TestCase):
     def setUp(self):
         app.config['TESTING'] = True
         self.client = app.test_client()
+        # Keep shares and round state out of data/
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_storage = mining_task.storage
+        self.original_rounds = mining_task.round_manager
+        mining_task.storage = SQLiteStorage(os.path.join(self.tmp_dir.name, 'shares.db'))
+        mining_task.round_manager = RoundManager(mining_task.storage, os.path.join(self.tmp_dir.name, 'rounds.db'),
+                                                 close_grace=0, poll_interval=0)
         
         # Set up test database
         self.test_db_path = 'data/test_shares.db'
@@ -59,6 +70,14 @@ class TestMiningTask(unittest.TestCase):
         self.conn.close()
         if os.path.exists(self.test_db_path):
             os.remove(self.test_db_path)
+        mining_task.storage = self.original_storage
+        mining_task.round_manager = self.original_rounds
+        self.tmp_dir.cleanup()
+
+    def test_create_app(self):
+        self.assertIs(create_app(), app)
+        response = self.client.get('/healthz')
+        self.assertTrue(json.loads(response.data)['components']['share_collection'])
 
     def test_health_endpoint(self):
         response = self.client.get('/healthz')
@@ -95,6 +114,20 @@ class TestMiningTask(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data['status'], 'success')
 
+    def test_submission_rejects_non_integer_block_height(self):
+        original_height = mining_task.job_manager.current_height
+        mining_task.job_manager.current_height = 5
+        self.addCleanup(setattr, mining_task.job_manager, 'current_height', original_height)
+        for block_height in ('5', 5.0, None, True):
+            response = self.client.post(
+                f'/submission/{self.test_round}',
+                data=json.dumps({'hash': '00' * 32, 'difficulty': 1.0, 'block_height': block_height,
+                                 'worker_id': 'test_worker', 'submission_id': 'bad_height'}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.data)['error'], 'block_height must be an integer')
+
     def test_audit_endpoint(self):
         # First submit a test share
         test_data = {
@@ -131,5 +164,57 @@ class TestMiningTask(unittest.TestCase):
         self.assertGreater(stats['total_shares'], 0)
         self.assertGreater(len(data['recent_shares']), 0)
 
+    def test_audit_counts_shares_stored_before_round_tracking(self):
+        legacy = SQLiteStorage(os.path.join(self.tmp_dir.name, 'legacy_shares.db'))
+        legacy.init()
+        legacy.store_shares([(1, f'{n:064x}', 1.0, n != 4, 1, f'worker_{n % 2}', f'legacy_{n}') for n in range(5)])
+        mining_task.storage = legacy
+        mining_task.round_manager = RoundManager(legacy, os.path.join(self.tmp_dir.name, 'legacy_rounds.db'))
+
+        stats = json.loads(self.client.get('/audit').data)['statistics']
+        self.assertEqual(stats, {'total_shares': 5, 'valid_shares': 4, 'invalid_shares': 1, 'unique_workers': 2})
+
+    def test_closed_round_rejects_shares_and_serves_audit(self):
+        mining_task.round_manager.open_round(77)
+        self.client.post(
+            '/submission/77',
+            data=json.dumps({'hash': '00' * 32, 'difficulty': 2.0, 'block_height': 1,
+                             'worker_id': 'test_worker', 'submission_id': 'test_submission_3'}),
+            content_type='application/json'
+        )
+        self.assertEqual(self.client.get('/audit/77').status_code, 409)
+        mining_task.round_manager.close_round(77, wait=True)
+
+        response = self.client.get('/audit/77')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['state'], 'finalized')
+        self.assertGreaterEqual(data['summary']['valid_shares'], 1)
+        self.assertIn('commitment', data)
+
+        response = self.client.post(
+            '/submission/77',
+            data=json.dumps({'hash': '00' * 32, 'difficulty': 1.0, 'block_height': 1,
+                             'worker_id': 'test_worker', 'submission_id': 'late'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(self.client.get('/task/77').data)['round_state'], 'finalized')
+
+    def test_only_the_next_round_can_be_opened_by_a_share(self):
+        share = {'hash': '00' * 32, 'difficulty': 1.0, 'block_height': 1,
+                 'worker_id': 'test_worker', 'submission_id': 'far_ahead'}
+        next_round = mining_task.round_manager.next_round()
+        response = self.client.post('/submission/4000000000', data=json.dumps(share),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertIsNone(mining_task.round_manager.state(4000000000))
+        self.assertEqual(mining_task.round_manager.next_round(), next_round)
+
+        response = self.client.post(f'/submission/{next_round}', data=json.dumps(share),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mining_task.round_manager.state(next_round), 'open')
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
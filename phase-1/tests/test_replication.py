@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import zlib
+import socket
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.replication import (ReplicaStore, ReplicationNode, ReplicationStats, PeerConnection, AuthenticationError,
+                             FRAME_HEADER, digest, recv_frame, share_key)
+
+SECRET = b'test-replication-secret'
+
+
+def shares(prefix, count, round_num=1):
+    return [(round_num, f'{prefix}{n:060x}', 1.0, True, 100, f'w{n % 7}', f'{prefix}-{n}') for n in range(count)]
+
+
+class TestReplication(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.stop()
+        self.tmp_dir.cleanup()
+
+    def _node(self, name, initial):
+        store = ReplicaStore(os.path.join(self.tmp_dir.name, f'{name}.db'), origin=name)
+        store.init()
+        store.store_shares(initial)
+        node = ReplicationNode(store, '127.0.0.1', 0, interval=3600, batch_size=50, node_id=name, secret=SECRET)
+        node.start()
+        self.nodes.append(node)
+        return node
+
+    def _connect_all(self):
+        for node in self.nodes:
+            node.peers = [PeerConnection(('127.0.0.1', other.port), node.stats, secret=SECRET)
+                          for other in self.nodes if other is not node]
+
+    def test_share_key_ignores_local_fields(self):
+        self.assertEqual(share_key(1, 'ab', 1.0, True, 5, 'w', 's'), share_key(1, 'ab', 1.0, 1, 5, 'w', 's'))
+        self.assertNotEqual(share_key(1, 'ab', 1.0, True, 5, 'w', 's'), share_key(2, 'ab', 1.0, True, 5, 'w', 's'))
+
+    def test_nodes_converge_on_union(self):
+        common = shares('c', 500)
+        a = self._node('a', common + shares('a', 40) + shares('a', 5, round_num=2))
+        b = self._node('b', common + shares('b', 60))
+        c = self._node('c', shares('c', 10, round_num=3))
+        self._connect_all()
+        for node in self.nodes:
+            node.sync_once()
+
+        digests = a.store.round_digests()
+        self.assertEqual(sorted(digests), [1, 2, 3])
+        self.assertEqual(digests[1][1], 600)
+        for node in (b, c):
+            self.assertEqual(node.store.round_digests(), digests)
+        self.assertEqual(a.store.audit_stats()['total_shares'], 615)
+        origins = {row[0] for row in self._origins(b.store)}
+        self.assertEqual(origins, {'a', 'b', 'c'})
+
+    def test_only_missing_shares_are_transferred(self):
+        common = shares('c', 2000)
+        a = self._node('a', common + shares('a', 10))
+        b = self._node('b', common)
+        self._connect_all()
+        result = b.sync_with(b.peers[0])
+        self.assertEqual(result, {'rounds': 1, 'pushed': 0, 'pulled': 10})
+        stats = b.stats.snapshot()
+        self.assertEqual(stats['shares_received'], 10)
+        # Far less than the 2000 common shares would take
+        self.assertLess(stats['bytes_received'] + stats['bytes_sent'], 20000)
+        self.assertEqual(a.store.round_digests(), b.store.round_digests())
+        # A second sync finds nothing to do and reuses the connection
+        self.assertEqual(b.sync_with(b.peers[0]), {'rounds': 0, 'pushed': 0, 'pulled': 0})
+
+    def test_peer_without_secret_is_rejected(self):
+        a = self._node('a', shares('a', 5))
+        for secret in (None, b'wrong-secret'):
+            intruder = PeerConnection(('127.0.0.1', a.port), ReplicationStats(), timeout=1, secret=secret)
+            with self.assertRaises((ConnectionError, OSError, ValueError)):
+                intruder.request({'type': 'push', 'shares': [list(shares('x', 1)[0]) + ['x']]})
+        self.assertEqual(a.store.audit_stats()['total_shares'], 5)
+
+        legit = PeerConnection(('127.0.0.1', a.port), ReplicationStats(), timeout=5, secret=SECRET)
+        self.assertEqual(legit.request({'type': 'rounds'})['type'], 'rounds')
+        legit.close()
+
+    def test_forged_tag_and_oversized_frames(self):
+        left, right = socket.socketpair()
+        try:
+            payload = zlib.compress(b'{}')
+            left.sendall(FRAME_HEADER.pack(len(payload)) + bytes(32) + payload)
+            with self.assertRaises(AuthenticationError):
+                recv_frame(right, ReplicationStats(), SECRET)
+
+            # A small frame that inflates past the limit
+            payload = zlib.compress(b' ' * 100000, 9)
+            left.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+            with patch('src.replication.MAX_MESSAGE', 50000):
+                with self.assertRaises(ValueError):
+                    recv_frame(right, ReplicationStats())
+        finally:
+            left.close()
+            right.close()
+
+    def test_public_bind_requires_secret(self):
+        store = ReplicaStore(os.path.join(self.tmp_dir.name, 'open.db'))
+        store.init()
+        self.assertEqual(ReplicationNode(store).host, '127.0.0.1')
+        with self.assertRaises(ValueError):
+            ReplicationNode(store, '0.0.0.0', 0).start()
+
+    def test_digest_of_prefix(self):
+        keys = sorted([0x1 << 124, 0x2 << 124, (0x2 << 124) + 5])
+        self.assertEqual(digest(keys, ''), (keys[0] ^ keys[1] ^ keys[2], 3))
+        self.assertEqual(digest(keys, '2'), ((0x2 << 124) ^ ((0x2 << 124) + 5), 2))
+        self.assertEqual(digest(keys, '3'), (0, 0))
+
+    def _origins(self, store):
+        conn = sqlite3.connect(store.path)
+        try:
+            return conn.execute('SELECT DISTINCT origin FROM replica_shares').fetchall()
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import tracemalloc
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.round_close import build_rewards, close_round
+from src.storage import stream_shares
+
+ADDR_A = '0x' + 'a' * 40
+ADDR_B = '0x' + 'b' * 40
+
+
+class TestRoundClose(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'shares.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''CREATE TABLE shares
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         round_number INTEGER,
+                         timestamp INTEGER,
+                         hash TEXT,
+                         difficulty REAL,
+                         valid INTEGER,
+                         block_height INTEGER,
+                         worker_id TEXT,
+                         submission_id TEXT)''')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _insert(self, rows):
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('''INSERT INTO shares (round_number, difficulty, valid, worker_id)
+                            VALUES (?, ?, ?, ?)''', rows)
+        conn.commit()
+        conn.close()
+
+    def test_rewards_split_by_difficulty(self):
+        self._insert([(1, 1.0, 1, ADDR_A)] * 3 + [(1, 1.0, 1, ADDR_B), (1, 5.0, 0, ADDR_B), (2, 9.0, 1, ADDR_B)])
+        result = close_round(self.db_path, 1, 1.0, chunk_size=2)
+        self.assertEqual(result['shares'], 4)
+        self.assertEqual(result['rewards'], [{'recipient': ADDR_A, 'amount': 0.75},
+                                             {'recipient': ADDR_B, 'amount': 0.25}])
+
+    def test_unmapped_workers_and_shared_addresses(self):
+        totals = {'rig-1': 1.0, 'rig-2': 1.0, 'unknown': 1.0, ADDR_B: 1.0}
+        mapping = {'rig-1': ADDR_A, 'rig-2': ADDR_A}
+        rewards, unmapped = build_rewards(totals, 0.00000010, lambda w: mapping.get(w) or (w if w == ADDR_B else None))
+        self.assertEqual(unmapped, ['unknown'])
+        self.assertEqual(rewards, [{'recipient': ADDR_A, 'amount': 0.00000004},
+                                   {'recipient': ADDR_B, 'amount': 0.00000002}])
+        self.assertLessEqual(sum(r['amount'] for r in rewards), 0.00000010)
+
+    def test_stream_is_chunked_and_bounded_by_max_id(self):
+        self._insert([(1, 1.0, 1, ADDR_A)] * 10)
+        conn = sqlite3.connect(self.db_path)
+        chunks = list(stream_shares(conn, 1, max_id=7, chunk_size=3))
+        conn.close()
+        self.assertEqual([len(c) for c in chunks], [3, 3, 1])
+        self.assertEqual(chunks[-1][-1][0], 7)
+
+    def test_memory_independent_of_share_count(self):
+        def peak_for(round_num):
+            tracemalloc.start()
+            close_round(self.db_path, round_num, 1.0, chunk_size=1000)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        workers = [f'0x{i:040x}' for i in range(50)]
+        self._insert([(1, 1.0, 1, workers[i % 50]) for i in range(10000)])
+        self._insert([(2, 1.0, 1, workers[i % 50]) for i in range(100000)])
+        self.assertLess(peak_for(2), peak_for(1) * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
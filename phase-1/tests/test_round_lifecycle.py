@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import SQLiteStorage
+from src.share_log import ShareLogStorage
+from src.round_lifecycle import RoundManager, MerkleAccumulator, merkle_leaf, OPEN, CLOSING, FINALIZED
+
+ADDR_A = '0x' + 'a' * 40
+ADDR_B = '0x' + 'b' * 40
+
+
+def share(round_num, worker_id, difficulty=1.0, valid=True, n=0):
+    return (round_num, f'{n:064x}', difficulty, valid, 100, worker_id, f'sub-{n}')
+
+
+class TestRoundLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.tmp_dir.name, 'shares.db'))
+        self.storage.init()
+        self.manager = self._manager(self.storage)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _manager(self, storage, **kwargs):
+        manager = RoundManager(storage, os.path.join(self.tmp_dir.name, 'rounds.db'),
+                               close_grace=0, poll_interval=0, **kwargs)
+        manager.init()
+        return manager
+
+    def test_close_computes_artifacts_once(self):
+        self.assertTrue(self.manager.open_round(1))
+        self.assertFalse(self.manager.open_round(1))
+        self.storage.store_shares([share(1, ADDR_A, n=n) for n in range(3)] +
+                                  [share(1, ADDR_B, 2.0, n=3), share(1, ADDR_B, valid=False, n=4)])
+        self.assertEqual(self.manager.state(1), OPEN)
+        self.assertTrue(self.manager.accepts_shares(1))
+
+        self.assertTrue(self.manager.close_round(1, wait=True))
+        self.assertFalse(self.manager.close_round(1, wait=True))
+        self.assertEqual(self.manager.state(1), FINALIZED)
+        self.assertFalse(self.manager.accepts_shares(1))
+
+        artifacts = self.manager.artifacts(1)
+        self.assertEqual(artifacts['summary']['valid_shares'], 4)
+        self.assertEqual(artifacts['worker_totals'], {ADDR_A: 3.0, ADDR_B: 2.0})
+        audit = json.loads(artifacts['audit_payload'])
+        self.assertEqual(audit['commitment'], artifacts['commitment'])
+        self.assertEqual([w['shares'] for w in audit['workers']], [3, 1])
+
+        result = self.manager.rewards(1, 1.0)
+        self.assertEqual(result['rewards'], [{'recipient': ADDR_A, 'amount': 0.6},
+                                             {'recipient': ADDR_B, 'amount': 0.4}])
+
+    def test_commitment_covers_share_ids_and_hashes(self):
+        shares = [share(1, f'w{n % 3}', 1.0 + n, n=n) for n in range(20)]
+        self.storage.store_shares(shares)
+        self.manager.close_round(1, wait=True)
+        expected = MerkleAccumulator()
+        for n, (_, hash_value, difficulty, _, _, worker_id, _) in enumerate(shares):
+            expected.add(merkle_leaf(n + 1, hash_value, worker_id, difficulty))
+        self.assertEqual(self.manager.artifacts(1)['commitment'], expected.root())
+
+        # Same workers and difficulties, one different share hash
+        log = ShareLogStorage(os.path.join(self.tmp_dir.name, 'share_log'))
+        log.init()
+        log.store_shares(shares[:-1] + [shares[-1][:1] + ('ff' * 32,) + shares[-1][2:]])
+        other = RoundManager(log, os.path.join(self.tmp_dir.name, 'other_rounds.db'), close_grace=0)
+        other.init()
+        other.close_round(1, wait=True)
+        log.close()
+        expected = MerkleAccumulator()
+        for chunk in log.iter_round(1, with_hash=True):
+            for share_id, worker_id, difficulty, hash_value in chunk:
+                expected.add(merkle_leaf(share_id, hash_value, worker_id, difficulty))
+        self.assertEqual(other.artifacts(1)['commitment'], expected.root())
+        self.assertNotEqual(other.artifacts(1)['commitment'], self.manager.artifacts(1)['commitment'])
+
+    def test_audit_stats_read_finalized_artifacts(self):
+        self.storage.store_shares([share(1, ADDR_A, n=0), share(1, ADDR_B, valid=False, n=1),
+                                   share(2, ADDR_A, n=2), share(2, 'w3', n=3)])
+        self.manager.open_round(1)
+        self.manager.open_round(2)
+        self.manager.close_round(1, wait=True)
+        expected = {'total_shares': 4, 'valid_shares': 3, 'invalid_shares': 1, 'unique_workers': 3}
+        self.assertEqual(self.manager.audit_stats(), expected)
+
+        # Round 1's shares are no longer read once it is finalized
+        conn = sqlite3.connect(self.storage.path)
+        conn.execute('DELETE FROM shares WHERE round_number = 1')
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.manager.audit_stats(), expected)
+        fresh = self._manager(self.storage)
+        self.assertEqual(fresh.audit_stats(), expected)
+
+    def test_rounds_stored_before_tracking_are_backfilled(self):
+        # A shares.db from before round tracking, and no rounds.db yet
+        self.storage.store_shares([share(1, ADDR_A, n=0), share(1, ADDR_B, n=1), share(2, ADDR_A, valid=False, n=2),
+                                   share(3, 'w3', n=3), share(3, 'w3', n=4)])
+        manager = RoundManager(self.storage, os.path.join(self.tmp_dir.name, 'legacy_rounds.db'),
+                               close_grace=0, poll_interval=0)
+        self.assertEqual(manager.audit_stats(),
+                         {'total_shares': 5, 'valid_shares': 4, 'invalid_shares': 1, 'unique_workers': 3})
+        self.assertEqual((manager.state(1), manager.state(2), manager.state(3)), (CLOSING, CLOSING, OPEN))
+        self.assertEqual(manager.next_round(), 4)
+
+    def test_scheduler_rolls_rounds(self):
+        manager = self._manager(self.storage, round_duration=3600)
+        manager.tick()
+        self.assertEqual(manager.current_round(), 1)
+        conn = sqlite3.connect(manager.path)
+        conn.execute('UPDATE rounds SET opened_at = opened_at - 7200 WHERE round_number = 1')
+        conn.commit()
+        conn.close()
+        manager.tick()
+        self.assertIn(manager.state(1), (CLOSING, FINALIZED))
+        self.assertEqual(manager.current_round(), 2)
+
+    def test_stuck_close_is_retried(self):
+        conn = sqlite3.connect(self.manager.path)
+        conn.execute("INSERT INTO rounds (round_number, state, opened_at, closed_at) VALUES (5, 'closing', 0, 0)")
+        conn.commit()
+        conn.close()
+        self.manager.tick()
+        for _ in range(100):
+            if self.manager.state(5) == FINALIZED:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.manager.state(5), FINALIZED)
+
+    def test_merkle_root(self):
+        empty = MerkleAccumulator().root()
+        one = MerkleAccumulator()
+        one.add(b'a')
+        two = MerkleAccumulator()
+        two.add(b'a')
+        two.add(b'b')
+        self.assertEqual(len({empty, one.root(), two.root()}), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import tempfile
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import mining_task
+from src.round_lifecycle import RoundManager
+from src.sketches import DDSketch, HyperLogLog, ShareSketches, SketchRegistry, SpaceSaving
+
+
+class TestSketches(unittest.TestCase):
+    def test_hyperloglog_estimate_and_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for n in range(6000):
+            first.add(f'worker-{n}')
+        for n in range(4000, 10000):
+            second.add(f'worker-{n}')
+        self.assertLess(abs(first.count() - 6000) / 6000, 0.05)
+        first.merge(second)
+        self.assertLess(abs(first.count() - 10000) / 10000, 0.05)
+        self.assertEqual(HyperLogLog.from_dict(first.to_dict()).count(), first.count())
+        self.assertEqual(len(first.registers), 2048)
+
+    def test_space_saving_finds_heavy_workers(self):
+        rng = random.Random(1)
+        halves = [SpaceSaving(k=8), SpaceSaving(k=8)]
+        for n in range(20000):
+            worker = 'whale' if n % 5 == 0 else ('big' if n % 7 == 0 else f'minnow-{rng.randrange(2000)}')
+            halves[n % 2].add(worker, 2.0 if worker == 'whale' else 1.0)
+        merged = SpaceSaving.from_dict(halves[0].to_dict())
+        merged.merge(halves[1])
+        top = merged.top(2)
+        self.assertEqual([entry['worker_id'] for entry in top], ['whale', 'big'])
+        # Counts overestimate by at most their error
+        self.assertGreaterEqual(top[0]['difficulty'], 8000)
+        self.assertLessEqual(top[0]['difficulty'] - top[0]['error'], 8000)
+
+    def test_ddsketch_quantiles_within_accuracy(self):
+        rng = random.Random(2)
+        values = [rng.lognormvariate(3, 1.5) for _ in range(20000)]
+        first, second = DDSketch(), DDSketch()
+        for n, value in enumerate(values):
+            (first if n % 2 else second).add(value)
+        first.merge(second)
+        values.sort()
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLess(abs(first.quantile(q) - exact) / exact, 0.02)
+        self.assertIsNone(DDSketch().quantile(0.5))
+
+    def test_ddsketch_collapse_bounds_bins(self):
+        sketch = DDSketch(max_bins=16)
+        for n in range(1, 1000):
+            sketch.add(float(n))
+        self.assertLessEqual(len(sketch.bins), 16)
+        self.assertEqual(sketch.count, 999)
+        self.assertLess(abs(sketch.quantile(0.99) - 989) / 989, 0.02)
+
+
+class TestSketchRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'sketches.db')
+
+    def test_processes_merge_through_shared_file(self):
+        first = SketchRegistry(self.path, owner='a', flush_interval=0)
+        second = SketchRegistry(self.path, owner='b', flush_interval=3600)
+        now = time.time()
+        for n in range(100):
+            first.record(1, f'worker-{n}', 1.0, now=now)
+            second.record(1, f'worker-{n + 50}', 4.0, now=now)
+        second.record(2, 'other', 1.0, now=now)
+
+        summary = first.round_sketches(1).summary()
+        # Unflushed shares of another process are not visible yet
+        self.assertEqual(summary['shares'], 100)
+        second.flush()
+        summary = second.round_sketches(1).summary()
+        self.assertEqual(summary['shares'], 200)
+        self.assertEqual(summary['unique_workers'], 150)
+        self.assertAlmostEqual(summary['difficulty_quantiles']['p90'], 4.0, delta=0.05)
+        self.assertEqual(first.window_sketches(120, now=now + 10).summary()['shares'], 201)
+        self.assertEqual(first.window_sketches(120, now=now + 3600).summary()['shares'], 0)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_worker_writes_its_own_rows(self):
+        # As in a preloaded gunicorn master: state recorded before the fork stays with the parent
+        registry = SketchRegistry(self.path, flush_interval=3600)
+        now = time.time()
+        registry.record(1, 'master', 1.0, now=now)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                registry.after_fork()
+                for n in range(10):
+                    registry.record(1, f'worker-{n}', 2.0, now=now)
+                registry.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        registry.flush()
+        summary = registry.round_sketches(1).summary()
+        self.assertEqual(summary['shares'], 11)
+        self.assertEqual(summary['unique_workers'], 11)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_exited_workers_rows_are_folded(self):
+        node = os.environ.get('NODE_ID', 'local')
+        now = time.time()
+        for n in range(2):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0)
+            os.waitpid(pid, 0)
+            # Rows as left by a worker that has since been replaced
+            dead = SketchRegistry(self.path, owner=f'{node}:{pid}', flush_interval=3600)
+            for worker in range(10):
+                dead.record(1, f'worker-{n}-{worker}', 1.0, now=now)
+            dead.flush()
+        SketchRegistry(self.path, owner='other', flush_interval=0).record(1, 'other', 1.0, now=now)
+
+        registry = SketchRegistry(self.path, flush_interval=3600)
+        summary = registry.round_sketches(1).summary()
+        self.assertEqual(summary['shares'], 21)
+        self.assertEqual(summary['unique_workers'], 21)
+        conn = sqlite3.connect(self.path)
+        try:
+            owners = sorted(owner for (owner,) in conn.execute("SELECT owner FROM sketches WHERE scope = 'round'"))
+        finally:
+            conn.close()
+        self.assertEqual(owners, [f'{node}:exited', 'other'])
+
+    def test_evicted_sketch_is_reloaded_before_recording(self):
+        registry = SketchRegistry(self.path, owner='a', max_rounds=1, flush_interval=0)
+        now = time.time()
+        for n in range(100):
+            registry.record(1, f'worker-{n}', 1.0, now=now)
+        registry.record(2, 'worker-0', 1.0, now=now)
+        self.assertNotIn(1, registry._rounds)
+        registry.record(1, 'late', 1.0, now=now)
+        registry.flush()
+        self.assertEqual(registry.round_sketches(1).summary()['shares'], 101)
+        self.assertEqual(registry.window_sketches(60, now=now).summary()['shares'], 102)
+
+    def test_memory_is_bounded(self):
+        registry = SketchRegistry(None, window_seconds=10, windows=3, max_rounds=2)
+        for n in range(10):
+            registry.record(n, 'worker', 1.0, now=n * 10.0)
+        self.assertEqual(sorted(registry._rounds), [8, 9])
+        self.assertEqual(sorted(registry._windows), [70, 80, 90])
+        self.assertEqual(registry.round_sketches(9).summary()['shares'], 1)
+        self.assertLess(len(json.dumps(registry.round_sketches(9).to_dict())), 8192)
+
+
+class TestSketchesEndpoint(unittest.TestCase):
+    def setUp(self):
+        mining_task.app.config['TESTING'] = True
+        self.client = mining_task.app.test_client()
+        self.original = mining_task.sketches
+        mining_task.sketches = SketchRegistry(None)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_rounds = mining_task.round_manager
+        mining_task.round_manager = RoundManager(mining_task.storage, os.path.join(self.tmp_dir.name, 'rounds.db'))
+
+    def tearDown(self):
+        mining_task.sketches = self.original
+        mining_task.round_manager = self.original_rounds
+        self.tmp_dir.cleanup()
+
+    def test_audit_sketches(self):
+        mining_task.round_manager.open_round(91)
+        for n in range(5):
+            response = self.client.post('/submission/91', data=json.dumps({
+                'hash': '00' * 32, 'difficulty': float(n + 1), 'block_height': 1,
+                'worker_id': f'sketch_worker_{n % 2}', 'submission_id': f'sketch_{n}'
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        data = json.loads(self.client.get('/audit/sketches?round=91&raw=1').data)
+        self.assertEqual(data['round']['shares'], 5)
+        self.assertEqual(data['round']['unique_workers'], 2)
+        self.assertEqual(data['round']['top_workers'][0],
+                         {'worker_id': 'sketch_worker_0', 'difficulty': 9.0, 'error': 0.0})
+        self.assertEqual(data['window']['shares'], 5)
+        merged = ShareSketches.from_dict(data['round']['sketch']).merge(
+            ShareSketches.from_dict(data['window']['sketch']))
+        self.assertEqual(merged.summary()['shares'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
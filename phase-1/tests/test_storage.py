@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import SQLiteStorage, create_storage
+from src.share_log import ShareLogStorage, Segment, RECORD_SIZE
+from src.compact_storage import CompactSQLiteStorage, migrate
+from src.replication import ReplicaStore
+from src.round_close import close_round
+
+ADDR_A = '0x' + 'a' * 40
+ADDR_B = '0x' + 'b' * 40
+
+
+def share(round_num, worker_id, difficulty=1.0, valid=True, n=0):
+    return (round_num, f'{n:064x}', difficulty, valid, 100 + round_num, worker_id, f'sub-{n}')
+
+
+class StorageContract:
+    """Behaviour every backend must share; mixed into one TestCase per backend."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = self.make_storage(self.tmp_dir.name)
+        self.storage.init()
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def test_store_and_audit(self):
+        self.assertTrue(self.storage.store_share(*share(1, 'w1', n=1)))
+        self.assertTrue(self.storage.store_shares([share(1, 'w2', n=2), share(1, 'w1', valid=False, n=3)]))
+        self.assertEqual(self.storage.audit_stats(), {
+            'total_shares': 3, 'valid_shares': 2, 'invalid_shares': 1, 'unique_workers': 2
+        })
+        self.storage.store_share(*share(2, 'w3', n=4))
+        self.assertEqual(self.storage.audit_stats()['total_shares'], 4)
+
+    def test_recent_shares_match_table_columns(self):
+        self.storage.store_shares([share(1, 'w1', 2.5, n=n) for n in range(15)])
+        recent = self.storage.recent_shares(10)
+        self.assertEqual(len(recent), 10)
+        for _, round_num, timestamp, hash_value, difficulty, valid, block_height, worker_id, submission_id in recent:
+            n = int(submission_id[4:])
+            self.assertEqual((round_num, hash_value, difficulty, valid, block_height, worker_id),
+                             (1, f'{n:064x}', 2.5, 1, 101, 'w1'))
+            self.assertLessEqual(abs(timestamp - time.time()), 5)
+
+    def test_iter_round_yields_valid_shares_in_chunks(self):
+        self.storage.store_shares([share(1, 'w1', n=n) for n in range(7)])
+        self.storage.store_shares([share(1, 'w2', valid=False), share(2, 'w3')])
+        chunks = list(self.storage.iter_round(1, chunk_size=3))
+        self.assertEqual([len(c) for c in chunks], [3, 3, 1])
+        self.assertEqual({worker for chunk in chunks for _, worker, _ in chunk}, {'w1'})
+
+    def test_round_stats_and_hashes(self):
+        self.storage.store_shares([share(1, 'w1', n=1), share(1, 'w2', valid=False, n=2), share(2, 'w3', n=3)])
+        self.assertEqual(self.storage.round_stats(1), {
+            'total_shares': 2, 'valid_shares': 1, 'invalid_shares': 1, 'workers': ['w1', 'w2']
+        })
+        rows = [row for chunk in self.storage.iter_round(1, with_hash=True) for row in chunk]
+        self.assertEqual([row[1:] for row in rows], [('w1', 1.0, f'{1:064x}')])
+        self.assertEqual(self.storage.round_numbers(), [1, 2])
+
+    def test_iter_time_range(self):
+        self.storage.store_shares([share(1, 'w1', n=n) for n in range(5)])
+        now = int(time.time())
+        self.assertEqual(sum(len(c) for c in self.storage.iter_time_range(now - 5, now + 5, chunk_size=2)), 5)
+        self.assertEqual(list(self.storage.iter_time_range(now + 10, now + 20)), [])
+
+    def test_close_round_uses_backend(self):
+        self.storage.store_shares([share(1, ADDR_A, n=n) for n in range(3)] + [share(1, ADDR_B, n=9)])
+        result = close_round(self.storage, 1, 1.0, chunk_size=2)
+        self.assertEqual(result['shares'], 4)
+        self.assertEqual(result['rewards'], [{'recipient': ADDR_A, 'amount': 0.75},
+                                             {'recipient': ADDR_B, 'amount': 0.25}])
+
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+    def make_storage(self, tmp_dir):
+        return SQLiteStorage(os.path.join(tmp_dir, 'shares.db'))
+
+
+class TestCompactSQLiteStorage(StorageContract, unittest.TestCase):
+    def make_storage(self, tmp_dir):
+        return CompactSQLiteStorage(os.path.join(tmp_dir, 'compact.db'))
+
+    def test_rows_are_compact(self):
+        self.storage.store_shares([share(1, 'w1', n=n) for n in range(10)])
+        conn = sqlite3.connect(self.storage.path)
+        hash_type, hash_len, worker_type, workers = conn.execute(
+            '''SELECT typeof(hash), length(hash), typeof(worker), (SELECT COUNT(*) FROM workers)
+               FROM share_records LIMIT 1''').fetchone()
+        conn.close()
+        self.assertEqual((hash_type, hash_len, worker_type, workers), ('blob', 32, 'integer', 1))
+
+    def test_workers_interned_by_other_process(self):
+        other = CompactSQLiteStorage(self.storage.path)
+        other.store_share(*share(1, 'w9'))
+        self.storage.store_share(*share(1, 'w1'))
+        self.assertEqual({w for chunk in self.storage.iter_round(1) for _, w, _ in chunk}, {'w1', 'w9'})
+
+    def test_migrate_legacy_database(self):
+        legacy_path = os.path.join(self.tmp_dir.name, 'legacy.db')
+        legacy = SQLiteStorage(legacy_path)
+        legacy.init()
+        legacy.store_shares([share(1, 'w1', n=1), share(1, 'w2', valid=False, n=2), share(2, 'w1', n=3)])
+        before = legacy.recent_shares(10)
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("INSERT INTO shares (round_number, timestamp, hash, worker_id) VALUES (3, 1, 'not-hex', 'w3')")
+        conn.commit()
+        conn.close()
+
+        compact = CompactSQLiteStorage(legacy_path)
+        with self.assertRaises(RuntimeError):
+            compact.init()
+        result = migrate(legacy_path)
+        self.assertEqual(result, {'shares': 4, 'workers': 3, 'unconverted_hashes': 1})
+        compact.init()
+        after = [row for row in compact.recent_shares(10) if row[1] != 3]
+        self.assertEqual(sorted(after), sorted(before))
+        self.assertEqual(compact.audit_stats()['total_shares'], 4)
+        self.assertTrue(compact.store_share(*share(1, 'w1', n=4)))
+        self.assertEqual(compact.recent_shares(1)[0][0], 5)
+
+
+class TestReplicaStore(StorageContract, unittest.TestCase):
+    def make_storage(self, tmp_dir):
+        return ReplicaStore(os.path.join(tmp_dir, 'replica.db'))
+
+    def test_duplicate_shares_are_stored_once(self):
+        self.storage.store_shares([share(1, 'w1', n=1)] * 3)
+        self.assertEqual(self.storage.audit_stats()['total_shares'], 1)
+
+
+class TestShareLogStorage(StorageContract, unittest.TestCase):
+    def make_storage(self, tmp_dir):
+        return ShareLogStorage(os.path.join(tmp_dir, 'share_log'), segment_bytes=RECORD_SIZE * 4)
+
+    def _segments(self, round_num):
+        round_dir = os.path.join(self.storage.path, f'round-{round_num:010d}')
+        return sorted(name for name in os.listdir(round_dir) if name.endswith('.log'))
+
+    def test_create_storage_selects_backend(self):
+        storage = create_storage('sharelog', os.path.join(self.tmp_dir.name, 'other'))
+        self.assertIsInstance(storage, ShareLogStorage)
+        with self.assertRaises(ValueError):
+            create_storage('nope')
+
+    def test_rejects_malformed_hash(self):
+        self.assertFalse(self.storage.store_share(1, 'abcd', 1.0, True, 1, 'w1', 's'))
+        self.assertEqual(self.storage.audit_stats()['total_shares'], 0)
+
+    def test_segments_roll_and_compact(self):
+        for n in range(10):
+            self.storage.store_share(*share(1, f'w{n % 3}', n=n))
+        self.storage.store_share(*share(2, 'w0', n=10))
+        self.assertGreater(len(self._segments(1)), 1)
+
+        self.assertEqual(self.storage.compact_round(1), 10)
+        self.assertEqual(len(self._segments(1)), 1)
+        segment = Segment(os.path.join(self.storage.path, 'round-0000000001', self._segments(1)[0]))
+        timestamps = [record[0] for record in segment.records()]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(sum(len(c) for c in self.storage.iter_round(1)), 10)
+        self.assertEqual(self.storage.audit_stats()['total_shares'], 11)
+        now = int(time.time())
+        rows = [row for chunk in self.storage.iter_time_range(now - 5, now + 5) for row in chunk]
+        self.assertEqual(sorted(row[8] for row in rows if row[1] == 1), sorted(f'sub-{n}' for n in range(10)))
+
+    def test_partial_record_is_ignored(self):
+        self.storage.store_shares([share(1, 'w1', n=n) for n in range(2)])
+        segment = self._segments(1)[-1]
+        # Simulate a crash in the middle of an append
+        with open(os.path.join(self.storage.path, 'round-0000000001', segment), 'ab') as f:
+            f.write(b'\x00' * (RECORD_SIZE // 2))
+        self.assertEqual(self.storage.audit_stats()['total_shares'], 2)
+        self.assertEqual(sum(len(c) for c in self.storage.iter_round(1)), 2)
+
+    def test_workers_shared_between_instances(self):
+        self.storage.store_share(*share(1, 'w1'))
+        other = ShareLogStorage(self.storage.path)
+        other.store_share(*share(1, 'w2'))
+        other.close()
+        self.assertEqual(self.storage.audit_stats()['unique_workers'], 2)
+        self.assertEqual({w for chunk in self.storage.iter_round(1) for _, w, _ in chunk}, {'w1', 'w2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark Bitcoin RPC throughput against a local stand-in node.
+
+Compares the blocking RawProxy BTCWrapper used to create, the pooled
+AsyncBitcoinRPC with one call per request, and AsyncBitcoinRPC batching
+many calls per POST.
+
+    python benchmarks/bench_bitcoin_rpc.py --calls 5000 --latency 0.002
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bitcoin_rpc import AsyncBitcoinRPC
+from benchmarks.rpc_standins import BitcoinStandIn
+
+
+def bench_blocking(url, calls):
+    from bitcoin.rpc import RawProxy
+    proxy = RawProxy(service_url=url.replace('http://', 'http://user:pass@'))
+    start = time.perf_counter()
+    for _ in range(calls):
+        proxy.getblockcount()
+    elapsed = time.perf_counter() - start
+    proxy.close()
+    return elapsed
+
+
+async def bench_async(url, calls, pool_size):
+    rpc = AsyncBitcoinRPC(url, pool_size=pool_size)
+    semaphore = asyncio.Semaphore(pool_size)
+
+    async def one():
+        async with semaphore:
+            await rpc.call('getblockcount')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    await rpc.close()
+    return elapsed
+
+
+async def bench_batched(url, calls, pool_size, batch_size):
+    rpc = AsyncBitcoinRPC(url, pool_size=pool_size)
+    batches = [[('getblockcount', [])] * min(batch_size, calls - i) for i in range(0, calls, batch_size)]
+    semaphore = asyncio.Semaphore(pool_size)
+
+    async def one(batch):
+        async with semaphore:
+            await rpc.batch(batch)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(batch) for batch in batches))
+    elapsed = time.perf_counter() - start
+    await rpc.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bitcoin RPC throughput benchmark')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.001, help='Simulated per-request node latency (s)')
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    node = BitcoinStandIn(latency=args.latency)
+    url = node.start()
+
+    results = {
+        'blocking_rawproxy': bench_blocking(url, args.calls),
+        'async_pooled': asyncio.run(bench_async(url, args.calls, args.pool_size)),
+        'async_batched': asyncio.run(bench_batched(url, args.calls, args.pool_size, args.batch_size))
+    }
+    node.stop()
+
+    report = {name: {'seconds': round(elapsed, 4), 'calls_per_second': round(args.calls / elapsed, 1)}
+              for name, elapsed in results.items()}
+    if args.json:
+        print(json.dumps({'calls': args.calls, 'latency': args.latency, 'results': report}, indent=2))
+    else:
+        print(f"{args.calls} getblockcount calls, {args.latency * 1000:.1f} ms simulated latency")
+        for name, row in report.items():
+            print(f"  {name:<18} {row['seconds']:>8.3f} s  {row['calls_per_second']:>10.1f} calls/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end payout throughput against local Bitcoin and K2 stand-ins.
+
+Runs BTCWrapper.distribute_rewards for each payout size with real RPC
+clients, transaction signing and confirmation waits, against stand-in nodes
+with configurable latency, block time and failure rates. Reports payouts per
+second, per-payout latency percentiles, RPC call counts and peak memory
+(process max RSS; add --trace-memory for the tracemalloc peak of the payout
+itself, which slows signing several-fold). Save a report with --output and compare a later run against it with
+--compare.
+
+    python benchmarks/bench_payouts.py --sizes 100 1000 10000 --block-time 0.5
+    python benchmarks/bench_payouts.py --batch --output after.json --compare before.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add the project root directory to the Python path
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks.rpc_standins import BitcoinStandIn, K2StandIn
+from benchmarks.bench_startup import write_config
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def timed_wrapper_class():
+    """BTCWrapper subclass recording how long each payout took, queueing included."""
+    from src.btc_wrapper import BTCWrapper
+
+    class TimedWrapper(BTCWrapper):
+        def __init__(self, config_path):
+            super().__init__(config_path)
+            self.latencies = []
+
+        async def _distribute_one(self, reward, semaphore, *args, **kwargs):
+            start = time.perf_counter()
+            result = await super()._distribute_one(reward, semaphore, *args, **kwargs)
+            self.latencies.append(time.perf_counter() - start)
+            return result
+
+        async def _distribute_batch(self, chunk, semaphore, *args, **kwargs):
+            start = time.perf_counter()
+            results = await super()._distribute_batch(chunk, semaphore, *args, **kwargs)
+            self.latencies.extend([time.perf_counter() - start] * len(chunk))
+            return results
+
+    return TimedWrapper
+
+
+async def run_case(size, args, wrapper_cls):
+    btc_failures = {'sendtoaddress': args.btc_failure_rate, 'sendmany': args.btc_failure_rate}
+    k2_failures = {'eth_sendRawTransaction': args.k2_failure_rate}
+    bitcoin = BitcoinStandIn(args.latency, btc_failures, args.block_time, args.seed)
+    k2 = K2StandIn(args.latency, k2_failures, args.block_time, args.seed)
+    bitcoin_url = bitcoin.start()
+    k2_url = k2.start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = write_config(
+            tmp_dir, bitcoin_url, k2_url,
+            k2_chain_id=k2.chain_id,
+            k2_token_contract='0x' + '11' * 20,
+            wrapper_address='bcrt1qbenchmark',
+            min_confirmations=args.confirmations,
+            confirmation_poll_interval=max(0.01, args.block_time / 4),
+            gas_price=1,
+            gas_limit=100000,
+            batch_size=args.concurrency,
+            rpc_pool_size=args.concurrency,
+            batch_payouts=args.batch,
+            max_batch_outputs=args.max_batch_outputs,
+            retry_attempts=args.retry_attempts,
+            retry_delay=0.05,
+            payout_journal_file=os.path.join(tmp_dir, 'journal.db') if args.journal else None
+        )
+        wrapper = wrapper_cls(config_path)
+        await wrapper.warm_up()
+        bitcoin.calls.clear()
+        k2.calls.clear()
+        bitcoin.requests = k2.requests = 0
+
+        rewards = [{'amount': 0.0001, 'recipient': '0x' + f'{i + 1:040x}'} for i in range(size)]
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        results = await wrapper.distribute_rewards(rewards)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        tracemalloc.stop()
+        await wrapper.btc_rpc.close()
+        if wrapper.payout_journal is not None:
+            wrapper.payout_journal.close()
+    bitcoin.stop()
+    k2.stop()
+
+    succeeded = sum(1 for r in results if r['status'] == 'success')
+    latencies = sorted(wrapper.latencies)
+    return {
+        'size': size,
+        'seconds': round(elapsed, 4),
+        'succeeded': succeeded,
+        'failed': size - succeeded,
+        'payouts_per_second': round(succeeded / elapsed, 2),
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 0.50), 4),
+            'p90': round(percentile(latencies, 0.90), 4),
+            'p99': round(percentile(latencies, 0.99), 4),
+            'max': round(latencies[-1], 4)
+        },
+        'rpc': {
+            'bitcoin_requests': bitcoin.requests,
+            'bitcoin_calls': dict(bitcoin.calls),
+            'k2_requests': k2.requests,
+            'k2_calls': dict(k2.calls)
+        },
+        'peak_memory_mb': round(peak / 2 ** 20, 2) if peak is not None else None,
+        # Linux reports ru_maxrss in KiB; it is a process-wide high-water mark
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def print_report(report, baseline=None):
+    settings = report['settings']
+    print(f"Payout benchmark @ {report['revision'] or 'unknown revision'}: "
+          f"{'batched' if settings['batch'] else 'per-recipient'}, {settings['latency'] * 1000:.1f} ms latency, "
+          f"{settings['block_time']} s blocks, concurrency {settings['concurrency']}")
+    header = f"  {'size':>7} {'payouts/s':>10} {'p50 s':>8} {'p99 s':>8} {'failed':>7} {'btc req':>8} {'k2 req':>8} {'peak MB':>8} {'RSS MB':>8}"
+    print(header)
+    previous = {case['size']: case for case in (baseline or {}).get('cases', [])}
+    for case in report['cases']:
+        latency = case['latency_seconds']
+        line = (f"  {case['size']:>7} {case['payouts_per_second']:>10.1f} {latency['p50']:>8.3f} {latency['p99']:>8.3f} "
+                f"{case['failed']:>7} {case['rpc']['bitcoin_requests']:>8} {case['rpc']['k2_requests']:>8} "
+                f"{case['peak_memory_mb'] if case['peak_memory_mb'] is not None else '-':>8} "
+                f"{case['max_rss_mb']:>8}")
+        old = previous.get(case['size'])
+        if old and old['payouts_per_second']:
+            line += f"  ({case['payouts_per_second'] / old['payouts_per_second']:.2f}x vs baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Payout throughput benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--latency', type=float, default=0.001, help='Simulated per-request node latency (s)')
+    parser.add_argument('--block-time', type=float, default=0.5, help='Seconds between stand-in blocks')
+    parser.add_argument('--confirmations', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=50, help='batch_size: RPC stages in flight')
+    parser.add_argument('--batch', action='store_true', help='Use batched payouts (one tx and mint per chunk)')
+    parser.add_argument('--max-batch-outputs', type=int, default=500)
+    parser.add_argument('--btc-failure-rate', type=float, default=0.0)
+    parser.add_argument('--k2-failure-rate', type=float, default=0.0)
+    parser.add_argument('--retry-attempts', type=int, default=3)
+    parser.add_argument('--journal', action='store_true', help='Enable the payout journal')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Measure the payout\'s tracemalloc peak (slows the run)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(PROJECT_ROOT, 'logs'), exist_ok=True)
+    wrapper_cls = timed_wrapper_class()
+    # Per-recipient failures are expected under injected failure rates
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'settings': {name: value for name, value in vars(args).items()
+                     if name not in ('output', 'compare', 'json', 'sizes')},
+        'cases': [asyncio.run(run_case(size, args, wrapper_cls)) for size in args.sizes]
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, baseline)
+
+
+if __name__ == '__main__':
+    main()
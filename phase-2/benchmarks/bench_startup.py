@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark BTCWrapper cold-start latency.
+
+Measures, each as the median of several runs:
+  - importing src.btc_wrapper in a fresh interpreter,
+  - constructing BTCWrapper from a config file,
+  - the first Bitcoin RPC call against a local stand-in node,
+  - loading the signing key (Fernet decrypt plus the eth_account import).
+
+    python benchmarks/bench_startup.py --runs 5 --latency 0.002
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add the project root directory to the Python path
+sys.path.append(PROJECT_ROOT)
+
+from cryptography.fernet import Fernet
+from benchmarks.rpc_standins import BitcoinStandIn
+
+TEST_PRIVATE_KEY = bytes.fromhex('4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318')
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import src.btc_wrapper; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def bench_import(runs):
+    """Time `import src.btc_wrapper` in fresh interpreters."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+def write_config(tmp_dir, url, k2_url='http://127.0.0.1:8545', **overrides):
+    """Write a wrapper config and encrypted key pointing at the stand-in nodes."""
+    fernet_key = Fernet.generate_key()
+    paths = {name: os.path.join(tmp_dir, name) for name in ('fernet.key', 'k2.key', 'bitcoin.conf', 'config.json')}
+    with open(paths['fernet.key'], 'w') as f:
+        f.write(fernet_key.decode())
+    with open(paths['k2.key'], 'w') as f:
+        f.write(Fernet(fernet_key).encrypt(TEST_PRIVATE_KEY).decode())
+    host, port = url.rsplit(':', 1)
+    config = {
+        'bitcoin_rpc_url': host,
+        'bitcoin_rpc_port': int(port),
+        'bitcoin_rpc_user': 'user',
+        'bitcoin_rpc_password': 'pass',
+        'bitcoin_conf_path': paths['bitcoin.conf'],
+        'k2_rpc_url': k2_url,
+        'key_file': paths['k2.key'],
+        'fernet_key_file': paths['fernet.key'],
+        'nonce_state_file': os.path.join(tmp_dir, 'k2_nonce.json')
+    }
+    config.update(overrides)
+    with open(paths['config.json'], 'w') as f:
+        json.dump(config, f)
+    return paths['config.json']
+
+
+async def bench_first_call(wrapper_cls, config_path):
+    """Construct a wrapper, then time the first RPC call and key load."""
+    start = time.perf_counter()
+    wrapper = wrapper_cls(config_path)
+    constructed = time.perf_counter()
+    await wrapper.btc_rpc.call('getblockcount')
+    first_call = time.perf_counter()
+    wrapper.account
+    account = time.perf_counter()
+    await wrapper.btc_rpc.close()
+    return constructed - start, first_call - constructed, account - first_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BTCWrapper startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.001, help='Simulated per-request node latency (s)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    import_samples = bench_import(args.runs)
+
+    os.makedirs(os.path.join(PROJECT_ROOT, 'logs'), exist_ok=True)
+    from src.btc_wrapper import BTCWrapper
+
+    node = BitcoinStandIn(latency=args.latency)
+    url = node.start()
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = write_config(tmp_dir, url)
+        for _ in range(args.runs):
+            samples.append(asyncio.run(bench_first_call(BTCWrapper, config_path)))
+    node.stop()
+
+    construct, first_call, account = zip(*samples)
+    report = {
+        'import_seconds': import_samples,
+        'construct_seconds': construct,
+        'first_rpc_call_seconds': first_call,
+        'account_load_seconds': account
+    }
+    report = {name: round(statistics.median(values), 5) for name, values in report.items()}
+    if args.json:
+        print(json.dumps({'runs': args.runs, 'latency': args.latency, 'median': report}, indent=2))
+    else:
+        print(f"Median of {args.runs} runs, {args.latency * 1000:.1f} ms simulated latency")
+        for name, seconds in report.items():
+            print(f"  {name:<24} {seconds * 1000:>9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Local JSON-RPC stand-ins used by the phase-2 benchmarks.
+
+BitcoinStandIn answers the wallet and chain RPCs BTCWrapper uses from an
+in-memory chain; K2StandIn answers the Ethereum-style RPCs web3 needs to send
+mint transactions. Each request can be delayed by a fixed latency to model a
+remote node, blocks can be produced on a timer, and selected methods can be
+made to fail at a given rate. Servers speak HTTP/1.1 keep-alive and accept
+JSON-RPC batches.
+"""
+
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class JSONRPCStandIn:
+    """Base class: dispatches `rpc_<method>` handlers and counts calls and requests."""
+
+    def __init__(self, latency=0.0, failure_rates=None, block_time=None, seed=None):
+        """`failure_rates` maps method names to the fraction of calls that return an error."""
+        self.latency = latency
+        self.failure_rates = failure_rates or {}
+        self.block_time = block_time
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.failures = Counter()
+        self.requests = 0
+        self.server = None
+        self._stopped = threading.Event()
+
+    def mine_block(self):
+        """Advance the chain by one block; overridden by stand-ins with a chain."""
+
+    def handle(self, call):
+        method = call.get('method')
+        with self.lock:
+            self.calls[method] += 1
+            fail = self.random.random() < self.failure_rates.get(method, 0)
+            if fail:
+                self.failures[method] += 1
+        try:
+            handler = getattr(self, f'rpc_{method}', None)
+            if handler is None:
+                raise RPCError(-32601, 'Method not found')
+            if fail:
+                raise RPCError(-32603, f'Injected {method} failure')
+            return self.response(call.get('id'), result=handler(*call.get('params', [])))
+        except RPCError as e:
+            return self.response(call.get('id'), error={'code': e.code, 'message': e.message})
+
+    def response(self, call_id, result=None, error=None):
+        """Bitcoin Core style: both `result` and `error` are always present."""
+        return {'result': result, 'error': error, 'id': call_id}
+
+    def handle_request(self, body):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, list):
+            return [self.handle(call) for call in body]
+        return self.handle(body)
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve in a background thread; returns the base URL."""
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                data = json.dumps(standin.handle_request(body)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.block_time:
+            threading.Thread(target=self._produce_blocks, daemon=True).start()
+        return f'http://{host}:{self.server.server_address[1]}'
+
+    def _produce_blocks(self):
+        while not self._stopped.wait(self.block_time):
+            self.mine_block()
+
+    def stop(self):
+        self._stopped.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class BitcoinStandIn(JSONRPCStandIn):
+    """In-memory Bitcoin node with a wallet; transactions confirm when blocks are mined."""
+
+    def __init__(self, latency=0.0, failure_rates=None, block_time=None, seed=None):
+        super().__init__(latency, failure_rates, block_time, seed)
+        self.height = 0
+        self.best_hash = '00' * 32
+        self.mempool = []
+        self.tx_height = {}
+        self._counter = 0
+
+    def _new_txid(self):
+        self._counter += 1
+        return hashlib.sha256(f'tx{self._counter}'.encode()).hexdigest()
+
+    def mine_block(self):
+        with self.lock:
+            self.height += 1
+            self.best_hash = hashlib.sha256(f'block{self.height}'.encode()).hexdigest()
+            for txid in self.mempool:
+                self.tx_height[txid] = self.height
+            self.mempool = []
+
+    def rpc_getblockcount(self):
+        return self.height
+
+    def rpc_getbestblockhash(self):
+        return self.best_hash
+
+    def rpc_sendtoaddress(self, address, amount, *args):
+        with self.lock:
+            txid = self._new_txid()
+            self.mempool.append(txid)
+            self.tx_height[txid] = None
+        return txid
+
+    def rpc_sendmany(self, dummy, amounts, *args):
+        return self.rpc_sendtoaddress(None, sum(amounts.values()))
+
+    def rpc_gettransaction(self, txid, *args):
+        if txid not in self.tx_height:
+            raise RPCError(-5, 'Invalid or non-wallet transaction id')
+        mined = self.tx_height[txid]
+        return {'txid': txid, 'confirmations': 0 if mined is None else self.height - mined + 1}
+
+
+class K2StandIn(JSONRPCStandIn):
+    """Ethereum-style node that accepts signed transactions and includes them on each block.
+
+    Transactions are not executed; the stand-in only tracks the sender's
+    transaction count so nonce handling behaves as against a real node.
+    """
+
+    def __init__(self, latency=0.0, failure_rates=None, block_time=None, seed=None, chain_id=1337):
+        super().__init__(latency, failure_rates, block_time, seed)
+        self.chain_id = chain_id
+        self.block_number = 0
+        self.mined_count = 0
+        self.pending = []
+        self.sent = 0
+
+    def mine_block(self):
+        with self.lock:
+            self.block_number += 1
+            self.mined_count += len(self.pending)
+            self.pending = []
+
+    def response(self, call_id, result=None, error=None):
+        """Strict JSON-RPC 2.0, as web3 requires."""
+        if error is not None:
+            return {'jsonrpc': '2.0', 'error': error, 'id': call_id}
+        return {'jsonrpc': '2.0', 'result': result, 'id': call_id}
+
+    def rpc_web3_clientVersion(self):
+        return 'K2StandIn/v1'
+
+    def rpc_net_version(self):
+        return str(self.chain_id)
+
+    def rpc_eth_chainId(self):
+        return hex(self.chain_id)
+
+    def rpc_eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def rpc_eth_gasPrice(self):
+        return hex(20 * 10 ** 9)
+
+    def rpc_eth_getTransactionCount(self, address, block_identifier='latest'):
+        with self.lock:
+            count = self.mined_count if block_identifier == 'latest' else self.mined_count + len(self.pending)
+        return hex(count)
+
+    def rpc_eth_sendRawTransaction(self, raw):
+        tx_hash = '0x' + hashlib.sha256(bytes.fromhex(raw[2:])).hexdigest()
+        with self.lock:
+            self.pending.append(tx_hash)
+            self.sent += 1
+        return tx_hash
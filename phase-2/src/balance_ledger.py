@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Balances are kept in satoshis so repeated credits do not drift
+SATOSHIS_PER_BTC = 10 ** 8
+
+CREDIT_SQL = '''
+    INSERT INTO balances (recipient, balance_sats, first_credit_at, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(recipient) DO UPDATE SET
+        balance_sats = balance_sats + excluded.balance_sats,
+        first_credit_at = COALESCE(first_credit_at, excluded.first_credit_at),
+        updated_at = excluded.updated_at
+'''
+
+
+def to_sats(amount: float) -> int:
+    return int(round(amount * SATOSHIS_PER_BTC))
+
+
+def simulate_policy(rounds: List[Tuple[float, List[Dict[str, float]]]], min_payout: float,
+                    max_age: Optional[float] = None, fee_per_payout: float = 0.0) -> Dict:
+    """Compare paying every reward immediately against a threshold policy.
+
+    `rounds` is a list of (timestamp, rewards) in time order. A recipient is
+    paid once their balance reaches `min_payout` BTC or their oldest unpaid
+    credit is older than `max_age` seconds. Balances still below the
+    threshold after the last round are reported as carried over.
+    """
+    min_sats = to_sats(min_payout)
+    balances = {}
+    first_credit = {}
+    direct = 0
+    payouts = 0
+    for timestamp, rewards in rounds:
+        for reward in rewards:
+            sats = to_sats(reward['amount'])
+            if sats <= 0:
+                continue
+            direct += 1
+            balances[reward['recipient']] = balances.get(reward['recipient'], 0) + sats
+            first_credit.setdefault(reward['recipient'], timestamp)
+        for recipient in [r for r, sats in balances.items()
+                          if sats >= min_sats or (max_age is not None and timestamp - first_credit[r] >= max_age)]:
+            payouts += 1
+            del balances[recipient]
+            del first_credit[recipient]
+    return {
+        'rounds': len(rounds),
+        'payouts_without_ledger': direct,
+        'payouts_with_ledger': payouts,
+        'transactions_saved': direct - payouts,
+        'reduction': round(1 - payouts / direct, 4) if direct else 0.0,
+        'fees_without_ledger': round(direct * fee_per_payout, 8),
+        'fees_with_ledger': round(payouts * fee_per_payout, 8),
+        'fees_saved': round((direct - payouts) * fee_per_payout, 8),
+        'carried_over_recipients': len(balances),
+        'carried_over_amount': sum(balances.values()) / SATOSHIS_PER_BTC
+    }
+
+
+class BalanceLedger:
+    """Accumulates per-recipient rewards and releases them once worth paying.
+
+    Each round is credited once, in a single bulk statement. A recipient is due
+    when their balance reaches `min_payout` BTC or their oldest unpaid credit
+    is older than `max_age` seconds. The due list for a round is frozen when
+    first selected, so a retried payout (e.g. resumed through the payout
+    journal) sees exactly the same recipients and amounts.
+    """
+
+    def __init__(self, path: str, min_payout: float = 0.001, max_age: Optional[float] = None):
+        self.path = path
+        self.min_payout = min_payout
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS balances (
+                    recipient TEXT PRIMARY KEY,
+                    balance_sats INTEGER NOT NULL,
+                    first_credit_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS credited_rounds (
+                    round_id TEXT PRIMARY KEY,
+                    rewards TEXT NOT NULL,
+                    recipients INTEGER NOT NULL,
+                    credited_at REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS payouts (
+                    round_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS payout_items (
+                    round_id TEXT NOT NULL,
+                    item INTEGER NOT NULL,
+                    recipient TEXT NOT NULL,
+                    amount_sats INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    PRIMARY KEY (round_id, item)
+                )
+            ''')
+
+    def credit_round(self, round_id: str, rewards: List[Dict[str, float]], now: Optional[float] = None) -> bool:
+        """Credit a round's rewards. Returns False if the round was already credited."""
+        now = time.time() if now is None else now
+        totals = {}
+        for reward in rewards:
+            totals[reward['recipient']] = totals.get(reward['recipient'], 0) + to_sats(reward['amount'])
+        rows = [(recipient, sats, now, now) for recipient, sats in totals.items() if sats > 0]
+        with self._lock, self.conn:
+            if self.conn.execute('SELECT 1 FROM credited_rounds WHERE round_id = ?', (round_id,)).fetchone():
+                return False
+            self.conn.execute('''
+                INSERT INTO credited_rounds (round_id, rewards, recipients, credited_at) VALUES (?, ?, ?, ?)
+            ''', (round_id, json.dumps(rewards), len(rows), now))
+            self.conn.executemany(CREDIT_SQL, rows)
+        return True
+
+    def due_payouts(self, round_id: str, now: Optional[float] = None) -> List[Dict[str, float]]:
+        """Select (or return the previously selected) payouts for a round.
+
+        Selected amounts move out of `balances` into `payout_items` as pending,
+        so a later round never pays them a second time.
+        """
+        now = time.time() if now is None else now
+        with self._lock, self.conn:
+            selected = self._payout_rewards(round_id)
+            if selected is not None:
+                return selected
+            min_sats = to_sats(self.min_payout)
+            oldest = now - self.max_age if self.max_age is not None else None
+            rows = self.conn.execute('''
+                SELECT recipient, balance_sats FROM balances
+                WHERE balance_sats > 0 AND (balance_sats >= ? OR first_credit_at <= ?)
+                ORDER BY recipient
+            ''', (min_sats, oldest)).fetchall()
+            self.conn.execute('INSERT INTO payouts (round_id, created_at) VALUES (?, ?)', (round_id, now))
+            self.conn.executemany('''
+                INSERT INTO payout_items (round_id, item, recipient, amount_sats, status) VALUES (?, ?, ?, ?, 'pending')
+            ''', [(round_id, item, r['recipient'], r['balance_sats']) for item, r in enumerate(rows)])
+            self.conn.executemany('''
+                UPDATE balances SET balance_sats = balance_sats - ?, first_credit_at = NULL, updated_at = ?
+                WHERE recipient = ?
+            ''', [(r['balance_sats'], now, r['recipient']) for r in rows])
+        return [{'recipient': r['recipient'], 'amount': r['balance_sats'] / SATOSHIS_PER_BTC} for r in rows]
+
+    def _payout_rewards(self, round_id: str) -> Optional[List[Dict[str, float]]]:
+        if not self.conn.execute('SELECT 1 FROM payouts WHERE round_id = ?', (round_id,)).fetchone():
+            return None
+        return [{'recipient': r['recipient'], 'amount': r['amount_sats'] / SATOSHIS_PER_BTC}
+                for r in self.conn.execute(
+                    'SELECT recipient, amount_sats FROM payout_items WHERE round_id = ? ORDER BY item', (round_id,))]
+
+    def settle(self, round_id: str, results: List[Dict]) -> int:
+        """Mark successfully paid items of a round as paid. Returns the number newly marked."""
+        paid = [(round_id, r['recipient']) for r in results if r['status'] == 'success']
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany('''
+                UPDATE payout_items SET status = 'paid' WHERE round_id = ? AND recipient = ? AND status = 'pending'
+            ''', paid)
+            return self.conn.total_changes - before
+
+    def release_unpaid(self, round_id: str, now: Optional[float] = None) -> int:
+        """Return a round's still-pending amounts to the balances, e.g. after abandoning its payout."""
+        now = time.time() if now is None else now
+        with self._lock, self.conn:
+            rows = self.conn.execute('''
+                SELECT recipient, amount_sats FROM payout_items WHERE round_id = ? AND status = 'pending'
+            ''', (round_id,)).fetchall()
+            self.conn.executemany(CREDIT_SQL, [(r['recipient'], r['amount_sats'], now, now) for r in rows])
+            self.conn.execute('''
+                UPDATE payout_items SET status = 'released' WHERE round_id = ? AND status = 'pending'
+            ''', (round_id,))
+        return len(rows)
+
+    def balance(self, recipient: str) -> float:
+        with self._lock:
+            row = self.conn.execute('SELECT balance_sats FROM balances WHERE recipient = ?', (recipient,)).fetchone()
+        return row['balance_sats'] / SATOSHIS_PER_BTC if row else 0.0
+
+    def policy_report(self, min_payout: Optional[float] = None, max_age: Optional[float] = None,
+                      fee_per_payout: float = 0.0) -> Dict:
+        """Replay every credited round under a payout policy (defaults to the ledger's own)."""
+        with self._lock:
+            rounds = [(row['credited_at'], json.loads(row['rewards'])) for row in self.conn.execute(
+                'SELECT credited_at, rewards FROM credited_rounds ORDER BY credited_at, rowid')]
+        return simulate_policy(
+            rounds,
+            self.min_payout if min_payout is None else min_payout,
+            self.max_age if max_age is None else max_age,
+            fee_per_payout
+        )
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except Exception as e:
+            logging.error(f"Error closing balance ledger: {e}")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import base64
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+
+class BitcoinRPCError(Exception):
+    """Error returned by the Bitcoin JSON-RPC server."""
+
+    def __init__(self, error: Dict):
+        super().__init__(f"{error.get('message')} (code {error.get('code')})")
+        self.code = error.get('code')
+        self.message = error.get('message')
+
+
+def read_rpc_credentials(conf_path: str) -> Tuple[Optional[str], Optional[str]]:
+    """Read rpcuser/rpcpassword from a bitcoin.conf file, if present."""
+    user = password = None
+    if conf_path and os.path.exists(conf_path):
+        with open(conf_path, 'r') as f:
+            for line in f:
+                key, _, value = line.strip().partition('=')
+                if key == 'rpcuser':
+                    user = value
+                elif key == 'rpcpassword':
+                    password = value
+    return user, password
+
+
+class AsyncBitcoinRPC:
+    """Asyncio Bitcoin JSON-RPC client.
+
+    Requests share a pool of keep-alive HTTP connections, every call has a
+    timeout, and `batch` sends many calls in a single POST.
+    """
+
+    def __init__(self, url: str, user: Optional[str] = None, password: Optional[str] = None,
+                 pool_size: int = 10, timeout: float = 30):
+        self.url = url
+        self.headers = {}
+        if user:
+            token = base64.b64encode(f"{user}:{password or ''}".encode()).decode()
+            self.headers['Authorization'] = f'Basic {token}'
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._next_id = 0
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        # aiohttp is imported on first use to keep module import cheap
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                headers=self.headers
+            )
+        return self._session
+
+    async def _post(self, payload, timeout: Optional[float]):
+        import aiohttp
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with session.post(self.url, json=payload, timeout=client_timeout) as response:
+            # bitcoind reports RPC errors with HTTP 500 and a JSON body
+            if response.status not in (200, 404, 500):
+                response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def call(self, method: str, *params, timeout: Optional[float] = None):
+        """Call a single RPC method and return its result, raising BitcoinRPCError on failure."""
+        self._next_id += 1
+        response = await self._post(
+            {'jsonrpc': '1.0', 'id': self._next_id, 'method': method, 'params': list(params)}, timeout)
+        if response.get('error'):
+            raise BitcoinRPCError(response['error'])
+        return response['result']
+
+    async def batch(self, calls: List[Tuple[str, list]], timeout: Optional[float] = None) -> List[Tuple]:
+        """Send (method, params) calls in one request and return (result, error) pairs in order."""
+        if not calls:
+            return []
+        first_id = self._next_id + 1
+        self._next_id += len(calls)
+        payload = [{'jsonrpc': '1.0', 'id': first_id + i, 'method': method, 'params': list(params)}
+                   for i, (method, params) in enumerate(calls)]
+        responses = await self._post(payload, timeout)
+        by_id = {response['id']: response for response in responses}
+        return [(by_id[first_id + i].get('result'), by_id[first_id + i].get('error')) for i in range(len(calls))]
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -5,12 +5,15 @@ import sys
 import json
 import logging
 import asyncio
+from functools import cached_property
 from typing import Dict, List, Optional
 from datetime import datetime
-from web3 import Web3
-from eth_account import Account
-from bitcoin.rpc import RawProxy
 from cryptography.fernet import Fernet
+from src.nonce_manager import NonceManager
+from src.confirmation_watcher import ConfirmationWatcher
+from src.bitcoin_rpc import AsyncBitcoinRPC, BitcoinRPCError, read_rpc_credentials
+from src.balance_ledger import BalanceLedger
+from src.payout_journal import PayoutJournal, IN_DOUBT_STAGES
 
 # Configure logging
 logging.basicConfig(
@@ -22,14 +25,155 @@ logging.basicConfig(
     ]
 )
 
+# Upper bound on recipients covered by one batched transaction and mint
+MAX_BATCH_OUTPUTS = 2000
+
+# Wrapped BTC is minted in satoshi units
+SATOSHIS_PER_BTC = 10 ** 8
+
+# Minimal ABI for the K2 wrapped-BTC token minting interface
+MINT_ABI = [
+    {
+        'name': 'mint',
+        'type': 'function',
+        'stateMutability': 'nonpayable',
+        'inputs': [{'name': 'to', 'type': 'address'}, {'name': 'amount', 'type': 'uint256'}],
+        'outputs': []
+    },
+    {
+        'name': 'mintBatch',
+        'type': 'function',
+        'stateMutability': 'nonpayable',
+        'inputs': [{'name': 'to', 'type': 'address[]'}, {'name': 'amounts', 'type': 'uint256[]'}],
+        'outputs': []
+    }
+]
+
+# Stages that move funds; these are not idempotent and are only retried when nothing was sent
+SEND_STAGES = ('create', 'mint')
+
+# Connection failures raised before a request was written (aiohttp, urllib3)
+CONNECT_ERRORS = ('ClientConnectorError', 'NewConnectionError')
+
+# Journaled Bitcoin sends carry this wallet comment plus their ref, so an
+# interrupted send can be found in the wallet; listtransactions page size
+PAYOUT_COMMENT_PREFIX = 'koii-payout:'
+WALLET_PAGE = 500
+
+class WrapperError(Exception):
+    """Raised when the wrapper cannot load its configuration or reach a dependency."""
+
+class InDoubtError(Exception):
+    """Raised when a send failed in a way that leaves open whether it reached the node."""
+
+def k2_rejection(error: BaseException) -> Optional[str]:
+    """The K2 node's message when it answered with a JSON-RPC error, else None."""
+    response = getattr(error, 'rpc_response', None)
+    if isinstance(response, dict) and isinstance(response.get('error'), dict):
+        # web3 7+: Web3RPCError
+        return str(response['error'].get('message', ''))
+    if isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict):
+        # web3 6: ValueError carrying the error object
+        return str(error.args[0].get('message', ''))
+    return None
+
+def payout_comment(ref: Optional[str]) -> Optional[str]:
+    return f"{PAYOUT_COMMENT_PREFIX}{ref}" if ref is not None else None
+
+def never_sent(error: BaseException) -> bool:
+    """True when `error` proves a call never took effect on the node.
+
+    That is the case when the connection was refused or could not be opened,
+    or when bitcoind or the K2 node answered with an RPC error. Timeouts, resets and other
+    failures after the request went out are ambiguous: the node may have
+    acted on it.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (ConnectionRefusedError, BitcoinRPCError)) or type(error).__name__ in CONNECT_ERRORS:
+            return True
+        if k2_rejection(error) is not None:
+            return True
+        # requests wraps the urllib3 error as ConnectionError(MaxRetryError(reason=NewConnectionError))
+        cause = error.__cause__ or error.__context__ or getattr(error, 'reason', None)
+        if cause is None and error.args and isinstance(error.args[0], BaseException):
+            cause = error.args[0]
+        error = cause
+    return False
+
 class BTCWrapper:
     def __init__(self, config_path: str = 'config/wrapper_config.json'):
-        """Initialize the BTC wrapper with configuration."""
+        """Initialize the BTC wrapper with configuration.
+
+        Only the config is read here. RPC clients, the K2 connection and the
+        signing key are created on first use (web3 and eth_account are
+        imported at that point too); call `warm_up()` to establish them
+        concurrently ahead of time.
+        """
         self.config = self._load_config(config_path)
-        self.btc_rpc = self._init_bitcoin_rpc()
-        self.web3 = self._init_web3()
-        self.account = self._init_account()
-        self.fernet = self._init_fernet()
+        
+    @cached_property
+    def btc_rpc(self) -> AsyncBitcoinRPC:
+        return self._init_bitcoin_rpc()
+        
+    @cached_property
+    def web3(self):
+        return self._init_web3()
+        
+    @cached_property
+    def fernet(self) -> Fernet:
+        return self._init_fernet()
+        
+    @cached_property
+    def account(self):
+        return self._init_account()
+        
+    @cached_property
+    def nonce_manager(self) -> NonceManager:
+        return NonceManager(
+            lambda block_identifier: self.web3.eth.get_transaction_count(self.account.address, block_identifier),
+            state_path=self.config.get('nonce_state_file', 'data/k2_nonce.json')
+        )
+        
+    @cached_property
+    def confirmation_watcher(self) -> ConfirmationWatcher:
+        return ConfirmationWatcher(
+            self._btc_rpc_batch,
+            poll_interval=self.config.get('confirmation_poll_interval', 5)
+        )
+        
+    @cached_property
+    def payout_journal(self) -> Optional[PayoutJournal]:
+        """Checkpoint journal for resumable payouts; None when `payout_journal_file` is unset."""
+        path = self.config.get('payout_journal_file')
+        if not path:
+            return None
+        try:
+            return PayoutJournal(path)
+        except Exception as e:
+            logging.error(f"Error opening payout journal: {e}")
+            raise WrapperError(f"Error opening payout journal: {e}") from e
+        
+    @cached_property
+    def balance_ledger(self) -> Optional[BalanceLedger]:
+        """Threshold ledger for accumulating small rewards; None when `balance_ledger_file` is unset."""
+        path = self.config.get('balance_ledger_file')
+        if not path:
+            return None
+        try:
+            return BalanceLedger(path, self.config.get('min_payout', 0.001), self.config.get('max_payout_age'))
+        except Exception as e:
+            logging.error(f"Error opening balance ledger: {e}")
+            raise WrapperError(f"Error opening balance ledger: {e}") from e
+        
+    async def warm_up(self) -> None:
+        """Connect to Bitcoin and K2 and load the signing key concurrently."""
+        await asyncio.gather(
+            self.btc_rpc.call('getblockcount'),
+            asyncio.to_thread(lambda: self.web3),
+            asyncio.to_thread(lambda: self.account)
+        )
         
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration from file."""
@@ -38,41 +182,46 @@ class BTCWrapper:
                 return json.load(f)
         except Exception as e:
             logging.error(f"Error loading config: {e}")
-            sys.exit(1)
+            raise WrapperError(f"Error loading config: {e}") from e
             
-    def _init_bitcoin_rpc(self) -> RawProxy:
-        """Initialize Bitcoin RPC connection."""
+    def _init_bitcoin_rpc(self) -> AsyncBitcoinRPC:
+        """Initialize the asyncio Bitcoin RPC client."""
         try:
-            return RawProxy(
-                service_url=self.config['bitcoin_rpc_url'],
-                service_port=self.config['bitcoin_rpc_port'],
-                btc_conf_file=self.config['bitcoin_conf_path']
+            user, password = read_rpc_credentials(self.config.get('bitcoin_conf_path'))
+            return AsyncBitcoinRPC(
+                f"{self.config['bitcoin_rpc_url']}:{self.config['bitcoin_rpc_port']}",
+                user=self.config.get('bitcoin_rpc_user', user),
+                password=self.config.get('bitcoin_rpc_password', password),
+                pool_size=self.config.get('rpc_pool_size', self.config.get('batch_size', 10)),
+                timeout=self.config.get('rpc_timeout', 30)
             )
         except Exception as e:
             logging.error(f"Error initializing Bitcoin RPC: {e}")
-            sys.exit(1)
+            raise WrapperError(f"Error initializing Bitcoin RPC: {e}") from e
             
-    def _init_web3(self) -> Web3:
+    def _init_web3(self):
         """Initialize Web3 connection."""
         try:
+            from web3 import Web3
             w3 = Web3(Web3.HTTPProvider(self.config['k2_rpc_url']))
             if not w3.is_connected():
                 raise Exception("Failed to connect to K2 network")
             return w3
         except Exception as e:
             logging.error(f"Error initializing Web3: {e}")
-            sys.exit(1)
+            raise WrapperError(f"Error initializing Web3: {e}") from e
             
-    def _init_account(self) -> Account:
+    def _init_account(self):
         """Initialize Ethereum account for K2 transactions."""
         try:
+            from eth_account import Account
             with open(self.config['key_file'], 'r') as f:
                 encrypted_key = f.read()
             decrypted_key = self.fernet.decrypt(encrypted_key.encode())
             return Account.from_key(decrypted_key)
         except Exception as e:
             logging.error(f"Error initializing account: {e}")
-            sys.exit(1)
+            raise WrapperError(f"Error initializing account: {e}") from e
             
     def _init_fernet(self) -> Fernet:
         """Initialize Fernet for key encryption."""
@@ -82,13 +231,13 @@ class BTCWrapper:
             return Fernet(key)
         except Exception as e:
             logging.error(f"Error initializing Fernet: {e}")
-            sys.exit(1)
+            raise WrapperError(f"Error initializing Fernet: {e}") from e
             
     async def wrap_rewards(self, amount: float, recipient: str) -> str:
         """Wrap Bitcoin rewards into K2 tokens."""
         try:
             # 1. Create Bitcoin transaction
-            txid = self._create_bitcoin_tx(amount)
+            txid = await self._create_bitcoin_tx(amount)
             logging.info(f"Created Bitcoin transaction: {txid}")
             
             # 2. Wait for confirmation
@@ -103,56 +252,445 @@ class BTCWrapper:
             logging.error(f"Error wrapping rewards: {e}")
             raise
             
-    def _create_bitcoin_tx(self, amount: float) -> str:
-        """Create a Bitcoin transaction to the wrapper address."""
+    async def _create_bitcoin_tx(self, amount: float, comment: Optional[str] = None) -> str:
+        """Create a Bitcoin transaction to the wrapper address, with an optional wallet comment."""
         try:
-            # Implementation details for Bitcoin transaction creation
-            # This is a placeholder - actual implementation would use bitcoin.rpc
-            return "mock_txid"
+            params = [self.config['wrapper_address'], amount] + ([comment] if comment else [])
+            return await self.btc_rpc.call('sendtoaddress', *params)
         except Exception as e:
             logging.error(f"Error creating Bitcoin transaction: {e}")
             raise
             
-    async def _wait_for_confirmation(self, txid: str, confirmations: int = 6) -> None:
-        """Wait for Bitcoin transaction confirmation."""
+    async def _find_bitcoin_send(self, ref: str) -> Optional[str]:
+        """Txid of the wallet's send tagged with payout `ref`, or None if the wallet never made it."""
+        comment = payout_comment(ref)
+        skip = 0
+        while True:
+            page = await self.btc_rpc.call('listtransactions', '*', WALLET_PAGE, skip)
+            for tx in page:
+                if tx.get('category') == 'send' and tx.get('comment') == comment:
+                    return tx['txid']
+            if len(page) < WALLET_PAGE:
+                return None
+            skip += len(page)
+            
+    async def _btc_rpc_batch(self, calls: List) -> List:
+        """Send several Bitcoin RPC calls in one JSON-RPC batch, returning (result, error) pairs."""
+        return await self.btc_rpc.batch(calls)
+            
+    async def _wait_for_confirmation(self, txid: str, confirmations: Optional[int] = None) -> None:
+        """Wait for Bitcoin transaction confirmation via the shared block watcher."""
         try:
-            # Implementation details for confirmation waiting
-            # This is a placeholder - actual implementation would poll the RPC
-            await asyncio.sleep(1)
+            if confirmations is None:
+                confirmations = self.config.get('min_confirmations', 6)
+            await self.confirmation_watcher.wait(txid, confirmations)
         except Exception as e:
             logging.error(f"Error waiting for confirmation: {e}")
             raise
             
-    async def _mint_k2_tokens(self, amount: float, recipient: str) -> str:
+    async def _mint_k2_tokens(self, amount: float, recipient: str, on_signed=None) -> str:
         """Mint K2 tokens for the recipient."""
+        from web3 import Web3
         try:
-            # Implementation details for K2 token minting
-            # This is a placeholder - actual implementation would use web3
-            return "mock_k2_tx_hash"
+            return await self._send_k2_transaction(
+                lambda contract: contract.functions.mint(
+                    Web3.to_checksum_address(recipient), self._to_token_units(amount)), on_signed)
         except Exception as e:
             logging.error(f"Error minting K2 tokens: {e}")
             raise
             
-    async def distribute_rewards(self, rewards: List[Dict[str, float]]) -> List[str]:
-        """Distribute rewards to multiple recipients."""
+    async def _create_bitcoin_batch_tx(self, outputs: Dict[str, float], comment: Optional[str] = None) -> str:
+        """Create one multi-output Bitcoin transaction (sendmany-style), with an optional wallet comment."""
+        try:
+            params = ['', outputs] + ([1, comment] if comment else [])
+            return await self.btc_rpc.call('sendmany', *params)
+        except Exception as e:
+            logging.error(f"Error creating batched Bitcoin transaction: {e}")
+            raise
+            
+    async def _mint_k2_tokens_batch(self, mints: List[Dict[str, float]], on_signed=None) -> str:
+        """Mint K2 tokens for many recipients in a single call."""
+        from web3 import Web3
         try:
-            tx_hashes = []
-            for reward in rewards:
-                tx_hash = await self.wrap_rewards(
-                    reward['amount'],
-                    reward['recipient']
-                )
-                tx_hashes.append(tx_hash)
-            return tx_hashes
+            return await self._send_k2_transaction(
+                lambda contract: contract.functions.mintBatch(
+                    [Web3.to_checksum_address(m['recipient']) for m in mints],
+                    [self._to_token_units(m['amount']) for m in mints]), on_signed)
         except Exception as e:
-            logging.error(f"Error distributing rewards: {e}")
+            logging.error(f"Error minting batched K2 tokens: {e}")
             raise
+            
+    def _to_token_units(self, amount: float) -> int:
+        return int(round(amount * SATOSHIS_PER_BTC))
+            
+    async def _send_k2_transaction(self, build_call, on_signed=None) -> str:
+        """Sign and broadcast a mint call using a locally allocated nonce.
+
+        Nonces come from the nonce manager, so transactions are not serialized
+        behind each other's inclusion. A nonce is handed back only when the
+        transaction provably never reached the node; nonce errors trigger a
+        resync with the chain. After a timeout or any other ambiguous failure
+        the nonce stays in flight and the node is asked for the transaction,
+        whose hash is known from signing, instead of minting again.
+        `on_signed(tx_hash)` is called before the transaction is broadcast.
+        """
+        from web3 import Web3
+        contract = self.web3.eth.contract(
+            address=Web3.to_checksum_address(self.config['k2_token_contract']), abi=MINT_ABI)
+        # The first allocation and resyncs query the chain; keep those off the event loop
+        nonce = await asyncio.to_thread(self.nonce_manager.allocate)
+        try:
+            tx = build_call(contract).build_transaction({
+                'from': self.account.address,
+                'nonce': nonce,
+                'chainId': self.config['k2_chain_id'],
+                'gas': self.config['gas_limit'],
+                'gasPrice': Web3.to_wei(self.config['gas_price'], 'gwei')
+            })
+            signed = self.account.sign_transaction(tx)
+            tx_hash = Web3.to_hex(signed.hash)
+            if on_signed is not None:
+                on_signed(tx_hash)
+        except Exception:
+            self.nonce_manager.release(nonce)
+            raise
+        raw = getattr(signed, 'raw_transaction', None) or signed.rawTransaction
+        try:
+            await asyncio.to_thread(self.web3.eth.send_raw_transaction, raw)
+        except Exception as e:
+            rejection = (k2_rejection(e) or '').lower()
+            if 'already known' in rejection:
+                # This very transaction is already in the node's pool
+                pass
+            elif 'nonce' in rejection or 'replacement' in rejection:
+                await asyncio.to_thread(self.nonce_manager.resync)
+                raise
+            elif rejection or never_sent(e):
+                self.nonce_manager.release(nonce)
+                raise
+            else:
+                self.nonce_manager.mark_sent(nonce, tx_hash)
+                if not await self._k2_transaction_known(tx_hash):
+                    raise InDoubtError(f"K2 transaction {tx_hash} (nonce {nonce}) may have been sent: {e}") from e
+        self.nonce_manager.mark_sent(nonce, tx_hash)
+        return tx_hash
+
+    async def _k2_transaction_known(self, tx_hash: str) -> bool:
+        """True if the K2 node has the transaction, pending or mined; lookup errors are raised."""
+        from web3.exceptions import TransactionNotFound
+        try:
+            await asyncio.to_thread(self.web3.eth.get_transaction, tx_hash)
+        except TransactionNotFound:
+            return False
+        return True
+            
+    async def _run_stage(self, stage: str, func, *args):
+        """Run one payout stage, retrying per the configured attempts and delay.
+
+        Send stages are retried only when the error proves nothing was sent;
+        anything else is raised and left for reconciliation.
+        """
+        attempts = max(1, self.config.get('retry_attempts', 1))
+        delay = self.config.get('retry_delay', 0)
+        for attempt in range(1, attempts + 1):
+            try:
+                result = func(*args)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                return result
+            except Exception as e:
+                if attempt == attempts or (stage in SEND_STAGES and not never_sent(e)):
+                    raise
+                logging.warning(f"{stage} failed (attempt {attempt}/{attempts}): {e}")
+                await asyncio.sleep(delay)
+                
+    def _journal(self, run_id: Optional[str], items: List[int], stage: str, **fields) -> None:
+        if run_id is not None and self.payout_journal is not None:
+            self.payout_journal.record(run_id, items, stage, **fields)
+            
+    def _journal_signed(self, run_id: Optional[str], items: List[int]):
+        """on_signed callback recording a mint's hash before it is broadcast, or None without a journal."""
+        if run_id is None or self.payout_journal is None:
+            return None
+        return lambda tx_hash: self._journal(run_id, items, 'minting', tx_hash=tx_hash)
+            
+    async def _reconcile(self, run_id: Optional[str], items: List[int], state: Dict) -> Dict:
+        """Resolve an in-doubt item by looking its send up, returning the state to continue from.
+
+        A 'broadcasting' item is searched for in the wallet by its ref, a
+        'minting' one on K2 by its signed hash. A send that is found moves the
+        item forward; one that provably never happened moves it back to be
+        sent again. Items journaled without a ref cannot be looked up and
+        stay in doubt, as do items whose lookup fails.
+        """
+        stage = state['stage']
+        if not state.get('ref'):
+            raise InDoubtError(f"interrupted while {stage}; reconcile before retrying")
+        if stage == 'broadcasting':
+            txid = await self._find_bitcoin_send(state['ref'])
+            if txid is not None:
+                self._journal(run_id, items, 'broadcast', txid=txid)
+                return dict(state, stage='broadcast', txid=txid)
+            self._journal(run_id, items, 'created')
+            return dict(state, stage='created')
+        # The hash is journaled before broadcasting, so a mint without one was never sent
+        if state.get('tx_hash') and await self._k2_transaction_known(state['tx_hash']):
+            self._journal(run_id, items, 'minted')
+            return dict(state, stage='minted')
+        self._journal(run_id, items, 'confirmed')
+        return dict(state, stage='confirmed', tx_hash=None)
+            
+    def _new_result(self, reward: Dict[str, float], state: Optional[Dict] = None) -> Dict:
+        state = state or {}
+        return {
+            'recipient': reward['recipient'],
+            'amount': reward['amount'],
+            'status': 'success' if state.get('stage') == 'minted' else 'failed',
+            'txid': state.get('txid'),
+            'tx_hash': state.get('tx_hash'),
+            'error': None
+        }
+            
+    async def _distribute_one(self, reward: Dict[str, float], semaphore: asyncio.Semaphore,
+                              run_id: Optional[str] = None, item: int = 0, state: Optional[Dict] = None) -> Dict:
+        """Create, confirm and mint a single reward, recording where it failed.
+
+        With a journal, each stage is checkpointed and a resumed item starts
+        from its last recorded stage. A send that fails without proof that
+        nothing was sent leaves the item in doubt; the next run reconciles it
+        before anything is sent again.
+        """
+        result = self._new_result(reward, state)
+        state = state or {'stage': 'created'}
+        journaled = state['stage']
+        ref = state.get('ref') or (f"{run_id}:{item}" if run_id is not None else None)
+        stage = 'reconcile'
+        try:
+            if journaled in IN_DOUBT_STAGES:
+                state = await self._reconcile(run_id, [item], state)
+                journaled = state['stage']
+                result['txid'], result['tx_hash'] = state.get('txid'), state.get('tx_hash')
+            stage = 'create'
+            # RPC-bound stages hold a semaphore slot; confirmation waits do not,
+            # so other recipients keep creating and minting in the meantime.
+            if journaled == 'created':
+                async with semaphore:
+                    self._journal(run_id, [item], 'broadcasting', ref=ref)
+                    try:
+                        result['txid'] = await self._run_stage(
+                            stage, self._create_bitcoin_tx, reward['amount'], payout_comment(ref))
+                    except Exception as e:
+                        # Only an error proving nothing was sent makes the item safe to send again
+                        self._journal(run_id, [item], 'created' if never_sent(e) else 'broadcasting', error=str(e))
+                        raise
+                    self._journal(run_id, [item], 'broadcast', txid=result['txid'])
+                journaled = 'broadcast'
+            if journaled == 'broadcast':
+                stage = 'confirm'
+                await self._run_stage(stage, self._wait_for_confirmation, result['txid'])
+                self._journal(run_id, [item], 'confirmed')
+                journaled = 'confirmed'
+            if journaled == 'confirmed':
+                stage = 'mint'
+                async with semaphore:
+                    self._journal(run_id, [item], 'minting', ref=ref)
+                    try:
+                        result['tx_hash'] = await self._run_stage(
+                            stage, self._mint_k2_tokens, reward['amount'], reward['recipient'],
+                            self._journal_signed(run_id, [item]))
+                    except Exception as e:
+                        self._journal(run_id, [item], 'confirmed' if never_sent(e) else 'minting', error=str(e))
+                        raise
+                    self._journal(run_id, [item], 'minted', tx_hash=result['tx_hash'])
+                journaled = 'minted'
+            result['status'] = 'success'
+        except Exception as e:
+            result['error'] = f"{stage}: {e}"
+            logging.error(f"Error distributing reward to {reward['recipient']} at {stage} stage: {e}")
+        return result
+            
+    def _batch_outputs(self, chunk: List[Dict[str, float]]) -> Dict[str, float]:
+        """Build sendmany outputs for a chunk.
+
+        Every wrapped reward is deposited to the wrapper address, so a chunk
+        collapses into a single output; per-recipient amounts are carried by
+        the K2 mint.
+        """
+        return {self.config['wrapper_address']: round(sum(r['amount'] for r in chunk), 8)}
+            
+    async def _distribute_batch(self, chunk: List[Dict[str, float]], semaphore: asyncio.Semaphore,
+                                run_id: Optional[str] = None, items: Optional[List[int]] = None,
+                                state: Optional[Dict] = None) -> List[Dict]:
+        """Pay a chunk of rewards with one Bitcoin transaction and one K2 mint.
+
+        `state` is the shared journaled stage, txid and ref when resuming a
+        chunk; an in-doubt chunk is reconciled first, as in _distribute_one.
+        """
+        items = items if items is not None else list(range(len(chunk)))
+        results = [self._new_result(reward, state) for reward in chunk]
+        state = state or {'stage': 'created'}
+        journaled = state['stage']
+        txid = state.get('txid')
+        ref = state.get('ref') or (f"{run_id}:{items[0]}" if run_id is not None else None)
+        stage = 'reconcile'
+        try:
+            if journaled in IN_DOUBT_STAGES:
+                state = await self._reconcile(run_id, items, state)
+                journaled = state['stage']
+                txid = state.get('txid')
+                for result in results:
+                    result['txid'], result['tx_hash'] = txid, state.get('tx_hash')
+            stage = 'create'
+            if journaled == 'created':
+                async with semaphore:
+                    self._journal(run_id, items, 'broadcasting', ref=ref)
+                    try:
+                        txid = await self._run_stage(stage, self._create_bitcoin_batch_tx, self._batch_outputs(chunk),
+                                                     payout_comment(ref))
+                    except Exception as e:
+                        self._journal(run_id, items, 'created' if never_sent(e) else 'broadcasting', error=str(e))
+                        raise
+                    self._journal(run_id, items, 'broadcast', txid=txid)
+                for result in results:
+                    result['txid'] = txid
+                journaled = 'broadcast'
+            if journaled == 'broadcast':
+                stage = 'confirm'
+                await self._run_stage(stage, self._wait_for_confirmation, txid)
+                self._journal(run_id, items, 'confirmed')
+                journaled = 'confirmed'
+            if journaled == 'confirmed':
+                stage = 'mint'
+                mints = [{'recipient': r['recipient'], 'amount': r['amount']} for r in chunk]
+                async with semaphore:
+                    self._journal(run_id, items, 'minting', ref=ref)
+                    try:
+                        tx_hash = await self._run_stage(stage, self._mint_k2_tokens_batch, mints,
+                                                        self._journal_signed(run_id, items))
+                    except Exception as e:
+                        self._journal(run_id, items, 'confirmed' if never_sent(e) else 'minting', error=str(e))
+                        raise
+                    self._journal(run_id, items, 'minted', tx_hash=tx_hash)
+                for result in results:
+                    result['tx_hash'] = tx_hash
+                journaled = 'minted'
+            for result in results:
+                result['status'] = 'success'
+        except Exception as e:
+            for result in results:
+                result['error'] = f"{stage}: {e}"
+            logging.error(f"Error distributing batch of {len(chunk)} rewards at {stage} stage: {e}")
+        return results
+            
+    def _batch_groups(self, pending: List[int], states: Dict[int, Dict], size: int) -> List[tuple]:
+        """Group unfinished items into chunks: fresh items by size, resumed ones by shared txid and ref."""
+        fresh = [item for item in pending if states[item]['stage'] == 'created']
+        groups = [(fresh[i:i + size], None) for i in range(0, len(fresh), size)]
+        resumed = {}
+        for item in pending:
+            state = states[item]
+            if state['stage'] != 'created':
+                resumed.setdefault((state['stage'], state['txid'], state.get('ref')), []).append(item)
+        groups.extend((items, states[items[0]]) for items in resumed.values())
+        return groups
+            
+    async def distribute_rewards(self, rewards: List[Dict[str, float]], batch: Optional[bool] = None,
+                                 run_id: Optional[str] = None) -> List[Dict]:
+        """Distribute rewards to multiple recipients.
+
+        Recipients are processed concurrently, with at most `batch_size` RPC
+        stages in flight. A failure only affects its own recipient; the returned
+        list has one result per reward, in order, with `status` set to
+        'success' or 'failed' and the failing stage in `error`.
+
+        In batch mode (`batch=True`, or `batch_payouts` in the config) rewards
+        are grouped into chunks of `max_batch_outputs` (default `batch_size`),
+        each paid with a single Bitcoin transaction and a single K2 mint; every
+        recipient in a chunk shares its txid and tx_hash.
+
+        When `payout_journal_file` is configured, `run_id` is required (for
+        example the round or epoch being paid) and every stage is checkpointed
+        under it. Calling again with the same run skips minted recipients,
+        reported as successful without their hashes (see the journal's
+        history), and resumes the rest from their last stage. Items
+        interrupted mid-send are looked up in the wallet or on K2 first and
+        only sent again if the send provably never happened; otherwise they
+        are reported as failed.
+        """
+        semaphore = asyncio.Semaphore(max(1, self.config.get('batch_size', 1)))
+        if batch is None:
+            batch = self.config.get('batch_payouts', False)
+        states = {}
+        if self.payout_journal is not None:
+            if not run_id:
+                # An id derived from the rewards alone would mark a later, identical payout as already paid
+                raise WrapperError("distribute_rewards needs a run_id when the payout journal is enabled")
+            try:
+                states = self.payout_journal.open_run(run_id, rewards)
+            except ValueError as e:
+                raise WrapperError(str(e)) from e
+        else:
+            run_id = None
+        # The journal only returns unfinished items; the others were minted by an earlier call
+        paid = {'stage': 'minted'} if run_id is not None else None
+        results = [self._new_result(reward, states.get(item, paid)) for item, reward in enumerate(rewards)]
+        pending = [item for item in range(len(rewards)) if results[item]['status'] != 'success']
+        if len(pending) < len(rewards):
+            logging.info(f"Resuming run {run_id}: {len(rewards) - len(pending)} already paid, {len(pending)} remaining")
+        if batch:
+            size = max(1, min(self.config.get('max_batch_outputs', self.config.get('batch_size', 1)),
+                              MAX_BATCH_OUTPUTS))
+            groups = self._batch_groups(pending, states or {i: {'stage': 'created'} for i in pending}, size)
+            batches = await asyncio.gather(*(
+                self._distribute_batch([rewards[i] for i in items], semaphore, run_id, items, state)
+                for items, state in groups))
+            for (items, _), chunk_results in zip(groups, batches):
+                for item, result in zip(items, chunk_results):
+                    results[item] = result
+        else:
+            paid = await asyncio.gather(*(
+                self._distribute_one(rewards[item], semaphore, run_id, item, states.get(item))
+                for item in pending))
+            for item, result in zip(pending, paid):
+                results[item] = result
+        if self.nonce_manager.in_flight:
+            try:
+                await asyncio.to_thread(self.nonce_manager.resync)
+            except Exception as e:
+                logging.warning(f"Error resyncing K2 nonces: {e}")
+        failed = sum(1 for result in results if result['status'] != 'success')
+        if failed:
+            logging.warning(f"Distributed {len(results) - failed}/{len(results)} rewards, {failed} failed")
+        else:
+            logging.info(f"Distributed {len(results)} rewards")
+        return results
+
+    async def distribute_round(self, round_id: str, rewards: List[Dict[str, float]],
+                               batch: Optional[bool] = None) -> List[Dict]:
+        """Credit a round's rewards to the balance ledger and pay whoever is due.
+
+        Without a ledger every reward is paid immediately. With one, only
+        recipients at or above `min_payout` (or past `max_payout_age` seconds)
+        are paid; the rest carry over. Calling again for the same round resumes
+        the same payout instead of crediting twice.
+        """
+        if self.balance_ledger is None:
+            return await self.distribute_rewards(rewards, batch=batch, run_id=round_id)
+        self.balance_ledger.credit_round(round_id, rewards)
+        due = self.balance_ledger.due_payouts(round_id)
+        logging.info(f"Round {round_id}: {len(rewards)} rewards credited, {len(due)} payouts due")
+        results = await self.distribute_rewards(due, batch=batch, run_id=round_id)
+        self.balance_ledger.settle(round_id, results)
+        return results
 
 if __name__ == '__main__':
-    wrapper = BTCWrapper()
-    # Example usage
-    rewards = [
-        {'amount': 0.1, 'recipient': '0x123...'},
-        {'amount': 0.2, 'recipient': '0x456...'}
-    ]
-    asyncio.run(wrapper.distribute_rewards(rewards)) 
\ No newline at end of file
+    try:
+        wrapper = BTCWrapper()
+        # Example usage
+        rewards = [
+            {'amount': 0.1, 'recipient': '0x123...'},
+            {'amount': 0.2, 'recipient': '0x456...'}
+        ]
+        asyncio.run(wrapper.distribute_rewards(rewards))
+    except WrapperError:
+        sys.exit(1) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Calls are (method, params); results are (result, error) in the same order
+BatchCall = Callable[[List[Tuple[str, list]]], Awaitable[List[Tuple[object, Optional[dict]]]]]
+
+# Bitcoin Core: "Invalid or non-wallet transaction id"
+RPC_INVALID_ADDRESS_OR_KEY = -5
+
+
+class ConfirmationError(Exception):
+    """Raised to a waiter whose transaction can no longer confirm."""
+
+
+class ConfirmationWatcher:
+    """Tracks confirmations for many Bitcoin transactions with one RPC pass per block.
+
+    A single background task follows the chain tip. Whenever the tip moves (or
+    new transactions are registered, or `notify_new_block` is called by an
+    external block notifier) every pending txid is checked in one batched
+    `gettransaction` request, and each waiter's future is resolved once its
+    confirmation target is reached.
+    """
+
+    def __init__(self, batch_call: BatchCall, poll_interval: float = 5.0, max_batch: int = 500):
+        self._batch_call = batch_call
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self._waiters: Dict[str, List[Tuple[int, asyncio.Future, float]]] = {}
+        self._last_height: Optional[int] = None
+        self._unchecked = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self.confirmed = 0
+        self.rpc_passes = 0
+        self.confirmation_times = deque(maxlen=1000)
+
+    async def wait(self, txid: str, confirmations: int) -> Dict:
+        """Wait until `txid` has at least `confirmations` and return its gettransaction result."""
+        self._ensure_running()
+        future = self._loop.create_future()
+        self._waiters.setdefault(txid, []).append((confirmations, future, time.monotonic()))
+        self._unchecked = True
+        self._wakeup.set()
+        return await future
+
+    def notify_new_block(self) -> None:
+        """Check pending transactions now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._last_height = None
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> Dict:
+        times = sorted(self.confirmation_times)
+        return {
+            'pending': self.pending,
+            'confirmed': self.confirmed,
+            'rpc_passes': self.rpc_passes,
+            'avg_confirmation_seconds': sum(times) / len(times) if times else None,
+            'p95_confirmation_seconds': times[min(len(times) - 1, int(len(times) * 0.95))] if times else None
+        }
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._waiters:
+            self._wakeup.clear()
+            try:
+                [(height, error)] = await self._batch_call([('getblockcount', [])])
+                if error:
+                    raise Exception(error)
+                if height != self._last_height or self._unchecked:
+                    self._last_height = height
+                    self._unchecked = False
+                    await self._check_pending()
+            except Exception as e:
+                logging.error(f"Error checking confirmations: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check_pending(self) -> None:
+        txids = list(self._waiters)
+        for start in range(0, len(txids), self.max_batch):
+            chunk = txids[start:start + self.max_batch]
+            results = await self._batch_call([('gettransaction', [txid]) for txid in chunk])
+            self.rpc_passes += 1
+            for txid, (result, error) in zip(chunk, results):
+                if error:
+                    if error.get('code') == RPC_INVALID_ADDRESS_OR_KEY:
+                        self._fail(txid, ConfirmationError(f"Unknown transaction {txid}"))
+                    continue
+                confirmations = result.get('confirmations', 0)
+                if confirmations < 0:
+                    self._fail(txid, ConfirmationError(f"Transaction {txid} conflicts with the chain"))
+                    continue
+                self._resolve(txid, confirmations, result)
+
+    def _resolve(self, txid: str, confirmations: int, result: Dict) -> None:
+        now = time.monotonic()
+        remaining = []
+        for target, future, started in self._waiters.get(txid, []):
+            if future.done():
+                continue
+            if confirmations >= target:
+                future.set_result(result)
+                self.confirmed += 1
+                self.confirmation_times.append(now - started)
+            else:
+                remaining.append((target, future, started))
+        if remaining:
+            self._waiters[txid] = remaining
+        else:
+            self._waiters.pop(txid, None)
+
+    def _fail(self, txid: str, error: Exception) -> None:
+        for _, future, _ in self._waiters.pop(txid, []):
+            if not future.done():
+                future.set_exception(error)
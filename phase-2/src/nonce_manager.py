@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import heapq
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class NonceManager:
+    """Hands out K2 transaction nonces locally so many transactions can be in flight.
+
+    The manager is seeded from the chain's pending transaction count and then
+    allocates sequentially without further RPCs. Nonces that were allocated but
+    never made it into the node (send failures, dropped transactions) are
+    returned to a gap heap and reused lowest-first, so a hole never stalls the
+    transactions queued behind it.
+
+    The next nonce is persisted on every allocation. After a restart anything
+    between the node's pending count and the persisted value is treated as a
+    gap and refilled, rather than reusing a nonce still held by a pending
+    transaction.
+
+    `allocate` (on first use) and `resync` call the transaction-count function,
+    which blocks on the node; async callers run them in a worker thread.
+    """
+
+    def __init__(self, get_transaction_count: Callable[[str], int], state_path: Optional[str] = None):
+        """`get_transaction_count(block_identifier)` returns the account's count for 'latest' or 'pending'."""
+        self._get_transaction_count = get_transaction_count
+        self.state_path = state_path
+        self._next: Optional[int] = None
+        self._gaps: List[int] = []
+        self._in_flight: Dict[int, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> Optional[int]:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)['next_nonce']
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable nonce state {self.state_path}: {e}")
+            return None
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'next_nonce': self._next}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def _sync(self) -> None:
+        pending = self._get_transaction_count('pending')
+        persisted = self._load_state()
+        known = max(n for n in (self._next, persisted, pending) if n is not None)
+        # Anything the node does not know about below our high-water mark is a gap
+        self._gaps = [n for n in range(pending, known) if n not in self._in_flight]
+        heapq.heapify(self._gaps)
+        self._next = known
+        self._save_state()
+        if self._gaps:
+            logging.info(f"Nonce sync: pending={pending}, next={known}, refilling {len(self._gaps)} gaps")
+
+    def allocate(self) -> int:
+        """Reserve the next nonce, preferring the lowest unfilled gap."""
+        with self._lock:
+            if self._next is None:
+                self._sync()
+            if self._gaps:
+                nonce = heapq.heappop(self._gaps)
+            else:
+                nonce = self._next
+                self._next += 1
+                self._save_state()
+            self._in_flight[nonce] = None
+            return nonce
+
+    def mark_sent(self, nonce: int, tx_hash: str) -> None:
+        """Record that the transaction using `nonce` was accepted by the node."""
+        with self._lock:
+            self._in_flight[nonce] = tx_hash
+
+    def release(self, nonce: int) -> None:
+        """Return a nonce whose transaction was never broadcast."""
+        with self._lock:
+            if self._in_flight.pop(nonce, False) is not False:
+                heapq.heappush(self._gaps, nonce)
+
+    def resync(self) -> None:
+        """Reconcile with the chain after a dropped, replaced or rejected transaction.
+
+        Nonces below the confirmed count are finished. In-flight nonces the node
+        no longer reports as pending were dropped and become gaps to refill.
+        """
+        with self._lock:
+            latest = self._get_transaction_count('latest')
+            pending = self._get_transaction_count('pending')
+            for nonce in list(self._in_flight):
+                if nonce < latest:
+                    del self._in_flight[nonce]
+                elif nonce >= pending and self._in_flight[nonce] is not None:
+                    logging.warning(f"Transaction {self._in_flight[nonce]} with nonce {nonce} was dropped")
+                    del self._in_flight[nonce]
+            if self._next is None or self._next < pending:
+                self._next = pending
+            self._gaps = [n for n in range(pending, self._next) if n not in self._in_flight]
+            heapq.heapify(self._gaps)
+            self._save_state()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
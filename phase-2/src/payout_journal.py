@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Stage order for one recipient. 'broadcasting' and 'minting' are written
+# before the corresponding send, so a crash mid-send leaves the item in doubt
+# instead of silently eligible for a second payment. An in-doubt item carries
+# what is needed to look the send up: the `ref` its Bitcoin transaction is
+# tagged with, or the K2 transaction hash, recorded once signed.
+STAGES = ('created', 'broadcasting', 'broadcast', 'confirmed', 'minting', 'minted')
+IN_DOUBT_STAGES = ('broadcasting', 'minting')
+
+
+class PayoutJournal:
+    """Append-only, per-recipient record of payout stage transitions.
+
+    Every transition is appended to `payout_events` and mirrored into
+    `payout_items`, which holds the latest stage per recipient. A partial index
+    over unfinished items keeps recovery proportional to the work left rather
+    than the size of the run: `open_run` only reads unfinished items. The
+    database runs in WAL mode with full sync so a committed transition
+    survives a crash.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS payout_items (
+                    run_id TEXT NOT NULL,
+                    item INTEGER NOT NULL,
+                    recipient TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    stage TEXT NOT NULL,
+                    txid TEXT,
+                    tx_hash TEXT,
+                    ref TEXT,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (run_id, item)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_payout_items_unfinished
+                ON payout_items (run_id, item) WHERE stage != 'minted'
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS payout_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    item INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    txid TEXT,
+                    tx_hash TEXT,
+                    ref TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            # Journals created before `ref` existed
+            for table in ('payout_items', 'payout_events'):
+                columns = {row['name'] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+                if 'ref' not in columns:
+                    self.conn.execute(f'ALTER TABLE {table} ADD COLUMN ref TEXT')
+
+    def open_run(self, run_id: str, rewards: List[Dict[str, float]]) -> Dict[int, Dict]:
+        """Register a run's rewards and return the journaled state of each unfinished item.
+
+        Minted items are left out, so resuming reads only the work that is
+        left; new runs start every item at 'created'. Raises ValueError if the
+        run was registered with a different number of items, or if an
+        unfinished, first or last item's recipient or amount differs, which
+        means the run id was reused for a different reward list.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self.conn:
+            known = self.conn.execute('SELECT MAX(item) FROM payout_items WHERE run_id = ?', (run_id,)).fetchone()[0]
+            known = 0 if known is None else known + 1
+            if known and known != len(rewards):
+                raise ValueError(f"Run {run_id} has {known} journaled payouts, not {len(rewards)}")
+            states = {row['item']: dict(row) for row in self.conn.execute(
+                "SELECT * FROM payout_items WHERE run_id = ? AND stage != 'minted'", (run_id,))}
+            checked = list(states.values())
+            # Finished items are not read, except the first and last as a cheap check
+            ends = {0, known - 1} - set(states) if known else set()
+            for item in ends:
+                checked.append(dict(self.conn.execute(
+                    'SELECT * FROM payout_items WHERE run_id = ? AND item = ?', (run_id, item)).fetchone()))
+            for row in checked:
+                reward = rewards[row['item']]
+                if row['recipient'] != reward['recipient'] or abs(row['amount'] - reward['amount']) > 1e-12:
+                    raise ValueError(f"Run {run_id} item {row['item']} does not match the journaled payout")
+            new_items = [(run_id, item, r['recipient'], r['amount'], 'created', now)
+                         for item, r in enumerate(rewards) if item >= known]
+            self.conn.executemany('''
+                INSERT INTO payout_items (run_id, item, recipient, amount, stage, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', new_items)
+            self.conn.executemany('''
+                INSERT INTO payout_events (run_id, item, stage, created_at) VALUES (?, ?, ?, ?)
+            ''', [(run_id, item, 'created', now) for _, item, _, _, _, _ in new_items])
+        for _, item, recipient, amount, stage, _ in new_items:
+            states[item] = {'run_id': run_id, 'item': item, 'recipient': recipient, 'amount': amount,
+                            'stage': stage, 'txid': None, 'tx_hash': None, 'ref': None, 'error': None}
+        return states
+
+    def record(self, run_id: str, items: Iterable[int], stage: str, txid: Optional[str] = None,
+               tx_hash: Optional[str] = None, ref: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Append a stage transition for one or more items in a single transaction."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown payout stage: {stage}")
+        items = list(items)
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self.conn:
+            self.conn.executemany('''
+                INSERT INTO payout_events (run_id, item, stage, txid, tx_hash, ref, error, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(run_id, item, stage, txid, tx_hash, ref, error, now) for item in items])
+            self.conn.executemany('''
+                UPDATE payout_items
+                SET stage = ?, txid = COALESCE(?, txid), tx_hash = COALESCE(?, tx_hash),
+                    ref = COALESCE(?, ref), error = ?, updated_at = ?
+                WHERE run_id = ? AND item = ?
+            ''', [(stage, txid, tx_hash, ref, error, now, run_id, item) for item in items])
+
+    def unfinished(self, run_id: Optional[str] = None) -> List[Dict]:
+        """Return items not yet minted, optionally limited to one run."""
+        query = "SELECT * FROM payout_items WHERE stage != 'minted'"
+        params = ()
+        if run_id is not None:
+            query += ' AND run_id = ?'
+            params = (run_id,)
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(query + ' ORDER BY run_id, item', params)]
+
+    def history(self, run_id: str, item: int) -> List[Dict]:
+        """Return every recorded transition for one item, oldest first."""
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(
+                'SELECT * FROM payout_events WHERE run_id = ? AND item = ? ORDER BY id', (run_id, item))]
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except Exception as e:
+            logging.error(f"Error closing payout journal: {e}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.balance_ledger import BalanceLedger, simulate_policy
+from src.btc_wrapper import BTCWrapper
+
+
+class TestBalanceLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ledger = BalanceLedger(os.path.join(self.tmp_dir.name, 'ledger.db'), min_payout=0.01, max_age=100)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp_dir.cleanup()
+
+    def test_small_rewards_accumulate_until_threshold(self):
+        for i in range(3):
+            self.ledger.credit_round(f'r{i}', [{'recipient': 'small', 'amount': 0.004},
+                                               {'recipient': 'big', 'amount': 0.02}], now=i)
+            due = self.ledger.due_payouts(f'r{i}', now=i)
+            if i < 2:
+                self.assertEqual([d['recipient'] for d in due], ['big'])
+            else:
+                self.assertEqual(due, [{'recipient': 'big', 'amount': 0.02}, {'recipient': 'small', 'amount': 0.012}])
+        self.assertEqual(self.ledger.balance('small'), 0.0)
+
+    def test_max_age_releases_dust(self):
+        self.ledger.credit_round('r0', [{'recipient': 'dust', 'amount': 0.0001}], now=0)
+        self.assertEqual(self.ledger.due_payouts('r0', now=50), [])
+        self.ledger.credit_round('r1', [], now=150)
+        self.assertEqual(self.ledger.due_payouts('r1', now=150), [{'recipient': 'dust', 'amount': 0.0001}])
+
+    def test_round_credited_once_and_due_list_frozen(self):
+        rewards = [{'recipient': 'a', 'amount': 0.02}]
+        self.assertTrue(self.ledger.credit_round('r0', rewards))
+        self.assertFalse(self.ledger.credit_round('r0', rewards))
+        first = self.ledger.due_payouts('r0')
+        self.ledger.credit_round('r1', rewards)
+        self.assertEqual(self.ledger.due_payouts('r0'), first)
+        self.assertEqual(self.ledger.balance('a'), 0.02)
+
+    def test_failed_payouts_stay_reserved_until_released(self):
+        self.ledger.credit_round('r0', [{'recipient': 'a', 'amount': 0.02}, {'recipient': 'b', 'amount': 0.03}])
+        self.ledger.due_payouts('r0')
+        results = [{'recipient': 'a', 'status': 'success'}, {'recipient': 'b', 'status': 'failed'}]
+        self.assertEqual(self.ledger.settle('r0', results), 1)
+        self.assertEqual(self.ledger.settle('r0', results), 0)
+        # b's amount is not offered to a later round while r0 may still pay it
+        self.ledger.credit_round('r1', [])
+        self.assertEqual(self.ledger.due_payouts('r1'), [])
+        self.assertEqual(self.ledger.release_unpaid('r0'), 1)
+        self.assertEqual(self.ledger.balance('b'), 0.03)
+
+    def test_policy_report(self):
+        for i in range(10):
+            self.ledger.credit_round(f'r{i}', [{'recipient': 'small', 'amount': 0.002},
+                                               {'recipient': 'big', 'amount': 0.05}], now=i)
+        report = self.ledger.policy_report(fee_per_payout=0.0001)
+        self.assertEqual(report['payouts_without_ledger'], 20)
+        self.assertEqual(report['payouts_with_ledger'], 12)
+        self.assertAlmostEqual(report['fees_saved'], 0.0008)
+        self.assertEqual(report['carried_over_recipients'], 0)
+
+    def test_simulate_policy_carries_over_remainder(self):
+        rounds = [(i, [{'recipient': 'x', 'amount': 0.003}]) for i in range(5)]
+        report = simulate_policy(rounds, min_payout=0.01)
+        self.assertEqual(report['payouts_with_ledger'], 1)
+        self.assertEqual(report['carried_over_recipients'], 1)
+        self.assertAlmostEqual(report['carried_over_amount'], 0.003)
+
+
+class TestDistributeRound(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.wrapper = BTCWrapper.__new__(BTCWrapper)
+        self.wrapper.config = {
+            'batch_size': 4,
+            'retry_attempts': 1,
+            'retry_delay': 0,
+            'min_payout': 0.01,
+            'balance_ledger_file': os.path.join(self.tmp_dir.name, 'ledger.db'),
+            'payout_journal_file': os.path.join(self.tmp_dir.name, 'journal.db')
+        }
+        self.wrapper._create_bitcoin_tx = MagicMock(return_value='txid')
+        self.wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        self.wrapper._mint_k2_tokens = MagicMock(side_effect=lambda amount, recipient, on_signed=None: f'k2_{recipient}')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_only_due_recipients_are_paid(self):
+        rewards = [{'recipient': '0xsmall', 'amount': 0.004}, {'recipient': '0xbig', 'amount': 0.02}]
+        for i in range(3):
+            await self.wrapper.distribute_round(f'round-{i}', rewards)
+        paid = [c.args[1] for c in self.wrapper._mint_k2_tokens.call_args_list]
+        self.assertEqual(paid.count('0xbig'), 3)
+        self.assertEqual(paid.count('0xsmall'), 1)
+
+    async def test_rerun_of_round_does_not_double_pay(self):
+        rewards = [{'recipient': '0xbig', 'amount': 0.02}]
+        await self.wrapper.distribute_round('round-0', rewards)
+        results = await self.wrapper.distribute_round('round-0', rewards)
+        self.assertEqual(results[0]['status'], 'success')
+        self.assertEqual(self.wrapper._mint_k2_tokens.call_count, 1)
+        self.assertEqual(self.wrapper.balance_ledger.balance('0xbig'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
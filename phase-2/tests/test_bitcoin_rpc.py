@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bitcoin_rpc import AsyncBitcoinRPC, BitcoinRPCError
+from benchmarks.rpc_standins import BitcoinStandIn
+
+
+class TestAsyncBitcoinRPC(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.node = BitcoinStandIn()
+        self.rpc = AsyncBitcoinRPC(self.node.start(), user='user', password='pass', pool_size=4, timeout=5)
+
+    async def asyncTearDown(self):
+        await self.rpc.close()
+        self.node.stop()
+
+    async def test_call(self):
+        self.node.mine_block()
+        self.assertEqual(await self.rpc.call('getblockcount'), 1)
+
+    async def test_call_raises_rpc_error(self):
+        with self.assertRaises(BitcoinRPCError) as ctx:
+            await self.rpc.call('gettransaction', 'missing')
+        self.assertEqual(ctx.exception.code, -5)
+
+    async def test_batch_is_one_request_in_order(self):
+        txid = await self.rpc.call('sendtoaddress', 'bc1qtest', 0.1)
+        requests_before = self.node.requests
+
+        results = await self.rpc.batch([
+            ('getblockcount', []),
+            ('gettransaction', [txid]),
+            ('gettransaction', ['missing'])
+        ])
+
+        self.assertEqual(self.node.requests - requests_before, 1)
+        self.assertEqual(results[0], (0, None))
+        self.assertEqual(results[1][0]['txid'], txid)
+        self.assertEqual(results[2][1]['code'], -5)
+
+
+if __name__ == '__main__':
+    unittest.main()
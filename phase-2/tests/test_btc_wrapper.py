@@ -4,30 +4,46 @@ import os
 import sys
 import json
 import asyncio
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
+from cryptography.fernet import Fernet
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.btc_wrapper import BTCWrapper
+from src.btc_wrapper import BTCWrapper, WrapperError, never_sent
+from src.bitcoin_rpc import BitcoinRPCError
 
-class TestBTCWrapper(unittest.TestCase):
+TEST_PRIVATE_KEY = bytes.fromhex('4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318')
+
+class TestBTCWrapper(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         """Set up test environment."""
-        self.config_path = 'config/test_wrapper_config.json'
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp_dir.name, 'test_wrapper_config.json')
+        self._create_test_keys()
         self._create_test_config()
         self.wrapper = BTCWrapper(self.config_path)
         
+    def _create_test_keys(self):
+        """Create a Fernet key and the K2 signing key encrypted with it."""
+        fernet_key = Fernet.generate_key()
+        with open(os.path.join(self.tmp_dir.name, 'test_fernet_key.txt'), 'w') as f:
+            f.write(fernet_key.decode())
+        with open(os.path.join(self.tmp_dir.name, 'test_key.txt'), 'w') as f:
+            f.write(Fernet(fernet_key).encrypt(TEST_PRIVATE_KEY).decode())
+        
     def _create_test_config(self):
         """Create test configuration file."""
         config = {
             "bitcoin_rpc_url": "http://localhost",
             "bitcoin_rpc_port": 8332,
-            "bitcoin_conf_path": "test_bitcoin.conf",
+            "bitcoin_conf_path": os.path.join(self.tmp_dir.name, "test_bitcoin.conf"),
             "k2_rpc_url": "http://localhost:8545",
-            "key_file": "test_key.txt",
-            "fernet_key_file": "test_fernet_key.txt",
+            "key_file": os.path.join(self.tmp_dir.name, "test_key.txt"),
+            "fernet_key_file": os.path.join(self.tmp_dir.name, "test_fernet_key.txt"),
+            "nonce_state_file": os.path.join(self.tmp_dir.name, "k2_nonce.json"),
             "wrapper_address": "bc1qtest",
             "min_confirmations": 1,
             "gas_price": 20,
@@ -37,11 +53,10 @@ class TestBTCWrapper(unittest.TestCase):
             "retry_delay": 1,
             "log_level": "INFO"
         }
-        os.makedirs('config', exist_ok=True)
         with open(self.config_path, 'w') as f:
             json.dump(config, f)
             
-    @patch('src.btc_wrapper.RawProxy')
+    @patch('src.btc_wrapper.AsyncBitcoinRPC')
     def test_init_bitcoin_rpc(self, mock_rpc):
         """Test Bitcoin RPC initialization."""
         mock_rpc.return_value = MagicMock()
@@ -63,13 +78,35 @@ class TestBTCWrapper(unittest.TestCase):
         wrapper = BTCWrapper(self.config_path)
         self.assertIsNotNone(wrapper.fernet)
         
-    @patch('src.btc_wrapper.Account')
+    @patch('eth_account.Account')
     def test_init_account(self, mock_account):
         """Test account initialization."""
         mock_account.from_key.return_value = MagicMock()
         wrapper = BTCWrapper(self.config_path)
         self.assertIsNotNone(wrapper.account)
         
+    def test_account_decrypted_with_fernet_key(self):
+        """The signing key is decrypted with the configured Fernet key."""
+        from eth_account import Account
+        self.assertEqual(self.wrapper.account.address, Account.from_key(TEST_PRIVATE_KEY).address)
+        
+    @patch('web3.Web3')
+    def test_construction_is_lazy(self, mock_web3):
+        """Constructing the wrapper makes no connections."""
+        wrapper = BTCWrapper(self.config_path)
+        mock_web3.assert_not_called()
+        self.assertNotIn('btc_rpc', wrapper.__dict__)
+        self.assertNotIn('account', wrapper.__dict__)
+        
+    @patch('web3.Web3')
+    def test_failures_raise_instead_of_exiting(self, mock_web3):
+        """Connection and config failures raise WrapperError."""
+        mock_web3.return_value.is_connected.return_value = False
+        with self.assertRaises(WrapperError):
+            self.wrapper.web3
+        with self.assertRaises(WrapperError):
+            BTCWrapper(os.path.join(self.tmp_dir.name, 'missing.json'))
+        
     @patch('src.btc_wrapper.BTCWrapper._create_bitcoin_tx')
     @patch('src.btc_wrapper.BTCWrapper._wait_for_confirmation')
     @patch('src.btc_wrapper.BTCWrapper._mint_k2_tokens')
@@ -81,30 +118,160 @@ class TestBTCWrapper(unittest.TestCase):
         tx_hash = await self.wrapper.wrap_rewards(0.1, "0x123...")
         self.assertEqual(tx_hash, "test_k2_tx_hash")
         
-    @patch('src.btc_wrapper.BTCWrapper.wrap_rewards')
-    async def test_distribute_rewards(self, mock_wrap):
+    @patch('src.btc_wrapper.BTCWrapper._create_bitcoin_tx')
+    @patch('src.btc_wrapper.BTCWrapper._wait_for_confirmation')
+    @patch('src.btc_wrapper.BTCWrapper._mint_k2_tokens')
+    async def test_distribute_rewards(self, mock_mint, mock_wait, mock_create):
         """Test reward distribution."""
-        mock_wrap.return_value = "test_tx_hash"
+        mock_create.return_value = "test_txid"
+        mock_mint.return_value = "test_tx_hash"
         rewards = [
             {'amount': 0.1, 'recipient': '0x123...'},
             {'amount': 0.2, 'recipient': '0x456...'}
         ]
         
-        tx_hashes = await self.wrapper.distribute_rewards(rewards)
-        self.assertEqual(len(tx_hashes), 2)
-        self.assertEqual(tx_hashes[0], "test_tx_hash")
-        self.assertEqual(tx_hashes[1], "test_tx_hash")
+        results = await self.wrapper.distribute_rewards(rewards)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['tx_hash'], "test_tx_hash")
+        self.assertEqual(results[1]['tx_hash'], "test_tx_hash")
         
     def tearDown(self):
         """Clean up test environment."""
-        if os.path.exists(self.config_path):
-            os.remove(self.config_path)
-        if os.path.exists('test_bitcoin.conf'):
-            os.remove('test_bitcoin.conf')
-        if os.path.exists('test_key.txt'):
-            os.remove('test_key.txt')
-        if os.path.exists('test_fernet_key.txt'):
-            os.remove('test_fernet_key.txt')
+        self.tmp_dir.cleanup()
+
+class TestDistributionPipeline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        """Build a wrapper without connecting to any node."""
+        self.wrapper = BTCWrapper.__new__(BTCWrapper)
+        self.wrapper.config = {'batch_size': 4, 'retry_attempts': 3, 'retry_delay': 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _tracked(self, value):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return value
+
+    async def test_results_in_order_with_bounded_concurrency(self):
+        self.wrapper._create_bitcoin_tx = lambda amount, comment=None: self._tracked(f"txid_{amount}")
+        self.wrapper._wait_for_confirmation = lambda txid: asyncio.sleep(0.05)
+        self.wrapper._mint_k2_tokens = lambda amount, recipient, on_signed=None: self._tracked(f"k2_{recipient}")
+        rewards = [{'amount': i, 'recipient': f'0x{i}'} for i in range(20)]
+
+        results = await self.wrapper.distribute_rewards(rewards)
+
+        self.assertEqual([r['tx_hash'] for r in results], [f'k2_0x{i}' for i in range(20)])
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.assertLessEqual(self.max_in_flight, 4)
+
+    async def test_stage_retried_then_succeeds(self):
+        attempts = []
+
+        def flaky_create(amount, comment=None):
+            attempts.append(amount)
+            if len(attempts) < 3:
+                raise ConnectionRefusedError("rpc unavailable")
+            return "txid"
+
+        self.wrapper._create_bitcoin_tx = flaky_create
+        self.wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        self.wrapper._mint_k2_tokens = MagicMock(return_value="k2_hash")
+
+        results = await self.wrapper.distribute_rewards([{'amount': 0.1, 'recipient': '0x1'}])
+
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(results[0]['status'], 'success')
+        self.wrapper._mint_k2_tokens.assert_called_once_with(0.1, '0x1', None)
+
+    async def test_ambiguous_send_error_not_retried(self):
+        self.wrapper._create_bitcoin_tx = MagicMock(side_effect=asyncio.TimeoutError())
+        self.wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        self.wrapper._mint_k2_tokens = MagicMock(return_value="k2_hash")
+
+        results = await self.wrapper.distribute_rewards([{'amount': 0.1, 'recipient': '0x1'}])
+
+        # The node may have sent it before timing out, so it must not be sent again
+        self.wrapper._create_bitcoin_tx.assert_called_once()
+        self.assertEqual(results[0]['status'], 'failed')
+        self.wrapper._mint_k2_tokens.assert_not_called()
+
+    def test_never_sent(self):
+        self.assertTrue(never_sent(ConnectionRefusedError()))
+        self.assertTrue(never_sent(BitcoinRPCError({'code': -6, 'message': 'Insufficient funds'})))
+        wrapped = Exception('connection failed')
+        wrapped.__cause__ = ConnectionRefusedError()
+        self.assertTrue(never_sent(wrapped))
+        self.assertFalse(never_sent(asyncio.TimeoutError()))
+        self.assertFalse(never_sent(ConnectionResetError()))
+
+    async def test_partial_failure_does_not_abort_batch(self):
+        def mint(amount, recipient, on_signed=None):
+            if recipient == '0xbad':
+                raise Exception("mint reverted")
+            return f"k2_{recipient}"
+
+        self.wrapper._create_bitcoin_tx = MagicMock(return_value="txid")
+        self.wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        self.wrapper._mint_k2_tokens = mint
+        rewards = [
+            {'amount': 0.1, 'recipient': '0x1'},
+            {'amount': 0.2, 'recipient': '0xbad'},
+            {'amount': 0.3, 'recipient': '0x3'}
+        ]
+
+        results = await self.wrapper.distribute_rewards(rewards)
+
+        self.assertEqual([r['status'] for r in results], ['success', 'failed', 'success'])
+        self.assertEqual(results[1]['txid'], "txid")
+        self.assertIn('mint', results[1]['error'])
+        self.assertEqual(self.wrapper._create_bitcoin_tx.call_count, 3)
+
+class TestBatchPayouts(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        """Build a wrapper without connecting to any node."""
+        self.wrapper = BTCWrapper.__new__(BTCWrapper)
+        self.wrapper.config = {
+            'wrapper_address': 'bc1qtest',
+            'batch_size': 2,
+            'max_batch_outputs': 3,
+            'retry_attempts': 1,
+            'retry_delay': 0
+        }
+        self.wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        self.rewards = [{'amount': 0.1 * (i + 1), 'recipient': f'0x{i}'} for i in range(7)]
+
+    async def test_one_transaction_and_mint_per_chunk(self):
+        outputs = []
+        mints = []
+        self.wrapper._create_bitcoin_batch_tx = lambda out, comment=None: outputs.append(out) or f"txid_{len(outputs)}"
+        self.wrapper._mint_k2_tokens_batch = lambda batch, on_signed=None: mints.append(batch) or f"k2_{len(mints)}"
+
+        results = await self.wrapper.distribute_rewards(self.rewards, batch=True)
+
+        self.assertEqual(len(outputs), 3)
+        self.assertEqual([len(m) for m in mints], [3, 3, 1])
+        self.assertAlmostEqual(outputs[0]['bc1qtest'], 0.6)
+        self.assertEqual(len(results), 7)
+        self.assertEqual([r['recipient'] for r in results], [r['recipient'] for r in self.rewards])
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+
+    async def test_failed_chunk_reported_per_recipient(self):
+        def create(out, comment=None):
+            if abs(out['bc1qtest'] - 1.5) < 1e-9:
+                raise Exception("insufficient funds")
+            return "txid"
+
+        self.wrapper._create_bitcoin_batch_tx = create
+        self.wrapper._mint_k2_tokens_batch = MagicMock(return_value="k2_hash")
+
+        results = await self.wrapper.distribute_rewards(self.rewards, batch=True)
+
+        self.assertEqual([r['status'] for r in results],
+                         ['success'] * 3 + ['failed'] * 3 + ['success'])
+        self.assertIn('create', results[3]['error'])
+        self.assertEqual(self.wrapper._mint_k2_tokens_batch.call_count, 2)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import asyncio
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.confirmation_watcher import ConfirmationWatcher, ConfirmationError
+
+
+class FakeNode:
+    """Answers batched getblockcount/gettransaction calls from an in-memory chain."""
+
+    def __init__(self):
+        self.height = 100
+        self.mined_at = {}
+        self.batches = []
+
+    async def batch(self, calls):
+        self.batches.append([method for method, _ in calls])
+        results = []
+        for method, params in calls:
+            if method == 'getblockcount':
+                results.append((self.height, None))
+            elif params[0] not in self.mined_at:
+                results.append((None, {'code': -5, 'message': 'Invalid or non-wallet transaction id'}))
+            elif self.mined_at[params[0]] is None:
+                results.append(({'txid': params[0], 'confirmations': 0}, None))
+            else:
+                results.append(({'txid': params[0], 'confirmations': self.height - self.mined_at[params[0]] + 1}, None))
+        return results
+
+    def mine(self, txids=()):
+        self.height += 1
+        for txid in txids:
+            self.mined_at[txid] = self.height
+
+
+class TestConfirmationWatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.node = FakeNode()
+        self.watcher = ConfirmationWatcher(self.node.batch, poll_interval=0.01)
+
+    def gettransaction_passes(self):
+        return sum(1 for batch in self.node.batches if 'gettransaction' in batch)
+
+    async def test_many_waiters_share_one_pass_per_block(self):
+        txids = [f'tx{i}' for i in range(50)]
+        for txid in txids:
+            self.node.mined_at[txid] = None
+        waiters = [asyncio.ensure_future(self.watcher.wait(txid, 2)) for txid in txids]
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.watcher.pending, 50)
+
+        self.node.mine(txids)
+        await asyncio.sleep(0.05)
+        self.node.mine()
+        results = await asyncio.wait_for(asyncio.gather(*waiters), 1)
+
+        self.assertTrue(all(result['confirmations'] >= 2 for result in results))
+        self.assertEqual(self.watcher.pending, 0)
+        self.assertLessEqual(self.gettransaction_passes(), 3)
+        self.assertEqual(self.watcher.stats()['confirmed'], 50)
+
+    async def test_different_targets_on_same_txid(self):
+        self.node.mined_at['tx'] = None
+        shallow = asyncio.ensure_future(self.watcher.wait('tx', 1))
+        deep = asyncio.ensure_future(self.watcher.wait('tx', 3))
+        self.node.mine(['tx'])
+        await asyncio.wait_for(shallow, 1)
+        self.assertFalse(deep.done())
+
+        self.node.mine()
+        self.node.mine()
+        result = await asyncio.wait_for(deep, 1)
+        self.assertEqual(result['confirmations'], 3)
+
+    async def test_unknown_transaction_fails_waiter(self):
+        with self.assertRaises(ConfirmationError):
+            await asyncio.wait_for(self.watcher.wait('missing', 1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
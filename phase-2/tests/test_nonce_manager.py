@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.nonce_manager import NonceManager
+from src.btc_wrapper import BTCWrapper, InDoubtError
+
+TEST_PRIVATE_KEY = bytes.fromhex('4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318')
+
+
+class FakeChain:
+    """Transaction counts for one account."""
+
+    def __init__(self, latest=0, pending=0):
+        self.latest = latest
+        self.pending = pending
+        self.calls = 0
+
+    def __call__(self, block_identifier):
+        self.calls += 1
+        return self.latest if block_identifier == 'latest' else self.pending
+
+
+class TestNonceManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp_dir.name, 'nonce.json')
+        self.chain = FakeChain(latest=5, pending=7)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_sequential_allocation_fetches_once(self):
+        manager = NonceManager(self.chain, self.state_path)
+        self.assertEqual([manager.allocate() for _ in range(4)], [7, 8, 9, 10])
+        self.assertEqual(self.chain.calls, 1)
+        self.assertEqual(manager.in_flight, 4)
+
+    def test_released_nonce_reused_first(self):
+        manager = NonceManager(self.chain, self.state_path)
+        first, second, third = manager.allocate(), manager.allocate(), manager.allocate()
+        manager.release(second)
+        self.assertEqual(manager.allocate(), second)
+        self.assertEqual(manager.allocate(), third + 1)
+
+    def test_restart_refills_unbroadcast_nonces(self):
+        manager = NonceManager(self.chain, self.state_path)
+        for nonce in range(3):
+            manager.mark_sent(manager.allocate(), f'0x{nonce}')
+        # Only the first of the three transactions reached the node before the crash
+        self.chain.pending = 8
+
+        restarted = NonceManager(self.chain, self.state_path)
+        self.assertEqual([restarted.allocate() for _ in range(3)], [8, 9, 10])
+
+    def test_restart_never_reuses_pending_nonce(self):
+        manager = NonceManager(self.chain, self.state_path)
+        for _ in range(3):
+            manager.mark_sent(manager.allocate(), '0xabc')
+        self.chain.pending = 10
+
+        restarted = NonceManager(self.chain, self.state_path)
+        self.assertEqual(restarted.allocate(), 10)
+
+    def test_resync_fills_gap_left_by_dropped_transaction(self):
+        manager = NonceManager(self.chain, self.state_path)
+        for nonce in range(3):
+            manager.mark_sent(manager.allocate(), f'0x{nonce}')
+        # Nonce 7 was mined, nonce 8 was dropped from the mempool, nonce 9 stays in flight locally
+        self.chain.latest = 8
+        self.chain.pending = 8
+        manager._in_flight[9] = None
+
+        manager.resync()
+
+        self.assertEqual(manager.allocate(), 8)
+        self.assertEqual(manager.allocate(), 10)
+
+
+class TestMintNonces(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        from eth_account import Account
+        self.wrapper = BTCWrapper.__new__(BTCWrapper)
+        self.wrapper.config = {
+            'k2_token_contract': '0x' + '11' * 20,
+            'k2_chain_id': 1337,
+            'gas_limit': 100000,
+            'gas_price': 20
+        }
+        self.wrapper.account = Account.from_key(TEST_PRIVATE_KEY)
+        self.wrapper.web3 = MagicMock()
+        build = self.wrapper.web3.eth.contract.return_value.functions.mint.return_value.build_transaction
+        build.side_effect = lambda fields: dict(fields, to='0x' + '11' * 20, value=0, data=b'')
+        self.build = build
+        self.wrapper.nonce_manager = NonceManager(FakeChain(pending=3))
+
+    def _nonces(self):
+        return [call.args[0]['nonce'] for call in self.build.call_args_list]
+
+    async def test_refused_send_releases_nonce(self):
+        self.wrapper.web3.eth.send_raw_transaction.side_effect = [ConnectionRefusedError(), b'\x01' * 32]
+
+        with self.assertRaises(ConnectionRefusedError):
+            await self.wrapper._mint_k2_tokens(0.5, '0x' + '33' * 20)
+        tx_hash = await self.wrapper._mint_k2_tokens(0.5, '0x' + '33' * 20)
+
+        self.assertTrue(tx_hash.startswith('0x'))
+        self.assertEqual(self._nonces(), [3, 3])
+
+    async def test_timed_out_send_keeps_nonce_in_flight(self):
+        from web3.exceptions import TransactionNotFound
+        self.wrapper.web3.eth.send_raw_transaction.side_effect = TimeoutError('read timed out')
+        self.wrapper.web3.eth.get_transaction.side_effect = TransactionNotFound('not found')
+
+        with self.assertRaises(InDoubtError):
+            await self.wrapper._mint_k2_tokens(0.5, '0x' + '33' * 20)
+
+        # The nonce is neither reused nor resynced away while the node may still have the transaction
+        self.assertEqual(self.wrapper.nonce_manager.in_flight, 1)
+        self.assertEqual(self.wrapper.nonce_manager.allocate(), 4)
+
+    async def test_timed_out_send_found_on_node_succeeds(self):
+        self.wrapper.web3.eth.send_raw_transaction.side_effect = TimeoutError('read timed out')
+        self.wrapper.web3.eth.get_transaction.return_value = {'blockNumber': None}
+
+        tx_hash = await self.wrapper._mint_k2_tokens(0.5, '0x' + '33' * 20)
+
+        self.wrapper.web3.eth.get_transaction.assert_called_once_with(tx_hash)
+        self.wrapper.web3.eth.send_raw_transaction.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import ANY, AsyncMock, MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.payout_journal import PayoutJournal
+from src.btc_wrapper import BTCWrapper, WrapperError
+
+
+class TestPayoutJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'journal.db')
+        self.journal = PayoutJournal(self.path)
+        self.rewards = [{'amount': 0.1, 'recipient': '0x1'}, {'amount': 0.2, 'recipient': '0x2'}]
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp_dir.cleanup()
+
+    def test_wal_mode(self):
+        mode = self.journal.conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_state_survives_reopen(self):
+        self.journal.open_run('run', self.rewards)
+        self.journal.record('run', [0], 'broadcast', txid='abc')
+        self.journal.record('run', [0], 'confirmed')
+        self.journal.close()
+
+        reopened = PayoutJournal(self.path)
+        states = reopened.open_run('run', self.rewards)
+        self.assertEqual(states[0]['stage'], 'confirmed')
+        self.assertEqual(states[0]['txid'], 'abc')
+        self.assertEqual(states[1]['stage'], 'created')
+        self.assertEqual([e['stage'] for e in reopened.history('run', 0)], ['created', 'broadcast', 'confirmed'])
+        reopened.close()
+
+    def test_open_run_returns_only_unfinished_items(self):
+        self.journal.open_run('run', self.rewards)
+        self.journal.record('run', [0], 'minted', tx_hash='0xk2')
+        states = self.journal.open_run('run', self.rewards)
+        self.assertEqual(list(states), [1])
+        with self.assertRaises(ValueError):
+            self.journal.open_run('run', self.rewards + [{'amount': 0.3, 'recipient': '0x3'}])
+
+    def test_unfinished_excludes_minted(self):
+        self.journal.open_run('run', self.rewards)
+        self.journal.record('run', [0], 'minted', tx_hash='0xk2')
+        self.assertEqual([row['item'] for row in self.journal.unfinished('run')], [1])
+
+    def test_reused_run_id_with_different_rewards(self):
+        self.journal.open_run('run', self.rewards)
+        with self.assertRaises(ValueError):
+            self.journal.open_run('run', [{'amount': 0.5, 'recipient': '0x1'}])
+
+    def test_timestamps_are_utc(self):
+        self.journal.open_run('run', self.rewards)
+        self.assertTrue(self.journal.history('run', 0)[0]['created_at'].endswith('+00:00'))
+
+
+class TestResumableDistribution(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        """Build a journaling wrapper without connecting to any node."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {
+            'wrapper_address': 'bc1qtest',
+            'batch_size': 4,
+            'max_batch_outputs': 2,
+            'retry_attempts': 1,
+            'retry_delay': 0,
+            'payout_journal_file': os.path.join(self.tmp_dir.name, 'journal.db')
+        }
+        self.wrapper = self._wrapper()
+        self.rewards = [{'amount': 0.1 * (i + 1), 'recipient': f'0x{i}'} for i in range(5)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _wrapper(self):
+        wrapper = BTCWrapper.__new__(BTCWrapper)
+        wrapper.config = dict(self.config)
+        wrapper._create_bitcoin_tx = MagicMock(side_effect=lambda amount, comment=None: f"txid_{amount}")
+        wrapper._create_bitcoin_batch_tx = MagicMock(return_value="batch_txid")
+        wrapper._wait_for_confirmation = MagicMock(return_value=None)
+        wrapper._mint_k2_tokens = MagicMock(side_effect=lambda amount, recipient, on_signed=None: f"k2_{recipient}")
+        wrapper._mint_k2_tokens_batch = MagicMock(return_value="k2_batch")
+        return wrapper
+
+    async def test_rerun_skips_paid_and_resumes_failed(self):
+        def mint(amount, recipient, on_signed=None):
+            if recipient == '0x2':
+                raise Exception("mint reverted")
+            return f"k2_{recipient}"
+        self.wrapper._mint_k2_tokens = MagicMock(side_effect=mint)
+
+        first = await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+        self.assertEqual([r['status'] for r in first], ['success'] * 2 + ['failed'] + ['success'] * 2)
+
+        restarted = self._wrapper()
+        second = await restarted.distribute_rewards(self.rewards, run_id='round-1')
+
+        self.assertTrue(all(r['status'] == 'success' for r in second))
+        # Only the failed mint is retried: it never signed a transaction, so nothing can be on K2.
+        # Nothing is paid on Bitcoin again.
+        restarted._create_bitcoin_tx.assert_not_called()
+        restarted._wait_for_confirmation.assert_not_called()
+        restarted._mint_k2_tokens.assert_called_once_with(self.rewards[2]['amount'], '0x2', ANY)
+
+    async def test_broadcast_item_resumes_at_confirmation(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [1], 'broadcast', txid='earlier_txid')
+
+        results = await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+
+        self.assertEqual(results[1]['txid'], 'earlier_txid')
+        self.assertEqual(self.wrapper._create_bitcoin_tx.call_count, 4)
+        self.wrapper._wait_for_confirmation.assert_any_call('earlier_txid')
+
+    async def test_interrupted_send_is_never_repeated(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [0], 'broadcasting')
+        self.wrapper.payout_journal.record('round-1', [3], 'minting', txid='t3')
+
+        results = await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+
+        self.assertEqual([r['status'] for r in results], ['failed', 'success', 'success', 'failed', 'success'])
+        self.assertIn('reconcile', results[0]['error'])
+        self.assertEqual(self.wrapper._create_bitcoin_tx.call_count, 3)
+        self.assertEqual(self.wrapper._mint_k2_tokens.call_count, 3)
+
+    async def test_batch_mode_resumes_by_shared_txid(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [0, 1], 'minted', txid='t0', tx_hash='k0')
+        self.wrapper.payout_journal.record('round-1', [2, 3], 'confirmed', txid='t1')
+
+        results = await self.wrapper.distribute_rewards(self.rewards, batch=True, run_id='round-1')
+
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.assertEqual(results[2]['txid'], 't1')
+        # Item 4 gets a fresh chunk; items 2-3 only need their mint
+        self.wrapper._create_bitcoin_batch_tx.assert_called_once()
+        self.assertEqual(self.wrapper._mint_k2_tokens_batch.call_count, 2)
+        self.assertEqual(self.wrapper.payout_journal.unfinished('round-1'), [])
+
+    async def test_ambiguous_send_stays_in_doubt(self):
+        self.wrapper._create_bitcoin_tx = MagicMock(side_effect=TimeoutError('read timed out'))
+
+        results = await self.wrapper.distribute_rewards(self.rewards[:1], run_id='round-1')
+
+        self.assertEqual(results[0]['status'], 'failed')
+        [row] = self.wrapper.payout_journal.unfinished('round-1')
+        self.assertEqual((row['stage'], row['ref']), ('broadcasting', 'round-1:0'))
+
+    async def test_refused_send_is_sent_again(self):
+        self.wrapper._create_bitcoin_tx = MagicMock(side_effect=ConnectionRefusedError())
+        await self.wrapper.distribute_rewards(self.rewards[:1], run_id='round-1')
+        self.assertEqual(self.wrapper.payout_journal.unfinished('round-1')[0]['stage'], 'created')
+
+        restarted = self._wrapper()
+        results = await restarted.distribute_rewards(self.rewards[:1], run_id='round-1')
+        self.assertEqual(results[0]['status'], 'success')
+
+    async def test_interrupted_broadcast_found_in_wallet(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [1], 'broadcasting', ref='round-1:1')
+        self.wrapper._find_bitcoin_send = AsyncMock(return_value='wallet_txid')
+
+        results = await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.wrapper._find_bitcoin_send.assert_awaited_once_with('round-1:1')
+        self.assertEqual(results[1]['txid'], 'wallet_txid')
+        self.assertEqual(self.wrapper._create_bitcoin_tx.call_count, 4)
+
+    async def test_interrupted_broadcast_missing_from_wallet_is_resent(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [1], 'broadcasting', ref='round-1:1')
+        self.wrapper._find_bitcoin_send = AsyncMock(return_value=None)
+
+        results = await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.wrapper._create_bitcoin_tx.assert_any_call(self.rewards[1]['amount'], 'koii-payout:round-1:1')
+        self.assertEqual(self.wrapper._create_bitcoin_tx.call_count, 5)
+
+    async def test_interrupted_mint_found_on_k2(self):
+        self.wrapper.payout_journal.open_run('round-1', self.rewards)
+        self.wrapper.payout_journal.record('round-1', [2, 3], 'minting', txid='t1', tx_hash='0xk2', ref='round-1:2')
+        self.wrapper._k2_transaction_known = AsyncMock(return_value=True)
+
+        results = await self.wrapper.distribute_rewards(self.rewards, batch=True, run_id='round-1')
+
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.assertEqual(results[2]['tx_hash'], '0xk2')
+        self.wrapper._k2_transaction_known.assert_awaited_once_with('0xk2')
+        # Items 0-1 and 4 are minted in two fresh chunks; the in-doubt chunk is not minted again
+        self.assertEqual(self.wrapper._mint_k2_tokens_batch.call_count, 2)
+
+    async def test_mismatched_run_raises(self):
+        await self.wrapper.distribute_rewards(self.rewards, run_id='round-1')
+        with self.assertRaises(WrapperError):
+            await self.wrapper.distribute_rewards(self.rewards[::-1], run_id='round-1')
+
+    async def test_run_id_required_with_journal(self):
+        with self.assertRaises(WrapperError):
+            await self.wrapper.distribute_rewards(self.rewards)
+        self.assertEqual(self.wrapper.payout_journal.unfinished(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 """
 Simplified kno-sdk module that doesn't require tree-sitter-languages
+
+Indexing and search run locally through kno_index: chunks are embedded with
+hashed TF-IDF vectors (NumPy only, no model download) whatever embedding
+method is requested. Search results, query embeddings and agent answers are
+cached per index version by kno_cache.
 """
 
 from enum import Enum
 from pathlib import Path
-import os
+import logging
+import subprocess
+
+from kno_index import KnoIndex, repo_path_for, EMBEDDING_METHOD
+from kno_cache import cache_for, cache_stats, cached_agent_query, normalize_query
+
+logger = logging.getLogger("kno-index")
 
 class EmbeddingMethod(str, Enum):
     OPENAI = "OpenAIEmbedding"
@@ -25,25 +36,27 @@ def clone_and_index(
     repo_url: str,
     branch: str = "main",
     embedding: EmbeddingMethod = EmbeddingMethod.SBERT,
-    cloned_repo_base_dir: str = "."
+    cloned_repo_base_dir: str = ".",
+    should_reindex: bool = False,
+    workers: int = None
 ) -> RepoIndex:
     """
-    Stub for the clone_and_index function.
-    In the full implementation, this would:
-    1. Clone or pull the repo
-    2. Extract code chunks
-    3. Generate embeddings
-    4. Store in a vector database
-    
-    This stub version just returns a RepoIndex with no actual indexing.
+    Clone the repo if it is not present yet and bring its local index up to date.
+
+    Only files changed since the last run are re-indexed unless should_reindex
+    is set. Files are chunked and embedded by `workers` processes (default:
+    one per core). The returned RepoIndex's vector_store is the KnoIndex.
     """
-    repo_name = repo_url.rstrip("/").split("/")[-1].removesuffix(".git")
-    repo_path = os.path.join(cloned_repo_base_dir, repo_name)
-    
-    # Create a mock digest
-    digest = f"Repository: {repo_name}\nBranch: {branch}\nEmbedding: {embedding.value}"
-    
-    return RepoIndex(path=Path(repo_path), digest=digest)
+    repo_path = repo_path_for(repo_url, cloned_repo_base_dir)
+    if not repo_path.exists():
+        subprocess.run(["git", "clone", "--branch", branch, repo_url, str(repo_path)],
+                       capture_output=True, text=True, check=True)
+
+    index = KnoIndex(repo_path)
+    stats = index.update(branch, full=should_reindex, workers=workers)
+    digest = (f"Repository: {repo_path.name}\nBranch: {branch}\nEmbedding: {embedding.value} "
+              f"(local hashed TF-IDF)\nIndex version: {stats['version']}\nChunks: {stats['total_chunks']}")
+    return RepoIndex(path=repo_path, digest=digest, vector_store=index)
 
 def search(
     repo_url: str,
@@ -54,15 +67,28 @@ def search(
     cloned_repo_base_dir: str = "."
 ) -> list:
     """
-    Stub for the search function.
-    In the full implementation, this would:
-    1. Find the existing vector database
-    2. Run a similarity search with the query
-    3. Return the top-k matches
-    
-    This stub version just returns a message.
+    Search the repo's local index, building it first if needed.
+
+    Results are cached until the index version changes; see cache_stats().
+
+    Returns:
+        Up to k chunks, best first, each prefixed with its path and line range
     """
-    return [f"This is a stub for the search function. In a real implementation, this would search for: {query}"]
+    repo_path = repo_path_for(repo_url, cloned_repo_base_dir)
+    index = KnoIndex(repo_path)
+    if not index.vectors:
+        raise RuntimeError("Local search needs NumPy (pip install numpy)")
+    if not index.manifest_path.exists():
+        index = clone_and_index(repo_url, branch, embedding, cloned_repo_base_dir).vector_store
+    cache = cache_for(repo_path)
+    query = normalize_query(query)
+
+    def run():
+        features = cache.embedding((EMBEDDING_METHOD, index.vectors.dim, query), lambda: index.query_features(query))
+        return [f"{result['path']}:{result['start_line']}-{result['end_line']}\n{result['text']}"
+                for result in index.search(query, k, features=features)]
+
+    return cache.get_or_compute(("search", EMBEDDING_METHOD, query, k), run)
 
 def agent_query(
     repo_url: str,
@@ -77,6 +103,16 @@ def agent_query(
     prompt: str = "",
     MODEL_API_KEY: str = "",
 ) -> str:
+    """
+    Cached agent_query: answers with llm_temperature 0 are reused until the index version changes.
+    """
+    return cached_agent_query(
+        _agent_query, repo_url, prompt=prompt, cloned_repo_base_dir=cloned_repo_base_dir, branch=branch,
+        embedding=embedding, llm_provider=llm_provider, llm_model=llm_model, llm_temperature=llm_temperature,
+        llm_max_tokens=llm_max_tokens, llm_system_prompt=llm_system_prompt, MODEL_API_KEY=MODEL_API_KEY
+    )
+
+def _agent_query(repo_url: str, prompt: str = "", **kwargs) -> str:
     """
     Stub for the agent_query function.
     In the full implementation, this would:
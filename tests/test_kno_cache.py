@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kno_cache import QueryCache
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_memory_evictions_are_counted(self):
+        cache = QueryCache(max_memory_bytes=100)
+        cache.set_version("1:abc1234")
+        for n in range(5):
+            cache.get_or_compute(("search", n), lambda: "x" * 40)
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 3)
+        self.assertEqual(stats["memory_entries"], 2)
+        self.assertEqual(stats["misses"], 5)
+
+    def test_disk_hit_after_memory_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = QueryCache(os.path.join(tmp_dir, "cache.sqlite3"), max_memory_bytes=100)
+            cache.set_version("1:abc1234")
+            for n in range(3):
+                cache.get_or_compute(("search", n), lambda: "x" * 40)
+            self.assertEqual(cache.get_or_compute(("search", 0), lambda: None), "x" * 40)
+            self.assertEqual(cache.counts["disk_hits"], 1)
+            self.assertGreater(cache.counts["evictions"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kno_chunker
+from kno_chunker import chunk_file, chunk_python, chunk_markdown, chunk_text, sliding_window, chunk_files
+
+MODULE = '''import os
+
+# Helpers
+def payout(shares):
+    return sum(shares)
+
+
+@staticmethod
+def audit():
+    return None
+
+
+# Round state
+class Round:
+    state = "open"
+
+    def close(self):
+        self.state = "closing"
+'''
+
+
+def method(name, lines):
+    return f"    def {name}(self):\n" + "".join(f"        value_{n} = {n}\n" for n in range(lines))
+
+
+class TestChunker(unittest.TestCase):
+    def test_python_split_by_definition(self):
+        chunks = chunk_python(MODULE)
+        texts = [text for _, _, text in chunks]
+        # Module-level code between definitions is a chunk of its own
+        self.assertEqual(texts[0], "import os\n\n# Helpers\n")
+        self.assertTrue(texts[1].startswith("def payout"))
+        self.assertTrue(texts[2].lstrip().startswith("@staticmethod\ndef audit"))
+        # Comments and blank lines since the previous definition travel with the next one
+        self.assertTrue(texts[3].lstrip().startswith("# Round state\nclass Round:"))
+        self.assertIn("def close", texts[3])
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[-1][1], MODULE.count("\n"))
+
+    def test_large_class_split_by_method(self):
+        text = "class Pool:\n    fee = 0.01\n\n" + method("first", 100) + "\n" + method("second", 100)
+        chunks = chunk_python(text)
+        self.assertEqual([text.strip().split("\n")[0].strip() for _, _, text in chunks],
+                         ["class Pool:", "def first(self):", "def second(self):"])
+        self.assertEqual([start for start, _, _ in chunks[:2]], [1, 4])
+        self.assertEqual(chunks[-1][1], text.count("\n"))
+
+    def test_unparsable_python_falls_back_to_windows(self):
+        text = "def broken(:\n    pass\n" * 50
+        self.assertEqual(chunk_python(text), chunk_text(text))
+        self.assertEqual(chunk_file("broken.py", text), chunk_text(text))
+
+    def test_markdown_split_by_heading(self):
+        text = "# Title\nintro\n## Setup\n```bash\n# not a heading\n```\n## Usage\nrun it\n"
+        chunks = chunk_markdown(text)
+        self.assertEqual([(start, end) for start, end, _ in chunks], [(1, 2), (3, 6), (7, 8)])
+        self.assertEqual(chunk_file("README.md", text), chunks)
+
+    def test_shell_and_config_use_sliding_windows(self):
+        text = "".join(f"echo {n}\n" for n in range(100))
+        chunks = sliding_window(text.splitlines(keepends=True))
+        self.assertEqual([(start, end) for start, end, _ in chunks], [(1, 40), (33, 72), (65, 100)])
+        for name in ("deploy.sh", "docker-compose.yml", "Dockerfile"):
+            self.assertEqual(chunk_file(name, text), chunks)
+
+    def test_process_pool_matches_serial(self):
+        with tempfile.TemporaryDirectory() as repo:
+            names = []
+            for n in range(6):
+                name = f"module_{n}.py"
+                with open(os.path.join(repo, name), "w") as f:
+                    f.write(MODULE.replace("payout", f"payout_{n}"))
+                names.append(name)
+            serial = list(chunk_files(repo, names, dim=64, workers=1))
+            with mock.patch.object(kno_chunker, "SERIAL_FILES", 1):
+                pooled = list(chunk_files(repo, names, dim=64, workers=2))
+        self.assertEqual([result[0] for result in pooled], names)
+        for (name, chunks, vectors, _), (_, pooled_chunks, pooled_vectors, _) in zip(serial, pooled):
+            self.assertEqual(pooled_chunks, chunks)
+            self.assertEqual(pooled_vectors.shape, (len(chunks), 64))
+            self.assertTrue((pooled_vectors == vectors).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+from unittest import mock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_kno
+from kno_index import KnoIndex, file_hash
+
+
+def git(repo_dir, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   cwd=repo_dir, capture_output=True, check=True)
+
+
+class TestKnoIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.repo = Path(self.tmp_dir.name)
+        git(self.repo, "init", "-q")
+        (self.repo / "pool.py").write_text("def payout(shares):\n    return sum(shares)\n")
+        (self.repo / "notes.md").write_text("# Notes\n")
+        git(self.repo, "add", ".")
+        git(self.repo, "commit", "-q", "-m", "initial")
+        self.index = KnoIndex(self.repo)
+
+    def manifest_sha(self, name):
+        with open(self.index.manifest_path) as f:
+            return json.load(f)["files"][name]["sha"]
+
+    def test_unchanged_tree_is_not_reindexed(self):
+        self.assertEqual(self.index.update(workers=1)["changed_files"], 2)
+        stats = self.index.update(workers=1)
+        self.assertEqual((stats["changed_files"], stats["deleted_files"]), (0, 0))
+
+    def test_reverted_edit_is_reindexed(self):
+        path = self.repo / "pool.py"
+        committed = file_hash(path)
+        path.write_text("def payout(shares):\n    return max(shares)\n")
+        self.index.update(workers=1)
+        self.assertNotEqual(self.manifest_sha("pool.py"), committed)
+
+        # Back to the committed content: no longer in `git diff`, but the index still holds the edit
+        git(self.repo, "checkout", "--", "pool.py")
+        self.assertEqual(self.index.update(workers=1)["changed_files"], 1)
+        self.assertEqual(self.manifest_sha("pool.py"), committed)
+        self.assertEqual(self.index.update(workers=1)["changed_files"], 0)
+
+    def test_removed_untracked_file_is_deleted(self):
+        (self.repo / "scratch.py").write_text("x = 1\n")
+        self.index.update(workers=1)
+        (self.repo / "scratch.py").unlink()
+        self.assertEqual(self.index.update(workers=1)["deleted_files"], 1)
+
+    def test_search_without_numpy_says_to_install_it(self):
+        with mock.patch("kno_index.VectorStore", None):
+            with self.assertRaisesRegex(RuntimeError, "pip install numpy"):
+                simple_kno.search(str(self.repo), query="payout")
+
+
+if __name__ == '__main__':
+    unittest.main()
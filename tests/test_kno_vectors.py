@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kno_vectors import VectorStore
+
+
+class TestVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.store = VectorStore(self.tmp_dir.name)
+        self.conn = sqlite3.connect(os.path.join(self.tmp_dir.name, "index.sqlite3"))
+        self.addCleanup(self.conn.close)
+        self.store.init(self.conn)
+        topics = ["share payout reward", "block template job", "merkle commitment audit", "token bucket admission"]
+        self.items = [(f"chunk-{n}", f"{topics[n % 4]} variant{n} detail{n * 7}") for n in range(400)]
+        self.store.add(self.conn, self.items)
+        self.store.build_ivf(nlist=8)
+
+    def search(self, text, **options):
+        vector = self.store.query_vector(text, len(self.items))
+        rows, _ = self.store.search_rows(vector, 1, **options)
+        return self.conn.execute("SELECT chunk_id FROM vectors WHERE row = ?", (int(rows[0]),)).fetchone()[0]
+
+    def test_reused_row_is_found_through_ivf(self):
+        self.store.remove(self.conn, self.items[:1])
+        self.store.add(self.conn, [("replacement", "zebra quokka narwhal")])
+        self.assertEqual(self.conn.execute("SELECT row FROM vectors WHERE chunk_id = 'replacement'").fetchone()[0], 0)
+        self.assertEqual(self.search("zebra quokka narwhal", nprobe=1), "replacement")
+
+        self.store.build_ivf(nlist=8)
+        self.assertEqual(len(self.store.reused_rows()), 0)
+        self.assertEqual(self.search("zebra quokka narwhal", nprobe=1), "replacement")
+
+    def test_reuse_counts_toward_staleness(self):
+        with mock.patch("kno_vectors.IVF_MIN_ROWS", 100):
+            self.assertFalse(self.store.ivf_stale())
+            self.store.remove(self.conn, self.items[:50])
+            self.store.add(self.conn, [(f"new-{n}", f"replacement text {n}") for n in range(50)])
+            self.assertEqual(self.store.rows, 400)
+            self.assertTrue(self.store.ivf_stale())
+
+
+if __name__ == '__main__':
+    unittest.main()